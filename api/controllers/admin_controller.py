@@ -0,0 +1,170 @@
+"""
+Controlador para tareas de administración y diagnóstico
+"""
+import hmac
+import io
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Query, UploadFile, File
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from typing import Any, Dict, Optional
+
+from ..core.config import config
+from ..services.profiling_service import profiling_service, ProfilerBusyError
+from ..services.attribution_service import attribution_service, AttributionBusyError
+from ..core.timing import TimedRoute
+
+async def verify_admin_token(x_admin_token: Optional[str] = Header(None, description="Token de administración")):
+    """Verifica el token de administración (TECHSPHERE_ADMIN_TOKEN)"""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Endpoints de administración deshabilitados (configure TECHSPHERE_ADMIN_TOKEN)"
+        )
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, config.ADMIN_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token de administración inválido"
+        )
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(verify_admin_token)],
+    route_class=TimedRoute
+)
+
+@router.post(
+    "/profile",
+    summary="Capturar perfil de rendimiento",
+    description="Perfila el tráfico en vivo durante un tiempo acotado y descarga el resultado",
+    response_class=FileResponse
+)
+async def capture_profile(
+    mode: str = Query("python", description="'python' (muestreo de pilas de todos los hilos) o 'torch' (operadores con torch.profiler)"),
+    duration: float = Query(10.0, description="Duración de la captura en segundos", gt=0, le=config.PROFILE_MAX_SECONDS)
+):
+    """
+    Captura un perfil del tráfico en vivo.
+    
+    - **mode**: `python` genera pilas colapsadas (`.folded`, compatibles con flamegraph.pl y speedscope);
+      `torch` genera una traza de Chrome (`.json`, abrir en chrome://tracing o Perfetto) de una
+      muestra de las unidades de inferencia (una de cada `TECHSPHERE_PROFILE_TORCH_EVERY`, hasta
+      `TECHSPHERE_PROFILE_TORCH_MAX_UNITS`)
+    - **duration**: segundos de captura (máximo `TECHSPHERE_PROFILE_MAX_SECONDS`)
+    
+    Los headers `X-Profile-*` (y `otherData.sampling` en la traza de torch) indican
+    qué parte del tráfico cubre el perfil. Solo se permite una captura a la vez; una
+    segunda solicitud recibe 409.
+    Requiere el header `X-Admin-Token`.
+    """
+    if mode not in profiling_service.MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Modo inválido: {mode}. Opciones: {list(profiling_service.MODES)}"
+        )
+    
+    try:
+        path, sampling = await profiling_service.capture(mode, duration)
+        
+    except ProfilerBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error capturando perfil: {str(e)}"
+        )
+    
+    # El artefacto se elimina una vez enviado
+    return FileResponse(
+        path=str(path),
+        filename=path.name,
+        media_type="application/json" if mode == "torch" else "text/plain",
+        headers={
+            "X-Profile-" + "-".join(part.capitalize() for part in name.split("_")): str(value)
+            for name, value in sampling.items()
+        },
+        background=BackgroundTask(path.unlink, missing_ok=True)
+    )
+
+@router.post(
+    "/attribution",
+    response_model=Dict[str, Any],
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Calcular índice de atribuciones",
+    description="Lanza en segundo plano el cálculo del índice de importancia de características sobre un CSV etiquetado"
+)
+async def start_attribution_job(
+    file: Optional[UploadFile] = File(None, description="CSV con columnas: title, abstract, group"),
+    source: Optional[str] = Query(None, description="Alternativa al archivo: nombre de un CSV procesado en temp/ (ej: predictions_20250101_120000.csv)")
+) -> Dict[str, Any]:
+    """
+    Calcula atribuciones gradiente × entrada en batches sobre un corpus etiquetado y guarda
+    el top de n-gramas por categoría, que luego sirve `GET /analytics/feature-importance`.
+    
+    - **file**: CSV subido con columnas `title`, `abstract` y `group`
+    - **source**: o bien el nombre de un CSV de resultados batch ya guardado en `temp/`
+    
+    Solo se permite un trabajo a la vez; una segunda solicitud recibe 409.
+    El progreso se consulta con `GET /admin/attribution`. Requiere el header `X-Admin-Token`.
+    """
+    import pandas as pd
+    
+    if (file is None) == (source is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Indique un archivo CSV o un source, pero no ambos"
+        )
+    
+    try:
+        if file is not None:
+            contents = await file.read()
+            df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
+            source_name = file.filename
+        else:
+            # Solo archivos directamente bajo temp/ (evita path traversal)
+            path = config.get_temp_dir() / source
+            if path.parent != config.get_temp_dir() or path.suffix != ".csv" or not path.exists():
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Archivo no encontrado: {source}"
+                )
+            df = pd.read_csv(path)
+            source_name = source
+        
+        missing_columns = [col for col in ('title', 'abstract', 'group') if col not in df.columns]
+        if missing_columns:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Columnas faltantes en el CSV: {missing_columns}"
+            )
+        
+        return attribution_service.start_job(df, source_name)
+        
+    except HTTPException:
+        raise
+    except AttributionBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error iniciando trabajo de atribución: {str(e)}"
+        )
+
+@router.get(
+    "/attribution",
+    response_model=Dict[str, Any],
+    summary="Estado del índice de atribuciones",
+    description="Retorna el estado del último trabajo de atribución"
+)
+async def get_attribution_status() -> Dict[str, Any]:
+    """
+    Estado del último trabajo de atribución: `idle`, `running` (con documentos procesados),
+    `completed` o `failed`. Requiere el header `X-Admin-Token`.
+    """
+    return attribution_service.get_status()
@@ -1,35 +1,75 @@
 """
 Controlador para análisis y visualizaciones
 """
-from fastapi import APIRouter, HTTPException, status
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from datetime import datetime
+from typing import Dict, Any, Optional
 
 from ..models.schemas import (
     ConfusionMatrixResponse,
     ConfusionMatrixMetricsResponse,
     ClassDistributionResponse,
-    FeatureImportanceResponse
+    FeatureImportanceResponse,
+    DashboardResponse
 )
 from ..services.analytics_service import analytics_service
+from ..core.config import config
+from ..core.cache import artifact_cache, is_not_modified, not_modified_response
+from ..core.ratelimit import rate_limit_request
+from ..core.timing import TimedRoute
 
-router = APIRouter(prefix="/analytics", tags=["Analytics & Visualizations"])
+router = APIRouter(
+    prefix="/analytics",
+    tags=["Analytics & Visualizations"],
+    dependencies=[Depends(rate_limit_request)],
+    route_class=TimedRoute
+)
 
 @router.get(
     "/confusion-matrix",
     response_model=ConfusionMatrixMetricsResponse,
+    response_model_exclude_none=True,
     summary="Matriz de confusión",
     description="Obtiene las métricas de matriz de confusión del modelo por categoría"
 )
-async def get_confusion_matrix() -> ConfusionMatrixMetricsResponse:
+async def get_confusion_matrix(
+    request: Request,
+    response: Response,
+    source: str = Query("training", description="training (evaluación del entrenamiento) o live (agregado de trabajos batch)"),
+    model_version: Optional[str] = Query(None, description="Solo source=live: versión del modelo"),
+    since: Optional[datetime] = Query(None, description="Solo source=live: inicio de la ventana (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Solo source=live: fin de la ventana (ISO 8601)")
+) -> ConfusionMatrixMetricsResponse:
     """
     Obtiene las métricas de matriz de confusión del modelo por categoría.
     
-    Retorna TN, FP, FN, TP para cada categoría médica.
+    Retorna TN, FP, FN, TP para cada categoría médica. Con `source=live` se sirve el agregado
+    en memoria de los trabajos `predict-batch` etiquetados (resolución horaria), opcionalmente
+    filtrado por versión del modelo y ventana temporal.
+    Soporta requests condicionales (If-None-Match / If-Modified-Since) con respuesta 304.
     """
     try:
-        matrix = analytics_service.get_confusion_matrix()
+        artifact = (
+            config.get_confusion_aggregate_path() if source == "live"
+            else config.get_training_results_path(config.CONFUSION_MATRICES_FILE)
+        )
+        validators = artifact_cache.validators(artifact) if artifact.exists() else None
+        if is_not_modified(request, response, validators):
+            return not_modified_response(response)
+        
+        matrix = analytics_service.get_confusion_matrix(source, model_version, since, until)
         return matrix
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except LookupError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -42,13 +82,18 @@ async def get_confusion_matrix() -> ConfusionMatrixMetricsResponse:
     summary="Distribución de clases",
     description="Obtiene la distribución de clases en el dataset de entrenamiento"
 )
-async def get_class_distribution() -> ClassDistributionResponse:
+async def get_class_distribution(request: Request, response: Response) -> ClassDistributionResponse:
     """
     Obtiene la distribución de clases.
     
     Retorna la distribución de clases y el total de muestras para crear gráficos.
+    Soporta requests condicionales (If-None-Match / If-Modified-Since) con respuesta 304.
     """
     try:
+        validators = artifact_cache.validators(config.get_training_results_path(config.GROUP_COUNTS_FILE))
+        if is_not_modified(request, response, validators):
+            return not_modified_response(response)
+        
         distribution = analytics_service.get_class_distribution()
         return distribution
         
@@ -62,18 +107,35 @@ async def get_class_distribution() -> ClassDistributionResponse:
     "/feature-importance",
     response_model=FeatureImportanceResponse,
     summary="Importancia de características",
-    description="Obtiene las características más importantes del modelo"
+    description="Obtiene los n-gramas más influyentes del modelo por categoría desde el índice de atribuciones precalculado"
 )
-async def get_feature_importance() -> FeatureImportanceResponse:
+async def get_feature_importance(
+    request: Request,
+    response: Response,
+    category: Optional[str] = Query(None, description="Categoría médica (default: todas)"),
+    top_k: int = Query(15, description="Número de características a retornar", ge=1, le=200)
+) -> FeatureImportanceResponse:
     """
     Obtiene la importancia de las características.
     
-    Retorna las características más importantes identificadas por el modelo.
+    Retorna los n-gramas más influyentes por categoría según el índice de atribuciones
+    (gradiente × entrada) calculado en segundo plano con `POST /admin/attribution`.
+    Mientras no exista el índice se retornan datos simulados.
     """
     try:
-        importance = analytics_service.get_feature_importance()
+        index_path = config.get_attribution_index_path()
+        validators = artifact_cache.validators(index_path) if index_path.exists() else None
+        if is_not_modified(request, response, validators):
+            return not_modified_response(response)
+        
+        importance = analytics_service.get_feature_importance(category, top_k)
         return importance
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -86,16 +148,27 @@ async def get_feature_importance() -> FeatureImportanceResponse:
     summary="Rendimiento temporal",
     description="Obtiene el rendimiento del modelo a lo largo del tiempo"
 )
-async def get_performance_over_time() -> Dict[str, Any]:
+async def get_performance_over_time(
+    resolution: str = Query("day", description="Resolución de la serie: minute, hour o day"),
+    limit: Optional[int] = Query(None, description="Número máximo de puntos (los más recientes)", ge=1)
+) -> Dict[str, Any]:
     """
     Obtiene el rendimiento del modelo a lo largo del tiempo.
     
-    Retorna métricas de F1-score y accuracy por fecha para crear gráficos temporales.
+    Retorna, por minuto, hora o día: requests por minuto, tasa de error, latencias p50/p95/p99,
+    throughput batch y F1-score, hamming loss y accuracy de las evaluaciones batch completadas
+    (null en los intervalos sin datos). Las series se guardan en memoria con tamaño fijo
+    (180 minutos, 72 horas y 90 días).
     """
     try:
-        performance = analytics_service.get_model_performance_over_time()
+        performance = analytics_service.get_model_performance_over_time(resolution, limit)
         return performance
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -106,15 +179,22 @@ async def get_performance_over_time() -> Dict[str, Any]:
     "/category-correlations",
     response_model=Dict[str, Any],
     summary="Correlaciones entre categorías",
-    description="Obtiene la matriz de correlación entre categorías médicas"
+    description="Obtiene la matriz de correlación y de co-ocurrencia entre categorías médicas"
 )
-async def get_category_correlations() -> Dict[str, Any]:
+async def get_category_correlations(request: Request, response: Response) -> Dict[str, Any]:
     """
     Obtiene correlaciones entre categorías médicas.
     
-    Retorna una matriz de correlación entre diferentes categorías médicas.
+    Retorna la matriz de correlación phi (Pearson sobre indicadores binarios) y la matriz de
+    co-ocurrencia, calculadas desde los conteos de combinaciones de etiquetas del entrenamiento
+    y de los trabajos batch. Soporta requests condicionales con respuesta 304.
     """
     try:
+        sources = analytics_service.get_correlation_sources()
+        validators = artifact_cache.validators(*sources) if sources else None
+        if is_not_modified(request, response, validators):
+            return not_modified_response(response)
+        
         correlations = analytics_service.get_category_correlation_matrix()
         return correlations
         
@@ -123,3 +203,50 @@ async def get_category_correlations() -> Dict[str, Any]:
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error obteniendo correlaciones: {str(e)}"
         )
+
+@router.get(
+    "/dashboard",
+    response_model=DashboardResponse,
+    response_model_exclude_none=True,
+    summary="Dashboard agregado",
+    description="Obtiene en una sola respuesta los paneles del dashboard (métricas, matriz de confusión, distribución, importancia, rendimiento y correlaciones)"
+)
+async def get_dashboard(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(
+        None,
+        description="Paneles separados por coma: metrics, confusion_matrix, class_distribution, feature_importance, performance_over_time, category_correlations (default: todos)"
+    )
+) -> DashboardResponse:
+    """
+    Obtiene el dashboard completo en un solo round trip.
+    
+    - **fields**: Selector de paneles; la respuesta solo incluye los solicitados
+    
+    Los paneles se construyen en paralelo desde los artefactos cacheados y la respuesta se
+    comprime con gzip si el cliente lo acepta. Si todos los paneles solicitados provienen de
+    artefactos de entrenamiento, la respuesta lleva ETag y admite requests condicionales (304).
+    """
+    try:
+        panels = analytics_service.parse_dashboard_fields(fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    try:
+        artifacts = analytics_service.get_dashboard_artifacts(panels)
+        validators = artifact_cache.validators(*artifacts) if artifacts else None
+        if is_not_modified(request, response, validators):
+            return not_modified_response(response)
+        
+        dashboard = await analytics_service.get_dashboard(panels)
+        return dashboard
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error obteniendo dashboard: {str(e)}"
+        )
@@ -1,14 +1,20 @@
 """
 Controlador para manejo de archivos
 """
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import FileResponse
-from pathlib import Path
 import os
 
 from ..core.config import config
+from ..core.ratelimit import rate_limit_request
+from ..core.timing import TimedRoute
 
-router = APIRouter(prefix="/ml", tags=["Files"])
+router = APIRouter(
+    prefix="/ml",
+    tags=["Files"],
+    dependencies=[Depends(rate_limit_request)],
+    route_class=TimedRoute
+)
 
 @router.get(
     "/download/{filename}",
@@ -32,7 +38,7 @@ async def download_processed_file(filename: str):
             )
         
         # Buscar archivo en directorio temporal
-        temp_dir = Path(config.get_project_root()) / "temp"
+        temp_dir = config.get_temp_dir()
         file_path = temp_dir / filename
         
         if not file_path.exists():
@@ -0,0 +1,25 @@
+"""
+Controlador para métricas de monitoreo en formato Prometheus
+"""
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from ..core.metrics import registry
+from ..core.timing import TimedRoute
+
+router = APIRouter(tags=["Monitoring"], route_class=TimedRoute)
+
+@router.get(
+    "/metrics",
+    summary="Métricas Prometheus",
+    description="Expone métricas de la API en formato de texto de Prometheus",
+    response_class=Response
+)
+async def get_prometheus_metrics() -> Response:
+    """
+    Obtiene las métricas de operación de la API.
+    
+    Incluye latencias por etapa de inferencia, requests por ruta, tamaños de batch,
+    profundidad de la cola de inferencia, caches, throughput batch y memoria del proceso.
+    """
+    return Response(content=registry.render(), media_type=registry.CONTENT_TYPE)
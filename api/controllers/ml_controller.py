@@ -1,22 +1,37 @@
 """
 Controlador para predicciones del modelo ML
 """
-from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form
-from typing import List, Optional
-import pandas as pd
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File, Form
+from typing import Any, Dict, List, Optional
+import asyncio
 import io
 import time
 
 from ..models.schemas import (
     PredictionRequest, 
     PredictionResponse, 
+    TokenizedPredictionRequest,
     MetricsResponse, 
     BatchPredictionRequest,
     BatchPredictionResponse
 )
 from ..services.ml_service import ml_service
+from ..services.capture_service import capture_service
+from ..services.threshold_service import threshold_service
+from ..services.inference_scheduler import OverloadedError
+from ..core.config import config
+from ..core.cache import artifact_cache, is_not_modified, not_modified_response
+from ..core.disconnect import cancel_on_disconnect, ClientDisconnectedError, CLIENT_CLOSED_REQUEST
+from ..core.ratelimit import rate_limiter, rate_limit_request, estimate_tokens
+from ..core.token_ids import TokenIdsError, decode_base64_ids, load_token_rows
+from ..core.timing import TimedRoute
 
-router = APIRouter(prefix="/ml", tags=["Machine Learning"])
+router = APIRouter(
+    prefix="/ml",
+    tags=["Machine Learning"],
+    dependencies=[Depends(rate_limit_request)],
+    route_class=TimedRoute
+)
 
 @router.post(
     "/predict",
@@ -24,7 +39,7 @@ router = APIRouter(prefix="/ml", tags=["Machine Learning"])
     summary="Realizar predicción multilabel",
     description="Clasifica un texto científico médico utilizando el modelo SciBERT entrenado con soporte multilabel"
 )
-async def predict_text(request: PredictionRequest) -> PredictionResponse:
+async def predict_text(request: PredictionRequest, http_request: Request) -> PredictionResponse:
     """
     Realiza una predicción multilabel sobre un texto científico médico.
     
@@ -47,17 +62,106 @@ async def predict_text(request: PredictionRequest) -> PredictionResponse:
     
     **Nota:** El modelo puede predecir múltiples categorías simultáneamente si sus probabilidades
     superan el umbral especificado (clasificación multilabel).
+    
+    Los requests concurrentes con el mismo texto comparten un único forward del modelo.
+    Con el límite de uso activo, el request cuesta los tokens estimados del texto.
+    Bajo sobrecarga (cola de inferencia o espera estimada por encima del límite) responde
+    429 con el header `Retry-After`.
     """
+    request_start = time.perf_counter()
+    status_code = status.HTTP_200_OK
     try:
-        if not ml_service.is_model_loaded():
+        # El costo en el límite de uso son los tokens que procesará el modelo
+        await rate_limiter.charge(http_request, estimate_tokens([request.text]))
+        
+        if not ml_service.ensure_model_loaded():
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Modelo no está cargado"
             )
         
-        prediction = ml_service.predict(request.text, request.threshold)
+        prediction = await cancel_on_disconnect(
+            http_request, ml_service.predict_async(request.text, request.threshold)
+        )
         return prediction
         
+    except ClientDisconnectedError as e:
+        status_code = CLIENT_CLOSED_REQUEST
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail=str(e))
+    except OverloadedError as e:
+        status_code = status.HTTP_429_TOO_MANY_REQUESTS
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except HTTPException as e:
+        status_code = e.status_code
+        raise
+    except Exception as e:
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error en predicción: {str(e)}"
+        )
+    finally:
+        # Muestreo de tráfico para benchmarks (solo encola, la escritura es en segundo plano)
+        capture_service.capture_prediction(
+            request.text,
+            request.threshold,
+            time.perf_counter() - request_start,
+            status_code,
+            ml_service.model_version
+        )
+
+@router.post(
+    "/predict-tokens",
+    response_model=PredictionResponse,
+    summary="Realizar predicción multilabel con texto pre-tokenizado",
+    description="Clasifica un texto ya tokenizado con el vocabulario del modelo, sin tokenizarlo en el servidor"
+)
+async def predict_tokens(request: TokenizedPredictionRequest, http_request: Request) -> PredictionResponse:
+    """
+    Realiza una predicción multilabel sobre ids de tokens calculados por el cliente.
+    
+    - **token_ids**: ids del texto "{title} {abstract}" tokenizado con el vocabulario del modelo,
+      con los tokens especiales ([CLS] ... [SEP]) y como mucho `max_text_length` tokens,
+      como arreglo little-endian codificado en base64 (ej: `base64.b64encode(np.asarray(ids, "<i2").tobytes())`)
+    - **dtype**: `int16` (alcanza para vocabularios de hasta 32.767 tokens, como SciBERT) o `int32`
+    - **vocab_hash**: hash del vocabulario del tokenizador usado; debe coincidir con el
+      `vocab_hash` de `GET /api/v1/info`, de lo contrario responde 400
+    - **threshold**: Umbral de confianza para clasificación multilabel (default: 0.5)
+    
+    Retorna lo mismo que `/ml/predict`. Con el límite de uso activo, el request cuesta
+    la cantidad de tokens recibidos.
+    """
+    try:
+        if not ml_service.ensure_model_loaded():
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Modelo no está cargado"
+            )
+        
+        token_ids = decode_base64_ids(request.token_ids, request.dtype)
+        ml_service.validate_token_rows([token_ids], request.vocab_hash)
+        await rate_limiter.charge(http_request, len(token_ids))
+        
+        return await cancel_on_disconnect(
+            http_request, ml_service.predict_tokens_async(token_ids, request.threshold)
+        )
+        
+    except HTTPException:
+        raise
+    except TokenIdsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except ClientDisconnectedError as e:
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail=str(e))
+    except OverloadedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -70,13 +174,22 @@ async def predict_text(request: PredictionRequest) -> PredictionResponse:
     summary="Obtener métricas del modelo",
     description="Retorna las métricas de rendimiento del modelo (F1-score, Accuracy, etc.)"
 )
-async def get_model_metrics() -> MetricsResponse:
+async def get_model_metrics(request: Request, response: Response) -> MetricsResponse:
     """
     Obtiene las métricas de rendimiento del modelo.
     
     Retorna F1-score, accuracy, precision, recall y número total de clases.
+    Soporta requests condicionales (If-None-Match / If-Modified-Since) con respuesta 304.
     """
     try:
+        # La respuesta depende de las métricas de evaluación y de las clases del modelo
+        validators = artifact_cache.validators(
+            config.get_training_results_path(config.EVALUATION_RESULTS_FILE),
+            config.MODEL_PATH / "label_encoder.json"
+        )
+        if is_not_modified(request, response, validators):
+            return not_modified_response(response)
+        
         metrics = ml_service.get_model_metrics()
         return metrics
         
@@ -99,7 +212,7 @@ async def get_available_classes() -> List[str]:
     Retorna una lista con todas las clases que puede predecir el modelo.
     """
     try:
-        if not ml_service.is_model_loaded():
+        if not ml_service.ensure_model_loaded():
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Modelo no está cargado"
@@ -108,6 +221,8 @@ async def get_available_classes() -> List[str]:
         classes = ml_service.get_available_classes()
         return classes
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -121,8 +236,11 @@ async def get_available_classes() -> List[str]:
     description="Procesa un archivo CSV con columnas 'title', 'abstract' y 'group' para realizar predicciones multilabel y calcular métricas"
 )
 async def predict_batch_csv(
+    http_request: Request,
     file: UploadFile = File(..., description="Archivo CSV con columnas: title, abstract, group"),
-    threshold: Optional[float] = Form(0.5, description="Umbral para clasificación multilabel (0.0-1.0)", ge=0.0, le=1.0)
+    threshold: Optional[float] = Form(0.5, description="Umbral para clasificación multilabel (0.0-1.0)", ge=0.0, le=1.0),
+    tokens: Optional[UploadFile] = File(None, description="Opcional: ids de tokens de cada fila (.npy o .npz) para no tokenizar en el servidor"),
+    vocab_hash: Optional[str] = Form(None, description="Hash del vocabulario de `tokens` (GET /api/v1/info)")
 ) -> BatchPredictionResponse:
     """
     Procesa un archivo CSV para realizar predicciones batch y calcular métricas.
@@ -148,12 +266,27 @@ async def predict_batch_csv(
     - Métricas de evaluación completas
     - URL para descargar CSV procesado
     - Tiempo de procesamiento
+    
+    **Entrada pre-tokenizada (opcional):** `tokens` con los ids de cada fila del CSV, en el
+    mismo orden, calculados con el vocabulario del modelo (incluyendo [CLS] y [SEP]) y
+    `vocab_hash` con el hash de ese vocabulario. Formatos: `.npz` con `input_ids` (ids
+    de todas las filas concatenados, int16/int32) y `offsets` (inicio de cada fila y fin
+    de la última), o `.npy` 2-D (filas × largo) con padding [PAD] a la derecha. Las filas
+    se pasan al modelo sin volver a tokenizar.
+    
+    Con el límite de uso activo, el trabajo cuesta la suma de los tokens estimados de
+    todas las filas (o de los tokens recibidos, con entrada pre-tokenizada). El trabajo se ejecuta en tramos en el carril de baja prioridad: las predicciones
+    interactivas de `/ml/predict` se atienden entre tramos. Si el cliente se desconecta,
+    el trabajo se detiene en el siguiente tramo.
     """
     start_time = time.time()
     
+    # pandas solo se necesita en el procesamiento batch
+    import pandas as pd
+    
     try:
         # Validar que el modelo esté cargado
-        if not ml_service.is_model_loaded():
+        if not ml_service.ensure_model_loaded():
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Modelo no está cargado"
@@ -179,20 +312,55 @@ async def predict_batch_csv(
                 detail=f"Columnas faltantes en el CSV: {missing_columns}"
             )
         
-        # Procesar predicciones batch
-        batch_result = ml_service.predict_batch(df, threshold)
+        # Procesar predicciones batch en tramos del carril de baja prioridad
+        job_start = time.perf_counter()
+        texts = ml_service.prepare_batch(df, threshold)
+        token_rows = None
+        if tokens is not None:
+            token_rows = load_token_rows(await tokens.read(), ml_service.tokenizer.pad_token_id or 0)
+            if len(token_rows) != len(df):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"El archivo de tokens tiene {len(token_rows)} filas y el CSV {len(df)}"
+                )
+            ml_service.validate_token_rows(token_rows, vocab_hash)
+        await rate_limiter.charge(
+            http_request,
+            sum(len(ids) for ids in token_rows) if token_rows is not None else estimate_tokens(texts)
+        )
+        run = await cancel_on_disconnect(
+            http_request, ml_service.run_batch_pipeline(df, texts, threshold, token_rows=token_rows)
+        )
+        batch_result = await asyncio.to_thread(ml_service.finish_batch, df, threshold, run, job_start)
         
         processing_time = time.time() - start_time
         
         return BatchPredictionResponse(
             success=True,
             message=f"Procesamiento exitoso de {batch_result['total_processed']} registros",
+            job_id=batch_result['job_id'],
             total_processed=batch_result['total_processed'],
             metrics=batch_result['metrics'],
+            failed_rows=batch_result['failed_rows'],
+            unique_rows=batch_result['unique_rows'],
+            dedup_ratio=batch_result['dedup_ratio'],
+            pipeline=batch_result['pipeline'],
             download_url=batch_result['download_url'],
             processing_time=round(processing_time, 2)
         )
         
+    except HTTPException:
+        raise
+    except TokenIdsError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except ClientDisconnectedError as e:
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail=str(e))
+    except OverloadedError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except pd.errors.EmptyDataError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -208,3 +376,63 @@ async def predict_batch_csv(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error procesando archivo: {str(e)}"
         )
+
+@router.get(
+    "/jobs/{job_id}/threshold-sweep",
+    response_model=Dict[str, Any],
+    summary="Barrido de umbrales de un trabajo batch",
+    description="Evalúa una grilla de umbrales globales y por categoría sobre las probabilidades guardadas de un trabajo batch etiquetado, sin volver a ejecutar el modelo"
+)
+async def threshold_sweep(
+    job_id: str,
+    start: float = Query(0.05, description="Primer umbral de la grilla", ge=0.0, le=1.0),
+    stop: float = Query(0.95, description="Último umbral de la grilla", ge=0.0, le=1.0),
+    step: float = Query(0.05, description="Paso de la grilla", gt=0.0, le=1.0),
+    top_k: int = Query(5, description="Mejores umbrales globales a retornar", ge=1, le=100)
+) -> Dict[str, Any]:
+    """
+    Barre umbrales sobre la matriz de probabilidades guardada por `POST /ml/predict-batch`
+    (campo `job_id` de la respuesta).
+    
+    **Retorna:**
+    - grid: hamming loss, exact match, F1 macro/micro y P/R/F1 por categoría para cada umbral global
+    - best_global: los mejores umbrales globales (mayor F1 macro, desempate por menor hamming loss)
+    - best_per_category: el mejor umbral de cada categoría y las métricas al usarlos juntos
+    
+    Todas las métricas aplican el mismo respaldo que la predicción: si ninguna categoría
+    supera el umbral se predice la de mayor probabilidad.
+    """
+    if start > stop:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start debe ser menor o igual que stop"
+        )
+    
+    # Validar el tamaño antes de construir la grilla
+    if (stop - start) / step + 1 > 1000:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La grilla no puede superar 1000 umbrales"
+        )
+    import numpy as np
+    thresholds = np.round(np.arange(start, stop + step / 2, step), 6)
+    
+    try:
+        # Cálculo de CPU: fuera del event loop
+        return await asyncio.to_thread(threshold_service.sweep, job_id, thresholds, top_k)
+        
+    except LookupError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error en barrido de umbrales: {str(e)}"
+        )
@@ -6,9 +6,11 @@ from datetime import datetime
 
 from ..models.schemas import HealthResponse
 from ..services.ml_service import ml_service
+from ..services.inference_scheduler import inference_scheduler
 from ..core.config import config
+from ..core.timing import TimedRoute
 
-router = APIRouter(tags=["System"])
+router = APIRouter(tags=["System"], route_class=TimedRoute)
 
 @router.get(
     "/health",
@@ -57,7 +59,13 @@ async def get_api_info():
             "model_loaded": ml_service.is_model_loaded(),
             "total_classes": len(ml_service.get_available_classes()) if ml_service.is_model_loaded() else 0,
             "max_text_length": config.MAX_TEXT_LENGTH,
+            "model_version": ml_service.model_version,
+            "vocab_hash": ml_service.vocab_hash,
             "cuda_available": config.is_cuda_available(),
+            "inference": {
+                **inference_scheduler.get_status(),
+                "coalesced_predictions": ml_service.coalesced_predictions
+            },
             "timestamp": datetime.now().isoformat()
         }
         
@@ -0,0 +1,122 @@
+"""
+Cache en memoria de artefactos en disco (training-results) y validadores HTTP
+
+Los artefactos se leen una vez y se revalidan con un stat() en cada acceso:
+si cambia la fecha de modificación o el tamaño del archivo se vuelven a
+cargar. Cada artefacto tiene un ETag (hash del contenido) y un Last-Modified
+que los endpoints usan para responder 304 a requests condicionales.
+"""
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from fastapi import Request, Response
+
+from .metrics import CACHE_REQUESTS
+
+@dataclass(frozen=True)
+class CachedArtifact:
+    """Contenido parseado de un archivo junto con sus validadores"""
+    data: Any
+    etag: str
+    mtime: float
+    size: int
+
+class ArtifactCache:
+    """Cache de archivos parseados invalidada por mtime y tamaño"""
+
+    def __init__(self, name: str = "artifacts"):
+        self.name = name
+        self._entries: Dict[Path, CachedArtifact] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: Union[str, Path], loader: Callable[[bytes], Any] = json.loads) -> CachedArtifact:
+        """Obtiene el artefacto, recargándolo si el archivo cambió (propaga FileNotFoundError)"""
+        path = Path(path)
+        stat = path.stat()
+        entry = self._entries.get(path)
+        if entry is not None and entry.mtime == stat.st_mtime and entry.size == stat.st_size:
+            CACHE_REQUESTS.labels(self.name, "hit").inc()
+            return entry
+
+        CACHE_REQUESTS.labels(self.name, "miss").inc()
+        raw = path.read_bytes()
+        entry = CachedArtifact(
+            data=loader(raw),
+            etag=hashlib.sha1(raw).hexdigest()[:16],
+            mtime=stat.st_mtime,
+            size=stat.st_size
+        )
+        with self._lock:
+            self._entries[path] = entry
+        return entry
+
+    def load_json(self, path: Union[str, Path]) -> Any:
+        """Contenido JSON del archivo (compartido: no debe modificarse)"""
+        return self.get(path).data
+
+    def validators(self, *paths: Union[str, Path]) -> Optional[Tuple[str, float]]:
+        """ETag combinado y fecha de modificación más reciente de los artefactos
+
+        Retorna None si alguno no existe: las respuestas de respaldo (simuladas)
+        no llevan validadores.
+        """
+        try:
+            entries = [self.get(path) for path in paths]
+        except (OSError, ValueError):
+            return None
+        etag = entries[0].etag if len(entries) == 1 else hashlib.sha1(
+            "".join(entry.etag for entry in entries).encode()
+        ).hexdigest()[:16]
+        return f'"{etag}"', max(entry.mtime for entry in entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Comparación débil (RFC 9110): se ignora el prefijo W/
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+def is_not_modified(request: Request, response: Response, validators: Optional[Tuple[str, float]]) -> bool:
+    """Añade ETag/Last-Modified a la respuesta y evalúa los headers condicionales del request"""
+    if validators is None:
+        return False
+    etag, mtime = validators
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = formatdate(mtime, usegmt=True)
+    # El cliente puede guardar la respuesta pero debe revalidarla en cada uso
+    response.headers["Cache-Control"] = "no-cache"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # Last-Modified tiene resolución de segundos
+        return int(mtime) <= since
+    return False
+
+def not_modified_response(response: Response) -> Response:
+    """Respuesta 304 con los validadores ya calculados"""
+    headers = {
+        name: response.headers[name]
+        for name in ("ETag", "Last-Modified", "Cache-Control")
+        if name in response.headers
+    }
+    return Response(status_code=304, headers=headers)
+
+# Cache global de artefactos de training-results
+artifact_cache = ArtifactCache()
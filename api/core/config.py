@@ -3,23 +3,119 @@ Configuración de la aplicación
 """
 import os
 from pathlib import Path
+from typing import Dict, Set
 
 class Config:
     """Configuración de la aplicación"""
     
     # Rutas del proyecto
     BASE_DIR = Path(__file__).parent.parent.parent
-    MODEL_PATH = BASE_DIR / "scibert_classifier"
+    # TECHSPHERE_MODEL_PATH permite usar otro modelo (p.ej. el modelo mínimo de los benchmarks)
+    MODEL_PATH = Path(os.getenv("TECHSPHERE_MODEL_PATH", str(BASE_DIR / "scibert_classifier")))
+    # Artefactos generados (CSVs de resultados, agregados, trabajos, capturas); los benchmarks
+    # lo redirigen a un directorio temporal para no mezclar datos sintéticos con los reales
+    TEMP_DIR = Path(os.getenv("TECHSPHERE_TEMP_DIR", str(BASE_DIR / "temp")))
+    
+    # Artefactos de entrenamiento que sirven los endpoints de métricas y analytics
+    TRAINING_RESULTS_DIR = BASE_DIR / "training-results"
+    EVALUATION_RESULTS_FILE = "evaluation_results.json"
+    CONFUSION_MATRICES_FILE = "confusion_matrices.json"
+    GROUP_COUNTS_FILE = "group_counts.json"
+    # Conteos por combinación de etiquetas reales acumulados por los trabajos batch (en temp/)
+    BATCH_GROUP_COUNTS_FILE = "batch_group_counts.json"
+    # Agregado de TP/FP/FN/TN por categoría de las evaluaciones batch (en temp/)
+    CONFUSION_AGGREGATE_FILE = "confusion_aggregate.json"
+    # Días que se conservan los buckets horarios del agregado (0 = sin límite)
+    CONFUSION_RETENTION_DAYS = float(os.getenv("TECHSPHERE_CONFUSION_RETENTION_DAYS", "90"))
     
     # Configuración de la API
     API_VERSION = "v1"
     API_PREFIX = f"/api/{API_VERSION}"
     APP_NAME = "TechSphere ML API"
     APP_VERSION = "1.0.0"
+    # Tamaño mínimo (bytes) de una respuesta para comprimirla con gzip
+    GZIP_MINIMUM_SIZE = int(os.getenv("TECHSPHERE_GZIP_MINIMUM_SIZE", "1000"))
     
     # Configuración del modelo
     MAX_TEXT_LENGTH = 512
-    
+    # Cargar el modelo al arrancar la API; si es False se carga con la primera predicción
+    PRELOAD_MODEL = os.getenv("TECHSPHERE_PRELOAD_MODEL", "1").lower() not in ("0", "false", "no")
+    # Presupuesto de arranque (segundos) para benchmarks/startup_benchmark.py
+    STARTUP_BUDGET_SECONDS = float(os.getenv("TECHSPHERE_STARTUP_BUDGET", "3.0"))
+
+    # Administración: sin token configurado los endpoints /admin quedan deshabilitados
+    ADMIN_TOKEN = os.getenv("TECHSPHERE_ADMIN_TOKEN")
+    PROFILE_MAX_SECONDS = int(os.getenv("TECHSPHERE_PROFILE_MAX_SECONDS", "60"))
+    PROFILE_SAMPLE_INTERVAL = float(os.getenv("TECHSPHERE_PROFILE_SAMPLE_INTERVAL", "0.005"))
+    # Modo torch: se perfila una de cada N unidades de inferencia, hasta un máximo por captura
+    # (iniciar y detener torch.profiler cuesta más que el forward que mide)
+    PROFILE_TORCH_EVERY = int(os.getenv("TECHSPHERE_PROFILE_TORCH_EVERY", "10"))
+    PROFILE_TORCH_MAX_UNITS = int(os.getenv("TECHSPHERE_PROFILE_TORCH_MAX_UNITS", "20"))
+
+    # Captura de tráfico de /ml/predict a JSONL rotativo (0 = deshabilitada)
+    CAPTURE_SAMPLE_RATE = float(os.getenv("TECHSPHERE_CAPTURE_SAMPLE_RATE", "0"))
+    # Por defecto solo se guarda el hash del texto; con 1 se guarda el texto completo
+    CAPTURE_INCLUDE_TEXT = os.getenv("TECHSPHERE_CAPTURE_INCLUDE_TEXT", "0").lower() in ("1", "true", "yes")
+    CAPTURE_PATH = Path(os.getenv("TECHSPHERE_CAPTURE_PATH", str(TEMP_DIR / "capture" / "requests.jsonl")))
+    CAPTURE_MAX_BYTES = int(os.getenv("TECHSPHERE_CAPTURE_MAX_BYTES", str(50 * 2**20)))
+    CAPTURE_BACKUP_COUNT = int(os.getenv("TECHSPHERE_CAPTURE_BACKUP_COUNT", "5"))
+    CAPTURE_QUEUE_SIZE = int(os.getenv("TECHSPHERE_CAPTURE_QUEUE_SIZE", "10000"))
+
+    # Índice de atribuciones (gradiente × entrada) para la importancia de características
+    ATTRIBUTION_INDEX_PATH = Path(os.getenv("TECHSPHERE_ATTRIBUTION_INDEX_PATH", str(TEMP_DIR / "attribution" / "feature_index.json")))
+    ATTRIBUTION_BATCH_SIZE = int(os.getenv("TECHSPHERE_ATTRIBUTION_BATCH_SIZE", "32"))
+    ATTRIBUTION_MAX_LENGTH = int(os.getenv("TECHSPHERE_ATTRIBUTION_MAX_LENGTH", "256"))
+    ATTRIBUTION_TOP_K = int(os.getenv("TECHSPHERE_ATTRIBUTION_TOP_K", "50"))
+    # Apariciones mínimas de un n-grama para entrar en el índice
+    ATTRIBUTION_MIN_COUNT = int(os.getenv("TECHSPHERE_ATTRIBUTION_MIN_COUNT", "3"))
+
+    # Probabilidades guardadas de trabajos batch para barridos de umbral (temp/jobs)
+    THRESHOLD_JOBS_TTL_HOURS = float(os.getenv("TECHSPHERE_THRESHOLD_JOBS_TTL_HOURS", "24"))
+    THRESHOLD_JOBS_MAX = int(os.getenv("TECHSPHERE_THRESHOLD_JOBS_MAX", "200"))
+    # Límite de umbrales × filas por barrido
+    THRESHOLD_SWEEP_MAX_CELLS = int(os.getenv("TECHSPHERE_THRESHOLD_SWEEP_MAX_CELLS", "100000000"))
+
+    # Inferencia fuera del event loop y control de admisión de /ml/predict y /ml/predict-batch
+    INFERENCE_WORKERS = int(os.getenv("TECHSPHERE_INFERENCE_WORKERS", "1"))
+    # Cuota de capacidad de cada carril de prioridad cuando varios tienen trabajo pendiente
+    INFERENCE_LANE_SHARES = os.getenv("TECHSPHERE_INFERENCE_LANE_SHARES", "interactive=0.8,batch=0.2,background=0.05")
+    # Presupuesto de tokens por tramo de un trabajo batch (filas × largo con padding);
+    # entre tramos se atienden las predicciones interactivas
+    BATCH_TOKEN_BUDGET = int(os.getenv("TECHSPHERE_BATCH_TOKEN_BUDGET", "4096"))
+    # Filas que la etapa de tokenización del pipeline batch prepara de una vez
+    BATCH_PIPELINE_CHUNK_ROWS = int(os.getenv("TECHSPHERE_BATCH_PIPELINE_CHUNK_ROWS", "256"))
+    # Elementos en cola entre etapas del pipeline batch
+    BATCH_PIPELINE_QUEUE_SIZE = int(os.getenv("TECHSPHERE_BATCH_PIPELINE_QUEUE_SIZE", "2"))
+    # Techo de RSS del proceso (MB) para los batches: por encima se achican los sub-batches (0 = sin techo)
+    BATCH_RSS_CEILING_MB = int(os.getenv("TECHSPHERE_BATCH_RSS_CEILING_MB", "0"))
+    # Trabajos pendientes o en ejecución a partir de los cuales se responde 429 (0 = sin límite)
+    ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv("TECHSPHERE_ADMISSION_MAX_QUEUE_DEPTH", "64"))
+    # Espera estimada (segundos) a partir de la cual se responde 429 (0 = sin límite)
+    ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("TECHSPHERE_ADMISSION_MAX_WAIT_SECONDS", "5.0"))
+
+    # Límite de uso por cliente (API key en X-API-Key o IP) con token buckets (capacidad 0 = deshabilitado)
+    # Cada request cuesta 1 unidad más los tokens estimados de los textos que predice
+    RATE_LIMIT_CAPACITY = float(os.getenv("TECHSPHERE_RATE_LIMIT_CAPACITY", "0"))
+    RATE_LIMIT_REFILL_PER_SECOND = float(os.getenv("TECHSPHERE_RATE_LIMIT_REFILL_PER_SECOND", "500"))
+    # memory (por worker) o sqlite (compartido entre los workers de la máquina)
+    RATE_LIMIT_STORE = os.getenv("TECHSPHERE_RATE_LIMIT_STORE", "memory").lower()
+    RATE_LIMIT_SQLITE_PATH = Path(os.getenv("TECHSPHERE_RATE_LIMIT_SQLITE_PATH", str(TEMP_DIR / "ratelimit.sqlite3")))
+    # API keys (separadas por coma) con bucket propio; cualquier otra key se limita por IP
+    RATE_LIMIT_API_KEYS = os.getenv("TECHSPHERE_RATE_LIMIT_API_KEYS", "")
+    # Usar X-Forwarded-For como IP del cliente (detrás de ngrok o de un proxy de confianza)
+    RATE_LIMIT_TRUST_FORWARDED = os.getenv("TECHSPHERE_RATE_LIMIT_TRUST_FORWARDED", "0").lower() in ("1", "true", "yes")
+    # Proxies de confianza que agregan su salto a X-Forwarded-For: la IP del cliente es la
+    # entrada N desde la derecha (las de más a la izquierda las controla el cliente)
+    RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("TECHSPHERE_RATE_LIMIT_TRUSTED_PROXIES", "1"))
+
+    # Configuración del servidor en producción (0 = calcular automáticamente)
+    WORKERS = int(os.getenv("TECHSPHERE_WORKERS", "0"))
+    TORCH_THREADS = int(os.getenv("TECHSPHERE_TORCH_THREADS", "0"))
+    MAX_REQUESTS = int(os.getenv("TECHSPHERE_MAX_REQUESTS", "5000"))
+    MAX_REQUESTS_JITTER = int(os.getenv("TECHSPHERE_MAX_REQUESTS_JITTER", "500"))
+    GRACEFUL_TIMEOUT = int(os.getenv("TECHSPHERE_GRACEFUL_TIMEOUT", "30"))
+    WORKER_TIMEOUT = int(os.getenv("TECHSPHERE_WORKER_TIMEOUT", "300"))
+
     @classmethod
     def get_model_path(cls) -> str:
         """Obtiene la ruta del modelo"""
@@ -30,6 +126,75 @@ class Config:
         """Obtiene la ruta raíz del proyecto"""
         return cls.BASE_DIR
     
+    @classmethod
+    def get_training_results_path(cls, filename: str) -> Path:
+        """Obtiene la ruta de un artefacto de training-results"""
+        return cls.TRAINING_RESULTS_DIR / filename
+    
+    @classmethod
+    def get_batch_group_counts_path(cls) -> Path:
+        """Obtiene la ruta de los conteos de etiquetas acumulados por los trabajos batch"""
+        return cls.TEMP_DIR / cls.BATCH_GROUP_COUNTS_FILE
+    
+    @classmethod
+    def get_confusion_aggregate_path(cls) -> Path:
+        """Obtiene la ruta del agregado de matrices de confusión de los trabajos batch"""
+        return cls.TEMP_DIR / cls.CONFUSION_AGGREGATE_FILE
+    
+    @classmethod
+    def get_attribution_index_path(cls) -> Path:
+        """Obtiene la ruta del índice de atribuciones"""
+        return cls.ATTRIBUTION_INDEX_PATH
+    
+    @classmethod
+    def get_temp_dir(cls, *parts: str) -> Path:
+        """Obtiene (y crea) un directorio bajo temp/ para artefactos generados"""
+        path = cls.TEMP_DIR.joinpath(*parts)
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    @classmethod
+    def get_inference_lane_shares(cls) -> Dict[str, float]:
+        """Cuotas por carril de TECHSPHERE_INFERENCE_LANE_SHARES ("interactive=0.8,batch=0.2,background=0.05")"""
+        shares = {}
+        for entry in cls.INFERENCE_LANE_SHARES.split(","):
+            lane, _, value = entry.partition("=")
+            shares[lane.strip()] = float(value)
+        # El carril de los trabajos en segundo plano (atribuciones) existe aunque no se configure
+        shares.setdefault("background", 0.05)
+        missing = {"interactive", "batch"} - set(shares)
+        if missing or any(share <= 0 for share in shares.values()):
+            raise ValueError(f"TECHSPHERE_INFERENCE_LANE_SHARES inválido: {cls.INFERENCE_LANE_SHARES}")
+        return shares
+    
+    @classmethod
+    def get_rate_limit_api_keys(cls) -> Set[str]:
+        """API keys de TECHSPHERE_RATE_LIMIT_API_KEYS"""
+        return {key.strip() for key in cls.RATE_LIMIT_API_KEYS.split(",") if key.strip()}
+    
+    @classmethod
+    def get_cpu_count(cls) -> int:
+        """Obtiene los núcleos disponibles para el proceso (respeta cpusets de contenedores)"""
+        try:
+            return len(os.sched_getaffinity(0))
+        except AttributeError:
+            return os.cpu_count() or 1
+
+    @classmethod
+    def get_worker_count(cls) -> int:
+        """Obtiene el número de workers para el modo producción"""
+        if cls.WORKERS > 0:
+            return cls.WORKERS
+        # Cada worker usa varios hilos de torch; la mitad de los núcleos evita sobresuscripción
+        return max(1, cls.get_cpu_count() // 2)
+
+    @classmethod
+    def get_torch_threads(cls, workers: int) -> int:
+        """Obtiene los hilos de torch por worker repartiendo los núcleos disponibles"""
+        if cls.TORCH_THREADS > 0:
+            return cls.TORCH_THREADS
+        return max(1, cls.get_cpu_count() // max(1, workers))
+
     @classmethod
     def is_cuda_available(cls) -> bool:
         """Verifica si CUDA está disponible"""
@@ -0,0 +1,40 @@
+"""
+Cancelación del trabajo de un request cuando el cliente se desconecta
+"""
+import asyncio
+import contextlib
+from typing import Any, Awaitable
+
+from fastapi import Request
+
+# Código de estado (convención de nginx) para requests abandonados por el cliente
+CLIENT_CLOSED_REQUEST = 499
+
+class ClientDisconnectedError(Exception):
+    """El cliente cerró la conexión antes de recibir la respuesta"""
+
+async def _wait_for_disconnect(request: Request):
+    # Con el cuerpo ya leído, el servidor solo entrega http.disconnect
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[Any]) -> Any:
+    """Espera `awaitable` y lo cancela si el cliente se desconecta
+
+    Debe llamarse con el cuerpo del request ya leído. Al cancelar, el trabajo que
+    todavía espera en la cola de inferencia se retira sin ejecutarse; lanza
+    ClientDisconnectedError.
+    """
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            raise ClientDisconnectedError("Cliente desconectado")
+        return task.result()
+    finally:
+        task.cancel()
+        watcher.cancel()
@@ -0,0 +1,31 @@
+"""
+Bloqueo entre procesos para archivos que varios workers leen, modifican y reescriben
+"""
+import contextlib
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: sin flock; allí no hay workers forkeados (ver run_api.py)
+    fcntl = None
+
+@contextlib.contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Bloqueo exclusivo sobre `<path>.lock` mientras dura el bloque
+
+    El lock se toma sobre un archivo aparte porque los datos se reemplazan con
+    os.replace (un flock sobre el archivo original quedaría en el inodo viejo).
+    Combinarlo con un threading.Lock para los hilos del mismo proceso.
+    """
+    lock_path = path.with_name(path.name + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
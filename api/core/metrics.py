@@ -0,0 +1,332 @@
+"""
+Métricas en formato de texto de Prometheus
+
+Registro mínimo de contadores, gauges e histogramas sin dependencias externas.
+Cada serie tiene su propio lock y la observación es una búsqueda binaria sobre
+los buckets, de modo que la instrumentación puede quedar activa en producción.
+"""
+import bisect
+import os
+import sys
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Buckets por defecto para latencias (segundos)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets para tamaños de batch (número de textos por forward)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+def _format_value(value: float) -> str:
+    """Formatea un valor numérico según la exposición de Prometheus"""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    """Escapa un valor de etiqueta (barra invertida, comillas y saltos de línea)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    """Formatea las etiquetas de una serie"""
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class _Metric:
+    """Base de las métricas con etiquetas"""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Las métricas sin etiquetas se exponen desde el inicio con valor 0
+            self._children[()] = self._new_child()
+
+    def labels(self, *values: str):
+        """Obtiene (o crea) la serie para los valores de etiqueta dados"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera etiquetas {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        """Serie sin etiquetas"""
+        return self.labels()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for key, child in list(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def get(self) -> float:
+        return self._value
+
+    def render(self, name, labelnames, key) -> List[str]:
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self._value)}"]
+
+class Counter(_Metric):
+    """Contador monótono"""
+
+    metric_type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+class _GaugeChild(_CounterChild):
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+class Gauge(_Metric):
+    """Valor que puede subir y bajar; opcionalmente calculado al exponer"""
+
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._callback = callback
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def render(self) -> List[str]:
+        if self._callback is not None:
+            self.set(self._callback())
+        return super().render()
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+    def render(self, name, labelnames, key) -> List[str]:
+        counts, total = self.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._buckets + (float("inf"),), counts):
+            cumulative += count
+            le = ("le", _format_value(bound))
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {cumulative}")
+        return lines
+
+class Histogram(_Metric):
+    """Histograma de buckets acumulativos"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+class MetricsRegistry:
+    """Registro de métricas expuesto en /metrics"""
+
+    # Starlette añade "; charset=utf-8" a los tipos text/*
+    CONTENT_TYPE = "text/plain; version=0.0.4"
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Genera la exposición completa en formato de texto"""
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+def get_process_rss_bytes() -> float:
+    """Memoria residente actual del proceso (pico de RSS si /proc no está disponible)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return float(resident_pages * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Windows: no hay /proc ni resource
+        return 0.0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return float(max_rss if sys.platform == "darwin" else max_rss * 1024)
+
+# Registro global y métricas de la aplicación
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "techsphere_http_requests_total",
+    "Requests HTTP atendidos por ruta, método y código de estado",
+    ("method", "route", "status")
+)
+HTTP_REQUEST_DURATION = registry.histogram(
+    "techsphere_http_request_duration_seconds",
+    "Latencia de los requests HTTP por ruta",
+    ("route",)
+)
+INFERENCE_STAGE_DURATION = registry.histogram(
+    "techsphere_inference_stage_seconds",
+    "Latencia de inferencia por etapa (tokenize, forward, postprocess)",
+    ("stage",)
+)
+INFERENCE_BATCH_SIZE = registry.histogram(
+    "techsphere_inference_batch_size",
+    "Número de textos por forward del modelo",
+    buckets=BATCH_SIZE_BUCKETS
+)
+INFERENCE_QUEUE_DEPTH = registry.gauge(
+    "techsphere_inference_queue_depth",
+    "Predicciones pendientes o en ejecución"
+)
+INFERENCE_QUEUE_WAIT = registry.histogram(
+    "techsphere_inference_queue_wait_seconds",
+    "Espera en la cola de inferencia antes de ejecutarse, por carril de prioridad",
+    ("lane",)
+)
+INFERENCE_REJECTED = registry.counter(
+    "techsphere_inference_rejected_total",
+    "Trabajos de inferencia rechazados por control de admisión (429), por carril de prioridad",
+    ("lane",)
+)
+INFERENCE_CANCELLED = registry.counter(
+    "techsphere_inference_cancelled_total",
+    "Unidades de inferencia canceladas por desconexión del cliente, por carril y etapa (queued/running)",
+    ("lane", "stage")
+)
+INFERENCE_COALESCED = registry.counter(
+    "techsphere_inference_coalesced_total",
+    "Predicciones que reutilizaron un cálculo idéntico en curso (forwards evitados)"
+)
+RATE_LIMITED = registry.counter(
+    "techsphere_rate_limited_total",
+    "Requests rechazados (429) por el límite de uso por cliente"
+)
+CACHE_REQUESTS = registry.counter(
+    "techsphere_cache_requests_total",
+    "Consultas a caches internas por resultado (hit/miss)",
+    ("cache", "result")
+)
+BATCH_JOBS = registry.counter(
+    "techsphere_batch_jobs_total",
+    "Trabajos de predicción batch por estado",
+    ("status",)
+)
+BATCH_ROWS = registry.counter(
+    "techsphere_batch_rows_total",
+    "Filas procesadas en trabajos batch"
+)
+BATCH_ROWS_PER_SECOND = registry.gauge(
+    "techsphere_batch_rows_per_second",
+    "Throughput (filas por segundo) del último trabajo batch"
+)
+BATCH_BACKOFFS = registry.counter(
+    "techsphere_batch_backoffs_total",
+    "Sub-batches divididos y reintentados por falta de memoria (rss: techo de RSS, oom: asignación fallida)",
+    ("reason",)
+)
+BATCH_ROW_ERRORS = registry.counter(
+    "techsphere_batch_row_errors_total",
+    "Filas de trabajos batch aisladas por bisección y marcadas con error"
+)
+BATCH_DEDUPLICATED_ROWS = registry.counter(
+    "techsphere_batch_deduplicated_rows_total",
+    "Filas de trabajos batch con texto repetido que reutilizaron la predicción de su primera aparición"
+)
+BATCH_PIPELINE_SECONDS = registry.counter(
+    "techsphere_batch_pipeline_seconds_total",
+    "Segundos de cada etapa del pipeline batch (tokenize/forward/write) por estado (busy/idle/blocked)",
+    ("stage", "state")
+)
+BATCH_TOKEN_BUDGET = registry.gauge(
+    "techsphere_batch_token_budget",
+    "Presupuesto efectivo de tokens (filas × largo con padding) por forward en trabajos batch"
+)
+CAPTURE_RECORDS = registry.counter(
+    "techsphere_capture_records_total",
+    "Registros de captura de tráfico por resultado (queued/dropped)",
+    ("result",)
+)
+PROCESS_RSS = registry.gauge(
+    "process_resident_memory_bytes",
+    "Memoria residente del proceso en bytes",
+    callback=get_process_rss_bytes
+)
@@ -0,0 +1,233 @@
+"""
+Límite de uso por cliente con token buckets y costo según el trabajo del request
+
+Cada cliente (API key configurada o IP) tiene un bucket de `RATE_LIMIT_CAPACITY` unidades que
+se rellena a `RATE_LIMIT_REFILL_PER_SECOND` unidades por segundo. Todo request
+cuesta 1 unidad; las predicciones suman además los tokens estimados de cada texto,
+de modo que un lote de 10.000 filas gasta mucho más que una consulta de analytics.
+
+El estado vive en memoria del proceso o, para varios workers en la misma máquina,
+en un archivo SQLite compartido.
+"""
+import asyncio
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from .config import config
+from .metrics import RATE_LIMITED
+
+# Tokens por palabra estimados para el tokenizador WordPiece de SciBERT en textos científicos
+TOKENS_PER_WORD = 1.3
+
+@dataclass
+class RateLimitState:
+    """Resultado de cobrar un request al bucket del cliente"""
+    allowed: bool
+    cost: float
+    remaining: float
+    retry_after: float
+    reset_after: float
+
+    def headers(self) -> Dict[str, str]:
+        """Headers X-RateLimit-* (y Retry-After si se rechazó)"""
+        headers = {
+            "X-RateLimit-Limit": str(math.floor(config.RATE_LIMIT_CAPACITY)),
+            "X-RateLimit-Remaining": str(max(0, math.floor(self.remaining))),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+            "X-RateLimit-Cost": str(math.ceil(self.cost)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+def _refill(tokens: float, updated: float, now: float, capacity: float, rate: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+def _take(tokens: float, cost: float, capacity: float, rate: float) -> Tuple[bool, float, float]:
+    """Aplica el cobro; retorna (permitido, tokens restantes, segundos hasta poder reintentar)
+
+    Un request más caro que la capacidad se admite con el bucket lleno y deja el
+    saldo en negativo: el cliente espera a que se recupere antes del siguiente.
+    """
+    needed = min(cost, capacity)
+    if tokens >= needed:
+        return True, tokens - cost, 0.0
+    return False, tokens, (needed - tokens) / rate
+
+class MemoryBucketStore:
+    """Buckets en memoria del proceso (un límite por worker)"""
+
+    # consume no bloquea: se llama directamente desde el event loop
+    blocking = False
+
+    # Por encima de este número de clientes se descartan los buckets ya llenos
+    MAX_BUCKETS = 10000
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, cost: float, capacity: float, rate: float, now: float) -> Tuple[bool, float, float]:
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated, now, capacity, rate)
+            allowed, tokens, retry_after = _take(tokens, cost, capacity, rate)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.MAX_BUCKETS:
+                self._prune(now, capacity, rate)
+            return allowed, tokens, retry_after
+
+    def _prune(self, now: float, capacity: float, rate: float):
+        self._buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+            if _refill(tokens, updated, now, capacity, rate) < capacity
+        }
+
+class SQLiteBucketStore:
+    """Buckets en un archivo SQLite compartido por los workers de la máquina"""
+
+    # consume puede esperar el lock de escritura de otro worker: se ejecuta en un hilo
+    blocking = True
+    # Cada cuántos cobros de este proceso se descartan los buckets ya llenos
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def consume(self, key: str, cost: float, capacity: float, rate: float, now: float) -> Tuple[bool, float, float]:
+        connection = self._connection()
+        # BEGIN IMMEDIATE serializa la lectura y escritura del bucket entre procesos
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = _refill(tokens, updated, now, capacity, rate)
+            allowed, tokens, retry_after = _take(tokens, cost, capacity, rate)
+            connection.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now)
+            )
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                # Un bucket que ya se rellenó por completo equivale a no tenerlo
+                connection.execute(
+                    "DELETE FROM buckets WHERE tokens + (? - updated) * ? >= ?", (now, rate, capacity)
+                )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return allowed, tokens, retry_after
+
+class RateLimiter:
+    """Cobra el costo de cada request al bucket de su cliente"""
+
+    def __init__(self, capacity: float, refill_per_second: float, store, api_keys: Set[str]):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.store = store
+        self.api_keys = api_keys
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0 and self.refill_per_second > 0
+
+    def client_key(self, request: Request) -> str:
+        """API key (hasheada) si X-API-Key es una de las configuradas; si no, la IP del cliente
+
+        Una key desconocida no abre un bucket propio: de lo contrario, enviar una key
+        distinta en cada request daría un bucket lleno cada vez.
+        """
+        api_key = request.headers.get("x-api-key")
+        if api_key and api_key in self.api_keys:
+            return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        forwarded = request.headers.get("x-forwarded-for")
+        if config.RATE_LIMIT_TRUST_FORWARDED and forwarded:
+            # Los proxies agregan al final: solo las últimas RATE_LIMIT_TRUSTED_PROXIES entradas
+            # son confiables y la primera de ellas es la IP que vio el proxy más externo
+            hops = [hop.strip() for hop in forwarded.split(",")]
+            trusted = max(1, config.RATE_LIMIT_TRUSTED_PROXIES)
+            if len(hops) >= trusted and hops[-trusted]:
+                return "ip:" + hops[-trusted]
+        return "ip:" + (request.client.host if request.client else "unknown")
+
+    async def charge(self, request: Request, cost: float):
+        """Cobra `cost` unidades al cliente; lanza 429 con Retry-After si no le alcanza el saldo
+
+        Los headers X-RateLimit-* se añaden a la respuesta desde el middleware.
+        """
+        if not self.enabled:
+            return
+        consume_args = (self.client_key(request), cost, self.capacity, self.refill_per_second, time.time())
+        if self.store.blocking:
+            allowed, remaining, retry_after = await asyncio.to_thread(self.store.consume, *consume_args)
+        else:
+            allowed, remaining, retry_after = self.store.consume(*consume_args)
+        state = RateLimitState(
+            allowed=allowed,
+            cost=cost + getattr(request.state, "rate_limit_cost", 0.0),
+            remaining=remaining,
+            retry_after=retry_after,
+            reset_after=(self.capacity - remaining) / self.refill_per_second
+        )
+        request.state.rate_limit = state
+        request.state.rate_limit_cost = state.cost
+        if not allowed:
+            RATE_LIMITED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Límite de uso excedido (costo {math.ceil(cost)}); reintente en {math.ceil(retry_after)}s",
+                headers=state.headers()
+            )
+
+def estimate_tokens(texts: Iterable[str]) -> int:
+    """Tokens estimados que procesará el modelo (truncados a MAX_TEXT_LENGTH por texto)"""
+    return sum(
+        min(config.MAX_TEXT_LENGTH, math.ceil(len(str(text).split()) * TOKENS_PER_WORD) + 2)
+        for text in texts
+    )
+
+def _create_store():
+    if config.RATE_LIMIT_STORE == "sqlite":
+        return SQLiteBucketStore(config.RATE_LIMIT_SQLITE_PATH)
+    if config.RATE_LIMIT_STORE != "memory":
+        raise ValueError(f"TECHSPHERE_RATE_LIMIT_STORE inválido: {config.RATE_LIMIT_STORE} (memory o sqlite)")
+    return MemoryBucketStore()
+
+# Limitador global
+rate_limiter = RateLimiter(
+    config.RATE_LIMIT_CAPACITY,
+    config.RATE_LIMIT_REFILL_PER_SECOND,
+    _create_store(),
+    config.get_rate_limit_api_keys()
+)
+
+async def rate_limit_request(request: Request):
+    """Dependencia de los routers: cobra el costo base (1 unidad) de cada request"""
+    await rate_limiter.charge(request, 1)
+
+def rate_limit_headers(request: Request) -> Optional[Dict[str, str]]:
+    """Headers X-RateLimit-* del request, si se le cobró algo"""
+    state = getattr(request.state, "rate_limit", None)
+    return state.headers() if state is not None else None
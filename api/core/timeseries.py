@@ -0,0 +1,157 @@
+"""
+Series temporales en memoria de tamaño fijo (por minuto, hora y día)
+
+Cada nivel guarda sus buckets por índice absoluto de intervalo (inicio en UTC /
+resolución) y descarta los que quedan fuera de la ventana del nivel (p.ej. las
+últimas 180 minutos), sin importar cuántos eventos hubo. Cada evento se suma al
+bucket actual de los tres niveles, así que los niveles horario y diario son el
+agregado de los minutos correspondientes. Al consultar, los intervalos sin eventos
+se completan con buckets vacíos: la serie es continua en el tiempo. Las latencias
+se acumulan en un histograma de bins logarítmicos, de modo que los percentiles se
+estiman sin guardar muestras. La memoria es constante sin importar cuánto tiempo
+lleve el proceso en ejecución.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Bins de latencia: 1 ms a ~100 s en escala logarítmica (el último bin acumula el resto)
+LATENCY_BIN_EDGES = np.geomspace(0.001, 100.0, 61)
+
+# Resolución (segundos) y número de buckets por nivel
+TIERS = {
+    "minute": (60, 180),
+    "hour": (3600, 72),
+    "day": (86400, 90),
+}
+
+class TimeBucket:
+    """Señales operativas y de calidad agregadas en un intervalo"""
+
+    __slots__ = (
+        "start", "requests", "errors", "latency_hist",
+        "batch_jobs", "batch_rows", "batch_seconds",
+        "eval_jobs", "f1_sum", "hamming_sum", "exact_match_sum"
+    )
+
+    def __init__(self, start: int):
+        self.start = start
+        self.requests = 0
+        self.errors = 0
+        self.latency_hist = np.zeros(len(LATENCY_BIN_EDGES) + 1, dtype=np.int64)
+        self.batch_jobs = 0
+        self.batch_rows = 0
+        self.batch_seconds = 0.0
+        self.eval_jobs = 0
+        self.f1_sum = 0.0
+        self.hamming_sum = 0.0
+        self.exact_match_sum = 0.0
+
+    def latency_percentile(self, pct: float) -> Optional[float]:
+        """Percentil estimado como el límite superior del bin que lo contiene"""
+        if self.requests == 0:
+            return None
+        rank = np.searchsorted(np.cumsum(self.latency_hist), pct / 100 * self.requests)
+        return float(LATENCY_BIN_EDGES[min(rank, len(LATENCY_BIN_EDGES) - 1)])
+
+class TimeSeriesStore:
+    """Ventanas por nivel con las mismas señales a distinta resolución"""
+
+    def __init__(self, tiers: Dict[str, tuple] = TIERS):
+        # Nivel → {índice absoluto del intervalo: bucket}
+        self._tiers: Dict[str, Dict[int, TimeBucket]] = {name: {} for name in tiers}
+        self._resolution = {name: resolution for name, (resolution, _) in tiers.items()}
+        self._size = {name: size for name, (_, size) in tiers.items()}
+        self._lock = threading.Lock()
+
+    def _buckets(self, now: float) -> List[TimeBucket]:
+        """Bucket actual de cada nivel (lo crea al cambiar de intervalo y descarta los que salen de la ventana)"""
+        current = []
+        for name, buckets in self._tiers.items():
+            slot = int(now // self._resolution[name])
+            if slot not in buckets:
+                buckets[slot] = TimeBucket(slot * self._resolution[name])
+                oldest = slot - self._size[name] + 1
+                for stale in [key for key in buckets if key < oldest]:
+                    del buckets[stale]
+            current.append(buckets[slot])
+        return current
+
+    def record_request(self, latency_seconds: float, status_code: int, now: Optional[float] = None):
+        """Registra un request HTTP"""
+        bin_index = int(np.searchsorted(LATENCY_BIN_EDGES, latency_seconds))
+        with self._lock:
+            for bucket in self._buckets(now if now is not None else time.time()):
+                bucket.requests += 1
+                bucket.errors += status_code >= 500
+                bucket.latency_hist[bin_index] += 1
+
+    def record_batch(
+        self,
+        rows: int,
+        seconds: float,
+        f1_score: Optional[float] = None,
+        hamming_loss: Optional[float] = None,
+        exact_match_ratio: Optional[float] = None,
+        now: Optional[float] = None
+    ):
+        """Registra un trabajo batch completado y, si tenía etiquetas, su evaluación"""
+        with self._lock:
+            for bucket in self._buckets(now if now is not None else time.time()):
+                bucket.batch_jobs += 1
+                bucket.batch_rows += rows
+                bucket.batch_seconds += seconds
+                if f1_score is not None:
+                    bucket.eval_jobs += 1
+                    bucket.f1_sum += f1_score
+                    bucket.hamming_sum += hamming_loss or 0.0
+                    bucket.exact_match_sum += exact_match_ratio or 0.0
+
+    def query(self, tier: str, limit: Optional[int] = None, now: Optional[float] = None) -> Dict[str, Any]:
+        """Series de un nivel en orden cronológico, hasta el intervalo actual (None donde no hubo datos)
+
+        Cubre desde el primer intervalo con datos aún en la ventana (o los últimos `limit`
+        intervalos); los intervalos sin eventos aparecen con cero requests.
+        """
+        if tier not in self._tiers:
+            raise ValueError(f"Resolución inválida: {tier}. Opciones: {list(self._tiers)}")
+
+        with self._lock:
+            resolution = self._resolution[tier]
+            stored = self._tiers[tier]
+            current = int((now if now is not None else time.time()) // resolution)
+            first = max(min(stored, default=current + 1), current - self._size[tier] + 1)
+            if limit:
+                first = max(first, current - limit + 1)
+            buckets = [stored.get(slot) or TimeBucket(slot * resolution) for slot in range(first, current + 1)]
+            resolution_minutes = resolution / 60
+
+            def ms(value: Optional[float]) -> Optional[float]:
+                return round(value * 1000, 2) if value is not None else None
+
+            def per_eval(total: float, bucket: TimeBucket) -> Optional[float]:
+                return round(total / bucket.eval_jobs, 4) if bucket.eval_jobs else None
+
+            return {
+                "resolution": tier,
+                "timestamps": [datetime.fromtimestamp(b.start, tz=timezone.utc).isoformat() for b in buckets],
+                "requests": [b.requests for b in buckets],
+                "requests_per_minute": [round(b.requests / resolution_minutes, 2) for b in buckets],
+                "error_rate": [round(b.errors / b.requests, 4) if b.requests else None for b in buckets],
+                "latency_p50_ms": [ms(b.latency_percentile(50)) for b in buckets],
+                "latency_p95_ms": [ms(b.latency_percentile(95)) for b in buckets],
+                "latency_p99_ms": [ms(b.latency_percentile(99)) for b in buckets],
+                "batch_jobs": [b.batch_jobs for b in buckets],
+                "batch_rows_per_second": [
+                    round(b.batch_rows / b.batch_seconds, 1) if b.batch_seconds else None for b in buckets
+                ],
+                "f1_scores": [per_eval(b.f1_sum, b) for b in buckets],
+                "hamming_loss": [per_eval(b.hamming_sum, b) for b in buckets],
+                "exact_match_ratio": [per_eval(b.exact_match_sum, b) for b in buckets],
+            }
+
+# Store global del proceso
+timeseries_store = TimeSeriesStore()
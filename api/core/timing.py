@@ -0,0 +1,93 @@
+"""
+Tiempos por request para el header Server-Timing y el log estructurado
+
+El middleware abre un diccionario de tiempos por request en un ContextVar; los
+servicios suman ahí la duración de sus etapas (tokenize, forward, ...) y
+TimedRoute añade el tiempo de serialización de la respuesta.
+"""
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from fastapi.routing import APIRoute
+
+# Marca interna: instante en que el endpoint retornó (no se expone en Server-Timing)
+_ENDPOINT_END = "_endpoint_end"
+
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+def start_request_timings() -> Dict[str, float]:
+    """Inicia el registro de tiempos del request actual"""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+def get_request_timings() -> Optional[Dict[str, float]]:
+    """Obtiene los tiempos del request actual (None fuera de un request)"""
+    return _request_timings.get()
+
+def record_timing(stage: str, seconds: float, timings: Optional[Dict[str, float]] = None):
+    """Acumula la duración de una etapa en los tiempos del request"""
+    if timings is None:
+        timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+def public_timings(timings: Dict[str, float]) -> Dict[str, float]:
+    """Tiempos en milisegundos sin las marcas internas"""
+    return {
+        stage: round(seconds * 1000, 2)
+        for stage, seconds in timings.items()
+        if not stage.startswith("_")
+    }
+
+def format_server_timing(timings: Dict[str, float], total_seconds: float) -> str:
+    """Formatea los tiempos como valor del header Server-Timing"""
+    entries = [f"{stage};dur={ms}" for stage, ms in public_timings(timings).items()]
+    entries.append(f"total;dur={round(total_seconds * 1000, 2)}")
+    return ", ".join(entries)
+
+def _mark_endpoint_end():
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[_ENDPOINT_END] = time.perf_counter()
+
+def _wrap_endpoint(call: Callable) -> Callable:
+    """Envuelve el endpoint para marcar el instante en que retorna"""
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def timed_call(*args, **kwargs):
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                _mark_endpoint_end()
+    else:
+        @functools.wraps(call)
+        def timed_call(*args, **kwargs):
+            try:
+                return call(*args, **kwargs)
+            finally:
+                _mark_endpoint_end()
+    return timed_call
+
+class TimedRoute(APIRoute):
+    """Ruta que mide la serialización de la respuesta (desde que retorna el endpoint)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # El handler resuelve dependant.call en cada request, así que basta con reemplazarlo
+        self.dependant.call = _wrap_endpoint(self.dependant.call)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            timings = _request_timings.get()
+            if timings is not None and _ENDPOINT_END in timings:
+                record_timing("serialize", time.perf_counter() - timings.pop(_ENDPOINT_END), timings)
+            return response
+
+        return timed_handler
@@ -0,0 +1,66 @@
+"""
+Entrada pre-tokenizada: ids de tokens en base64 (int16/int32) o en archivos NumPy (.npy/.npz)
+"""
+import base64
+import binascii
+import io
+from typing import List
+
+import numpy as np
+
+# Los arreglos en base64 son little-endian, como los produce numpy en x86/ARM
+TOKEN_DTYPES = {"int16": np.dtype("<i2"), "int32": np.dtype("<i4")}
+
+class TokenIdsError(ValueError):
+    """Ids de tokens con formato inválido o incompatibles con el tokenizador del modelo"""
+
+def decode_base64_ids(data: str, dtype: str) -> np.ndarray:
+    """Decodifica un arreglo de ids; retorna una vista sobre los bytes decodificados (sin copia)"""
+    if dtype not in TOKEN_DTYPES:
+        raise TokenIdsError(f"dtype inválido: {dtype}. Opciones: {list(TOKEN_DTYPES)}")
+    try:
+        raw = base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise TokenIdsError(f"token_ids no es base64 válido: {str(e)}")
+    if len(raw) % TOKEN_DTYPES[dtype].itemsize:
+        raise TokenIdsError(f"El largo de token_ids ({len(raw)} bytes) no es múltiplo de {dtype}")
+    return np.frombuffer(raw, dtype=TOKEN_DTYPES[dtype])
+
+def load_token_rows(contents: bytes, pad_token_id: int) -> List[np.ndarray]:
+    """Ids de cada fila desde un archivo NumPy; cada fila es una vista del arreglo cargado
+
+    Formatos aceptados:
+    - .npz con `input_ids` (ids de todas las filas concatenados) y `offsets` (filas + 1,
+      inicio de cada fila y fin de la última)
+    - .npy 2-D (filas × largo) con padding `pad_token_id` a la derecha, como el
+      `input_ids` que retorna el tokenizador con return_tensors="np"
+    """
+    try:
+        loaded = np.load(io.BytesIO(contents), allow_pickle=False)
+    except Exception as e:
+        raise TokenIdsError(f"Archivo de tokens inválido (se espera .npy o .npz): {str(e)}")
+
+    if isinstance(loaded, np.lib.npyio.NpzFile):
+        with loaded:
+            if "input_ids" not in loaded or "offsets" not in loaded:
+                raise TokenIdsError("El .npz debe contener 'input_ids' y 'offsets'")
+            input_ids, offsets = loaded["input_ids"], loaded["offsets"]
+        _check_integer(input_ids, "input_ids")
+        _check_integer(offsets, "offsets")
+        if input_ids.ndim != 1 or offsets.ndim != 1 or len(offsets) < 1:
+            raise TokenIdsError("'input_ids' y 'offsets' deben ser arreglos 1-D")
+        if offsets[0] != 0 or offsets[-1] != len(input_ids) or (np.diff(offsets) < 0).any():
+            raise TokenIdsError("'offsets' debe empezar en 0, ser creciente y terminar en len(input_ids)")
+        return [input_ids[start:end] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    _check_integer(loaded, "input_ids")
+    if loaded.ndim != 2:
+        raise TokenIdsError("El .npy debe ser un arreglo 2-D (filas × largo)")
+    # Largo de cada fila: hasta el último token que no es padding
+    not_padding = loaded != pad_token_id
+    lengths = np.where(not_padding.any(axis=1), loaded.shape[1] - np.argmax(not_padding[:, ::-1], axis=1), 0)
+    return [row[:length] for row, length in zip(loaded, lengths.tolist())]
+
+def _check_integer(array: np.ndarray, name: str):
+    if not np.issubdtype(array.dtype, np.integer):
+        raise TokenIdsError(f"'{name}' debe ser de tipo entero (int16/int32), no {array.dtype}")
@@ -1,15 +1,25 @@
 """
 TechSphere ML API - API para análisis de textos científicos con SciBERT
 """
+import json
 import logging
+import time
+from datetime import datetime
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
 
 from .core.config import config
-from .controllers import ml_controller, analytics_controller, system_controller, files_controller
+from .core.metrics import HTTP_REQUESTS, HTTP_REQUEST_DURATION
+from .core.ratelimit import rate_limit_headers
+from .core.timeseries import timeseries_store
+from .core.timing import start_request_timings, public_timings, format_server_timing
+from .controllers import ml_controller, analytics_controller, system_controller, files_controller, metrics_controller, admin_controller
+from .services.ml_service import ml_service
+from .services.capture_service import capture_service
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -75,25 +85,66 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "Server-Timing", "ETag", "Last-Modified", "Retry-After",
+        "X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset", "X-RateLimit-Cost"
+    ],
 )
 
+# Comprimir respuestas grandes (dashboard, CSVs de resultados) si el cliente acepta gzip
+app.add_middleware(GZipMiddleware, minimum_size=config.GZIP_MINIMUM_SIZE)
+
 # Incluir routers
 app.include_router(system_controller.router, prefix=config.API_PREFIX)
 app.include_router(ml_controller.router, prefix=config.API_PREFIX)
 app.include_router(analytics_controller.router, prefix=config.API_PREFIX)
 app.include_router(files_controller.router, prefix=config.API_PREFIX)
+app.include_router(admin_controller.router, prefix=config.API_PREFIX)
+# Las métricas se exponen en /metrics, la ruta por defecto de los scrapers de Prometheus
+app.include_router(metrics_controller.router)
+
+# Carga del modelo al arranque (en modo producción ya viene precargado desde el proceso padre)
+@app.on_event("startup")
+async def load_model_on_startup():
+    """Carga el modelo al iniciar la API si la precarga está habilitada"""
+    if config.PRELOAD_MODEL:
+        ml_service.load_model()
+
+@app.on_event("shutdown")
+async def flush_traffic_capture():
+    """Escribe los registros de captura pendientes antes de terminar"""
+    capture_service.stop()
 
 # Middleware para logging de requests
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Middleware para logging de requests"""
-    start_time = request.state.start_time = request.headers.get("x-start-time")
-    
-    logger.info(f"Request: {request.method} {request.url}")
+    """Middleware de tiempos: header Server-Timing, métricas y una línea de log estructurada por request"""
+    request_start = time.perf_counter()
+    timings = start_request_timings()
     
     response = await call_next(request)
     
-    logger.info(f"Response: {response.status_code}")
+    total_seconds = time.perf_counter() - request_start
+    response.headers["Server-Timing"] = format_server_timing(timings, total_seconds)
+    # Saldo del límite de uso del cliente
+    response.headers.update(rate_limit_headers(request) or {})
+    
+    # Usar la plantilla de la ruta (no la URL) para acotar la cardinalidad de las métricas
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else "unmatched"
+    HTTP_REQUESTS.labels(request.method, route_path, response.status_code).inc()
+    HTTP_REQUEST_DURATION.labels(route_path).observe(total_seconds)
+    timeseries_store.record_request(total_seconds, response.status_code)
+    
+    logger.info(json.dumps({
+        "event": "request",
+        "method": request.method,
+        "path": request.url.path,
+        "route": route_path,
+        "status": response.status_code,
+        "duration_ms": round(total_seconds * 1000, 2),
+        "timings_ms": public_timings(timings)
+    }))
     
     return response
 
@@ -108,7 +159,7 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={
             "error": "Error interno del servidor",
             "detail": "Ha ocurrido un error inesperado",
-            "timestamp": request.state.start_time
+            "timestamp": datetime.now().isoformat()
         }
     )
 
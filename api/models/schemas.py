@@ -2,7 +2,7 @@
 Modelos de datos para las solicitudes y respuestas
 """
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 from enum import Enum
 
 class PredictionRequest(BaseModel):
@@ -28,6 +28,22 @@ class PredictionRequest(BaseModel):
             }
         }
 
+class TokenizedPredictionRequest(BaseModel):
+    """Modelo para solicitudes de predicción con ids de tokens ya calculados"""
+    token_ids: str = Field(
+        ...,
+        description="Ids de tokens del vocabulario del modelo (con [CLS] y [SEP]) como arreglo little-endian codificado en base64",
+        min_length=1
+    )
+    dtype: Literal["int16", "int32"] = Field(default="int32", description="Tipo de los ids en token_ids")
+    vocab_hash: str = Field(..., description="Hash del vocabulario con el que se tokenizó (GET /api/v1/info, campo vocab_hash)")
+    threshold: Optional[float] = Field(
+        default=0.5,
+        description="Umbral de confianza para clasificación multilabel (0.0-1.0)",
+        ge=0.0,
+        le=1.0
+    )
+
 class PredictionResponse(BaseModel):
     """Modelo para respuestas de predicción"""
     predicted_class: str = Field(..., description="Clase predicha")
@@ -66,6 +82,9 @@ class ConfusionMatrixMetricsResponse(BaseModel):
     """Modelo para métricas de matriz de confusión por categoría"""
     category_metrics: Dict[str, Dict[str, int]] = Field(..., description="Métricas TN, FP, FN, TP por categoría")
     categories: List[str] = Field(..., description="Lista de categorías")
+    source: Optional[str] = Field(None, description="Origen de los datos: training (evaluación del entrenamiento) o live (trabajos batch)")
+    jobs: Optional[int] = Field(None, description="Trabajos batch agregados (solo source=live)")
+    total_samples: Optional[int] = Field(None, description="Muestras agregadas (solo source=live)")
     
 class ClassDistributionResponse(BaseModel):
     """Modelo para distribución de clases"""
@@ -77,6 +96,15 @@ class FeatureImportanceResponse(BaseModel):
     features: List[Dict[str, Any]] = Field(..., description="Características más importantes")
     method: str = Field(..., description="Método usado para calcular importancia")
 
+class DashboardResponse(BaseModel):
+    """Modelo para el dashboard agregado (solo incluye los paneles solicitados)"""
+    metrics: Optional[MetricsResponse] = Field(None, description="Métricas del modelo")
+    confusion_matrix: Optional[ConfusionMatrixMetricsResponse] = Field(None, description="Matriz de confusión por categoría")
+    class_distribution: Optional[ClassDistributionResponse] = Field(None, description="Distribución de clases")
+    feature_importance: Optional[FeatureImportanceResponse] = Field(None, description="Importancia de características")
+    performance_over_time: Optional[Dict[str, Any]] = Field(None, description="Rendimiento temporal")
+    category_correlations: Optional[Dict[str, Any]] = Field(None, description="Correlaciones entre categorías")
+
 class BatchPredictionRequest(BaseModel):
     """Modelo para solicitudes de predicción batch"""
     threshold: Optional[float] = Field(
@@ -97,12 +125,29 @@ class BatchPredictionMetrics(BaseModel):
     total_samples: int = Field(..., description="Total de muestras procesadas")
     category_metrics: Dict[str, Dict[str, float]] = Field(..., description="Métricas por categoría")
 
+class BatchRowError(BaseModel):
+    """Fila de un trabajo batch que no se pudo predecir"""
+    index: int = Field(..., description="Índice de la fila en el CSV (base 0, sin contar el encabezado)")
+    error: str = Field(..., description="Motivo del error")
+
+class BatchPipelineStage(BaseModel):
+    """Tiempos de una etapa del pipeline batch"""
+    items: int = Field(..., description="Tramos procesados")
+    busy_seconds: float = Field(..., description="Segundos procesando")
+    idle_seconds: float = Field(..., description="Segundos esperando a la etapa anterior")
+    blocked_seconds: float = Field(..., description="Segundos esperando lugar en la cola de la etapa siguiente")
+
 class BatchPredictionResponse(BaseModel):
     """Modelo para respuesta de predicción batch"""
     success: bool = Field(..., description="Si el procesamiento fue exitoso")
     message: str = Field(..., description="Mensaje informativo")
+    job_id: Optional[str] = Field(None, description="Identificador del trabajo (para barridos de umbral sobre sus probabilidades)")
     total_processed: int = Field(..., description="Total de registros procesados")
     metrics: Optional[BatchPredictionMetrics] = Field(None, description="Métricas de evaluación")
+    failed_rows: List[BatchRowError] = Field(default_factory=list, description="Filas con error (predichas como 'unknown')")
+    unique_rows: Optional[int] = Field(None, description="Textos distintos predichos (las filas repetidas reutilizan su predicción)")
+    dedup_ratio: float = Field(0.0, description="Fracción de filas duplicadas que no se volvieron a predecir (1 - unique_rows / total_processed)")
+    pipeline: Dict[str, BatchPipelineStage] = Field(default_factory=dict, description="Tiempos por etapa del pipeline (tokenize, forward, write)")
     download_url: str = Field(..., description="URL para descargar el archivo procesado")
     processing_time: float = Field(..., description="Tiempo de procesamiento en segundos")
     
@@ -1,27 +1,37 @@
 """
 Servicio para análisis y visualizaciones
 """
+import asyncio
 import json
 import numpy as np
 import random
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 
 from ..core.utils import MLUtils
 from ..core.config import config
+from ..core.cache import artifact_cache
+from ..core.metrics import CACHE_REQUESTS
+from ..core.timeseries import timeseries_store
 from ..models.schemas import (
     ConfusionMatrixResponse, 
     ConfusionMatrixMetricsResponse,
     ClassDistributionResponse, 
-    FeatureImportanceResponse
+    FeatureImportanceResponse,
+    DashboardResponse
 )
+from .ml_service import ml_service
+from .attribution_service import attribution_service
+from .confusion_service import confusion_service
 
 class AnalyticsService:
     """Servicio para análisis de datos y métricas"""
     
     def __init__(self):
         self.sample_data = self._generate_sample_data()
+        # (ETag de las fuentes, resultado) de la última matriz de correlación calculada
+        self._correlation_cache: Optional[Tuple[str, Dict[str, Any]]] = None
     
     def _generate_sample_data(self) -> Dict[str, Any]:
         """Genera datos de muestra para visualizaciones"""
@@ -47,21 +57,41 @@ class AnalyticsService:
             "total_samples": sum(distribution.values())
         }
     
-    def get_confusion_matrix(self) -> ConfusionMatrixMetricsResponse:
-        """Obtiene métricas reales de matriz de confusión desde confusion_matrices.json"""
+    def get_confusion_matrix(
+        self,
+        source: str = "training",
+        model_version: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> ConfusionMatrixMetricsResponse:
+        """Obtiene la matriz de confusión por categoría
+
+        - training: evaluación del entrenamiento (confusion_matrices.json)
+        - live: agregado en memoria de los trabajos batch, filtrable por versión y ventana temporal
+        """
+        if source == "live":
+            aggregate = confusion_service.query(model_version, since, until)
+            if aggregate is None:
+                raise LookupError(
+                    "Sin evaluaciones batch para los filtros indicados. "
+                    f"Versiones con datos: {confusion_service.get_model_versions()}"
+                )
+            return ConfusionMatrixMetricsResponse(source="live", **aggregate)
+        if source != "training":
+            raise ValueError(f"Origen inválido: {source}. Opciones: ['training', 'live']")
+        
         try:
-            # Cargar métricas reales desde el archivo JSON
-            matrix_path = Path(config.get_project_root()) / "training-results" / "confusion_matrices.json"
-            
-            with open(matrix_path, "r") as f:
-                confusion_data = json.load(f)
+            # Cargar métricas reales desde el archivo JSON (cacheado hasta que cambie en disco)
+            matrix_path = config.get_training_results_path(config.CONFUSION_MATRICES_FILE)
+            confusion_data = artifact_cache.load_json(matrix_path)
             
             # Extraer categorías
             categories = list(confusion_data.keys())
             
             return ConfusionMatrixMetricsResponse(
                 category_metrics=confusion_data,
-                categories=categories
+                categories=categories,
+                source="training"
             )
             
         except Exception as e:
@@ -101,11 +131,9 @@ class AnalyticsService:
     def get_class_distribution(self) -> ClassDistributionResponse:
         """Obtiene la distribución real de clases desde group_counts.json"""
         try:
-            # Cargar distribución real desde el archivo JSON
-            counts_path = Path(config.get_project_root()) / "training-results" / "group_counts.json"
-            
-            with open(counts_path, "r") as f:
-                distribution_data = json.load(f)
+            # Cargar distribución real desde el archivo JSON (cacheado hasta que cambie en disco)
+            counts_path = config.get_training_results_path(config.GROUP_COUNTS_FILE)
+            distribution_data = artifact_cache.load_json(counts_path)
             
             total_samples = sum(distribution_data.values())
             
@@ -121,7 +149,40 @@ class AnalyticsService:
                 total_samples=self.sample_data["total_samples"]
             )
     
-    def get_feature_importance(self) -> FeatureImportanceResponse:
+    def get_feature_importance(self, category: Optional[str] = None, top_k: int = 15) -> FeatureImportanceResponse:
+        """Obtiene las características más importantes desde el índice de atribuciones precalculado
+
+        Si aún no se ha calculado el índice (POST /admin/attribution) se usan datos simulados.
+        """
+        index = attribution_service.load_index()
+        if index is not None:
+            return self._features_from_index(index, category, top_k)
+        
+        return self._simulated_feature_importance()
+    
+    def _features_from_index(self, index: Dict[str, Any], category: Optional[str], top_k: int) -> FeatureImportanceResponse:
+        """Top-k n-gramas del índice, de una categoría o de todas"""
+        categories = index["categories"]
+        if category is not None and category not in categories:
+            raise ValueError(f"Categoría desconocida: {category}. Disponibles: {list(categories)}")
+        
+        selected = [category] if category is not None else list(categories)
+        features = [
+            {**feature, "category": name}
+            for name in selected
+            for feature in categories[name]
+        ]
+        features.sort(key=lambda x: x["importance"], reverse=True)
+        features = features[:top_k]
+        for i, feature in enumerate(features):
+            feature["rank"] = i + 1
+        
+        return FeatureImportanceResponse(
+            features=features,
+            method=index["method"]
+        )
+    
+    def _simulated_feature_importance(self) -> FeatureImportanceResponse:
         """Obtiene características más importantes (simulado)"""
         
         # Características médicas importantes simuladas
@@ -170,64 +231,155 @@ class AnalyticsService:
             method="SHAP_values_simulation"
         )
     
-    def get_model_performance_over_time(self) -> Dict[str, Any]:
-        """Genera datos de rendimiento del modelo a lo largo del tiempo (simulado)"""
-        dates = []
-        f1_scores = []
-        accuracies = []
-        
-        # Generar 30 puntos de datos para el último mes
-        base_date = datetime.now()
-        for i in range(30):
-            date = base_date.replace(day=1).replace(day=i+1)
-            dates.append(date.strftime("%Y-%m-%d"))
-            
-            # Simular fluctuaciones realistas en métricas
-            f1_base = 0.89
-            acc_base = 0.92
-            
-            f1_noise = random.uniform(-0.03, 0.03)
-            acc_noise = random.uniform(-0.02, 0.02)
-            
-            f1_scores.append(round(f1_base + f1_noise, 3))
-            accuracies.append(round(acc_base + acc_noise, 3))
+    def get_model_performance_over_time(self, resolution: str = "day", limit: Optional[int] = None) -> Dict[str, Any]:
+        """Rendimiento real del servicio y del modelo a lo largo del tiempo
+
+        Tasa de requests, error y percentiles de latencia del tráfico HTTP, throughput
+        batch y F1/hamming de las evaluaciones batch, desde las series en memoria.
+        """
+        series = timeseries_store.query(resolution, limit)
+        f1_scores = series["f1_scores"]
+        accuracies = [round(1 - h, 4) if h is not None else None for h in series["hamming_loss"]]
+        
+        def average(values: List[Optional[float]]) -> Optional[float]:
+            present = [value for value in values if value is not None]
+            return round(float(np.mean(present)), 3) if present else None
         
         return {
-            "dates": dates,
-            "f1_scores": f1_scores,
+            **series,
+            # Claves históricas del endpoint (accuracy basada en hamming loss, como en /ml/metrics)
+            "dates": series["timestamps"],
             "accuracies": accuracies,
-            "average_f1": round(np.mean(f1_scores), 3),
-            "average_accuracy": round(np.mean(accuracies), 3)
+            "average_f1": average(f1_scores),
+            "average_accuracy": average(accuracies)
         }
     
+    def get_correlation_sources(self) -> List[Path]:
+        """Archivos de conteos por combinación de etiquetas disponibles (entrenamiento y trabajos batch)"""
+        candidates = [
+            config.get_training_results_path(config.GROUP_COUNTS_FILE),
+            config.get_batch_group_counts_path()
+        ]
+        return [path for path in candidates if path.exists()]
+    
     def get_category_correlation_matrix(self) -> Dict[str, Any]:
-        """Genera matriz de correlación entre categorías médicas"""
-        categories = self.sample_data["categories"]
-        n_categories = len(categories)
-        
-        # Generar matriz de correlación simulada
-        correlation_matrix = []
-        for i in range(n_categories):
-            row = []
-            for j in range(n_categories):
-                if i == j:
-                    correlation = 1.0
-                elif (categories[i] == "cardiovascular" and categories[j] == "neurological") or \
-                     (categories[i] == "neurological" and categories[j] == "cardiovascular"):
-                    correlation = 0.45  # Alta correlación conocida
-                elif (categories[i] == "oncological" and categories[j] == "hepatorenal") or \
-                     (categories[i] == "hepatorenal" and categories[j] == "oncological"):
-                    correlation = 0.35
-                else:
-                    correlation = round(random.uniform(0.1, 0.3), 2)
-                row.append(correlation)
-            correlation_matrix.append(row)
+        """Calcula la co-ocurrencia y la correlación phi (Pearson sobre indicadores binarios) entre categorías
+
+        El resultado se cachea hasta que cambie alguno de los archivos de conteos.
+        """
+        sources = self.get_correlation_sources()
+        validators = artifact_cache.validators(*sources) if sources else None
+        cached = self._correlation_cache
+        if validators is not None and cached is not None and cached[0] == validators[0]:
+            CACHE_REQUESTS.labels("correlations", "hit").inc()
+            return cached[1]
+        CACHE_REQUESTS.labels("correlations", "miss").inc()
+        
+        group_counts: Dict[str, int] = {}
+        for path in sources:
+            for group, count in artifact_cache.load_json(path).items():
+                group_counts[group] = group_counts.get(group, 0) + int(count)
+        if not group_counts:
+            # Sin artefactos: usar la distribución de muestra (determinista)
+            group_counts = self.sample_data["distribution"]
+        
+        result = self._compute_category_correlations(group_counts)
+        result["sources"] = [path.name for path in sources]
+        if validators is not None:
+            self._correlation_cache = (validators[0], result)
+        return result
+    
+    def _compute_category_correlations(self, group_counts: Dict[str, int]) -> Dict[str, Any]:
+        """Co-ocurrencia y phi a partir de combinaciones multilabel ponderadas por su conteo"""
+        combinations = [MLUtils.parse_multilabel(group) for group in group_counts]
+        found = MLUtils.get_unique_categories(list(group_counts))
+        # Mantener el orden habitual de las categorías y añadir las nuevas al final
+        categories = [c for c in self.sample_data["categories"] if c in found]
+        categories += [c for c in found if c not in categories]
+        index = {category: i for i, category in enumerate(categories)}
+        
+        # Matriz indicadora (combinaciones × categorías) y peso de cada combinación
+        indicators = np.zeros((len(combinations), len(categories)))
+        for row, labels in enumerate(combinations):
+            indicators[row, [index[label] for label in labels]] = 1.0
+        weights = np.array(list(group_counts.values()), dtype=float)
+        
+        total = weights.sum()
+        co_occurrence = indicators.T @ (indicators * weights[:, None])
+        positives = np.diag(co_occurrence)
+        
+        # phi_ij = (N·n_ij − n_i·n_j) / sqrt(n_i (N − n_i) n_j (N − n_j))
+        variance = positives * (total - positives)
+        denominator = np.sqrt(np.outer(variance, variance))
+        numerator = total * co_occurrence - np.outer(positives, positives)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            phi = np.where(denominator > 0, numerator / denominator, 0.0)
+        np.fill_diagonal(phi, 1.0)
         
         return {
-            "matrix": correlation_matrix,
+            "matrix": np.round(phi, 4).tolist(),
             "labels": categories,
-            "method": "pearson_correlation"
+            "method": "phi_coefficient",
+            "co_occurrence": co_occurrence.astype(int).tolist(),
+            "total_samples": int(total)
+        }
+
+    def _dashboard_panels(self) -> Dict[str, Tuple[Any, Optional[List[Path]]]]:
+        """Paneles del dashboard: nombre → (función que lo construye, artefactos de los que depende)
+
+        Los paneles sin artefactos (None) se generan en cada llamada y no admiten validación HTTP.
+        """
+        return {
+            "metrics": (ml_service.get_model_metrics, [
+                config.get_training_results_path(config.EVALUATION_RESULTS_FILE),
+                config.MODEL_PATH / "label_encoder.json"
+            ]),
+            "confusion_matrix": (self.get_confusion_matrix, [
+                config.get_training_results_path(config.CONFUSION_MATRICES_FILE)
+            ]),
+            "class_distribution": (self.get_class_distribution, [
+                config.get_training_results_path(config.GROUP_COUNTS_FILE)
+            ]),
+            "feature_importance": (self.get_feature_importance, self._attribution_artifacts()),
+            "performance_over_time": (self.get_model_performance_over_time, None),
+            "category_correlations": (self.get_category_correlation_matrix, self.get_correlation_sources() or None),
         }
+    
+    def _attribution_artifacts(self) -> Optional[List[Path]]:
+        path = config.get_attribution_index_path()
+        return [path] if path.exists() else None
+    
+    def parse_dashboard_fields(self, fields: Optional[str]) -> List[str]:
+        """Valida el selector de paneles ("metrics,class_distribution"); sin selector retorna todos"""
+        available = list(self._dashboard_panels())
+        if not fields:
+            return available
+        
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in selected if field not in available]
+        if unknown:
+            raise ValueError(f"Paneles desconocidos: {unknown}. Disponibles: {available}")
+        # Sin duplicados, en el orden solicitado
+        return list(dict.fromkeys(selected))
+    
+    def get_dashboard_artifacts(self, panels: List[str]) -> Optional[List[Path]]:
+        """Artefactos de los que dependen los paneles; None si alguno se genera en cada llamada"""
+        definitions = self._dashboard_panels()
+        artifacts = []
+        for panel in panels:
+            panel_artifacts = definitions[panel][1]
+            if panel_artifacts is None:
+                return None
+            artifacts.extend(panel_artifacts)
+        return artifacts
+    
+    async def get_dashboard(self, panels: List[str]) -> DashboardResponse:
+        """Construye los paneles solicitados en paralelo (cada uno en el pool de hilos)"""
+        definitions = self._dashboard_panels()
+        results = await asyncio.gather(*(
+            asyncio.to_thread(definitions[panel][0]) for panel in panels
+        ))
+        return DashboardResponse(**dict(zip(panels, results)))
 
 # Instancia global del servicio
 analytics_service = AnalyticsService()
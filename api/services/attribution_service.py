@@ -0,0 +1,241 @@
+"""
+Servicio de atribución de tokens (gradiente × entrada) para la importancia de características
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+from ..core.config import config
+from ..core.cache import artifact_cache
+from .inference_scheduler import inference_scheduler
+from .ml_service import ml_service
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+class AttributionBusyError(Exception):
+    """Ya hay un trabajo de atribución en curso"""
+
+class AttributionService:
+    """Calcula un índice de n-gramas más influyentes por categoría en segundo plano
+
+    Para cada texto del corpus se calcula gradiente × entrada sobre los embeddings
+    respecto al logit de cada categoría real, se agregan las atribuciones de los
+    sub-tokens por palabra y se acumulan unigramas y bigramas por categoría. El
+    índice resultante (top-k por categoría) se guarda en disco y es lo único que
+    lee el endpoint de importancia de características: el request nunca ejecuta
+    atribuciones.
+
+    Cada batch de atribuciones es una unidad de trabajo del carril `background` del
+    planificador de inferencia, de modo que el trabajo comparte los hilos con las
+    predicciones y solo usa la capacidad que los otros carriles dejan libre.
+    """
+
+    METHOD = "gradient_x_input"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status: Dict[str, Any] = {"state": "idle"}
+
+    def is_busy(self) -> bool:
+        return self._lock.locked()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Estado del último trabajo (idle, running, completed o failed)"""
+        return dict(self._status)
+
+    def start_job(self, df: "pd.DataFrame", source: str) -> Dict[str, Any]:
+        """Lanza el cálculo del índice en un hilo en segundo plano"""
+        if not self._lock.acquire(blocking=False):
+            raise AttributionBusyError("Ya hay un trabajo de atribución en curso")
+
+        self._status = {
+            "state": "running",
+            "source": source,
+            "total_documents": len(df),
+            "processed_documents": 0,
+            "started_at": datetime.now().isoformat()
+        }
+        thread = threading.Thread(target=self._run_job, args=(df,), name="attribution-job", daemon=True)
+        thread.start()
+        return self.get_status()
+
+    def _run_job(self, df: "pd.DataFrame"):
+        try:
+            start = time.perf_counter()
+            # El hilo del trabajo tiene su propio event loop para esperar al planificador
+            index = asyncio.run(self.build_index(df))
+            path = config.get_attribution_index_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Escritura atómica: el endpoint nunca lee un índice a medio escribir
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(index, f, indent=2)
+            os.replace(tmp_path, path)
+
+            self._status.update({
+                "state": "completed",
+                "finished_at": datetime.now().isoformat(),
+                "elapsed_seconds": round(time.perf_counter() - start, 2),
+                "index_path": str(path)
+            })
+            logger.info(f"Índice de atribuciones guardado en: {path}")
+        except Exception as e:
+            logger.error(f"Error en trabajo de atribución: {str(e)}")
+            self._status.update({"state": "failed", "error": str(e), "finished_at": datetime.now().isoformat()})
+        finally:
+            self._lock.release()
+
+    async def build_index(self, df: "pd.DataFrame") -> Dict[str, Any]:
+        """Calcula el índice de atribuciones sobre un DataFrame con columnas title, abstract y group"""
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+        ml_service.load_model()
+        labels = ml_service.get_available_classes()
+        label_index = {label: i for i, label in enumerate(labels)}
+
+        texts = (df["title"].astype(str) + " " + df["abstract"].astype(str)).tolist()
+        targets = [
+            [label_index[label] for label in str(group).split("|") if label in label_index]
+            for group in df["group"]
+        ]
+
+        score_sums: Dict[str, Dict[str, float]] = {label: defaultdict(float) for label in labels}
+        counts: Dict[str, Dict[str, int]] = {label: defaultdict(int) for label in labels}
+        batch_size = config.ATTRIBUTION_BATCH_SIZE
+
+        for batch_start in range(0, len(texts), batch_size):
+            batch_texts = texts[batch_start:batch_start + batch_size]
+            batch_targets = targets[batch_start:batch_start + batch_size]
+            # Sin control de admisión: el trabajo ya fue aceptado y espera su turno en el carril
+            batch_words = await inference_scheduler.run(
+                "background", self._attribute_batch, batch_texts, batch_targets, len(labels), admit=False
+            )
+            for doc, words in enumerate(batch_words):
+                for label_id, word_scores in words.items():
+                    label = labels[label_id]
+                    for ngram, score in self._ngrams(word_scores, ENGLISH_STOP_WORDS):
+                        score_sums[label][ngram] += score
+                        counts[label][ngram] += 1
+            self._status["processed_documents"] = min(batch_start + batch_size, len(texts))
+
+        categories = {}
+        for label in labels:
+            # Media de la atribución por aparición, solo para n-gramas con soporte suficiente
+            ranked = sorted(
+                (
+                    (ngram, total / counts[label][ngram], counts[label][ngram])
+                    for ngram, total in score_sums[label].items()
+                    if counts[label][ngram] >= config.ATTRIBUTION_MIN_COUNT
+                ),
+                key=lambda item: item[1],
+                reverse=True
+            )[:config.ATTRIBUTION_TOP_K]
+            max_score = max((abs(score) for _, score, _ in ranked), default=0.0) or 1.0
+            categories[label] = [
+                {
+                    "feature": ngram,
+                    "importance": round(score / max_score, 4),
+                    "score": float(f"{score:.6g}"),
+                    "count": count
+                }
+                for ngram, score, count in ranked
+            ]
+
+        return {
+            "method": self.METHOD,
+            "model_version": ml_service.model_version,
+            "created_at": datetime.now().isoformat(),
+            "documents": len(texts),
+            "categories": categories
+        }
+
+    def _attribute_batch(self, texts: List[str], targets: List[List[int]], num_labels: int) -> List[Dict[int, List[tuple]]]:
+        """Atribuciones por palabra de cada texto respecto a sus categorías reales
+
+        Retorna por documento {id_categoría: [(palabra, atribución), ...]} en orden de aparición.
+        """
+        import torch
+
+        model, tokenizer = ml_service.model, ml_service.tokenizer
+        with ml_service.tokenizer_lock:
+            encoding = tokenizer(
+                texts,
+                return_tensors="pt",
+                truncation=True,
+                padding=True,
+                max_length=config.ATTRIBUTION_MAX_LENGTH,
+                return_offsets_mapping=True
+            )
+        offsets = encoding.pop("offset_mapping").tolist()
+        inputs = {name: tensor.to(ml_service.device) for name, tensor in encoding.items()}
+
+        embeddings = model.get_input_embeddings()(inputs.pop("input_ids")).detach()
+        embeddings.requires_grad_(True)
+        logits = model(inputs_embeds=embeddings, **inputs).logits
+
+        # Una pasada hacia atrás por categoría: el logit de cada documento solo depende de sus embeddings
+        target_mask = torch.zeros(len(texts), num_labels, device=logits.device)
+        for doc, doc_targets in enumerate(targets):
+            target_mask[doc, doc_targets] = 1.0
+        token_scores = {}
+        for label_id in range(num_labels):
+            if not target_mask[:, label_id].any():
+                continue
+            grads, = torch.autograd.grad(
+                (logits[:, label_id] * target_mask[:, label_id]).sum(),
+                embeddings,
+                retain_graph=True
+            )
+            token_scores[label_id] = (grads * embeddings).sum(dim=-1).detach().cpu().numpy()
+
+        results = []
+        for doc, text in enumerate(texts):
+            word_ids = encoding.word_ids(doc)
+            doc_words = {}
+            for label_id in targets[doc]:
+                scores = token_scores[label_id][doc]
+                words: Dict[int, list] = {}
+                for position, word_id in enumerate(word_ids):
+                    if word_id is None:
+                        continue
+                    start, end = offsets[doc][position]
+                    # Los sub-tokens de una palabra suman su atribución
+                    entry = words.setdefault(word_id, [start, end, 0.0])
+                    entry[1] = end
+                    entry[2] += float(scores[position])
+                doc_words[label_id] = [
+                    (text[start:end].lower(), score) for start, end, score in words.values()
+                ]
+            results.append(doc_words)
+        return results
+
+    @staticmethod
+    def _ngrams(word_scores: List[tuple], stop_words) -> List[tuple]:
+        """Unigramas y bigramas de palabras de contenido con su atribución sumada"""
+        def is_content(word: str) -> bool:
+            return len(word) > 2 and word.isalpha() and word not in stop_words
+
+        ngrams = [(word, score) for word, score in word_scores if is_content(word)]
+        for (first, first_score), (second, second_score) in zip(word_scores, word_scores[1:]):
+            if is_content(first) and is_content(second):
+                ngrams.append((f"{first} {second}", first_score + second_score))
+        return ngrams
+
+    def load_index(self) -> Optional[Dict[str, Any]]:
+        """Índice guardado en disco (cacheado hasta que cambie), o None si no se ha calculado"""
+        path = config.get_attribution_index_path()
+        if not path.exists():
+            return None
+        return artifact_cache.load_json(path)
+
+# Instancia global del servicio
+attribution_service = AttributionService()
@@ -0,0 +1,76 @@
+"""
+Pipeline por etapas para trabajos batch, con colas acotadas y tiempo ocioso por etapa
+"""
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from ..core.metrics import BATCH_PIPELINE_SECONDS
+
+# Marca de fin de la entrada de una etapa
+_DONE = object()
+
+@dataclass
+class StageStats:
+    """Tiempos acumulados de una etapa del pipeline"""
+    items: int = 0
+    # Procesando elementos
+    busy_seconds: float = 0.0
+    # Esperando entrada: la etapa anterior es más lenta
+    idle_seconds: float = 0.0
+    # Esperando lugar en la cola de salida: una etapa posterior es más lenta
+    blocked_seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: round(value, 4) if isinstance(value, float) else value for name, value in asdict(self).items()}
+
+Stage = Tuple[str, Callable[[Any], Awaitable[Any]]]
+
+async def run_pipeline(items: Iterable[Any], stages: Sequence[Stage], queue_size: int) -> Tuple[List[Any], Dict[str, StageStats]]:
+    """Pasa cada elemento por las etapas en orden, con todas las etapas ejecutándose a la vez
+
+    Mientras una etapa procesa el elemento N, la anterior ya prepara el N+1. Entre etapas
+    hay colas de `queue_size` elementos: una etapa rápida se bloquea en vez de acumular
+    trabajo en memoria. Retorna las salidas de la última etapa (en el orden de entrada) y
+    los tiempos de cada etapa. Si una etapa falla o el pipeline se cancela, se cancelan todas.
+    """
+    stats = {name: StageStats() for name, _ in stages}
+    queues = [asyncio.Queue(maxsize=max(1, queue_size)) for _ in stages[1:]]
+    results: List[Any] = []
+    source = iter(items)
+
+    async def worker(index: int, name: str, func: Callable[[Any], Awaitable[Any]]):
+        stage = stats[name]
+        inbox = queues[index - 1] if index > 0 else None
+        outbox = queues[index] if index < len(queues) else None
+        while True:
+            waiting = time.perf_counter()
+            item = next(source, _DONE) if inbox is None else await inbox.get()
+            started = time.perf_counter()
+            stage.idle_seconds += started - waiting
+            if item is _DONE:
+                if outbox is not None:
+                    await outbox.put(_DONE)
+                return
+            result = await func(item)
+            finished = time.perf_counter()
+            stage.busy_seconds += finished - started
+            stage.items += 1
+            if outbox is None:
+                results.append(result)
+            else:
+                await outbox.put(result)
+                stage.blocked_seconds += time.perf_counter() - finished
+
+    tasks = [asyncio.ensure_future(worker(index, name, func)) for index, (name, func) in enumerate(stages)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        for name, stage in stats.items():
+            BATCH_PIPELINE_SECONDS.labels(name, "busy").inc(stage.busy_seconds)
+            BATCH_PIPELINE_SECONDS.labels(name, "idle").inc(stage.idle_seconds)
+            BATCH_PIPELINE_SECONDS.labels(name, "blocked").inc(stage.blocked_seconds)
+    return results, stats
@@ -0,0 +1,110 @@
+"""
+Servicio de captura de tráfico de /ml/predict para benchmarks realistas
+"""
+import hashlib
+import json
+import logging
+import queue
+import random
+import threading
+from datetime import datetime
+from logging.handlers import QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Optional
+
+from ..core.config import config
+from ..core.metrics import CAPTURE_RECORDS
+
+logger = logging.getLogger(__name__)
+
+class TrafficCaptureService:
+    """Muestrea predicciones a un JSONL rotativo sin I/O en el camino del request
+
+    El request solo serializa el registro y lo deja en una cola acotada; un
+    QueueListener en segundo plano lo escribe con un RotatingFileHandler, que
+    rota el archivo por tamaño y conserva CAPTURE_BACKUP_COUNT copias. Si la
+    cola está llena el registro se descarta (y se cuenta) en lugar de bloquear.
+    El formato es el que acepta benchmarks/load_generator.py --replay.
+    """
+
+    def __init__(self):
+        self.sample_rate = config.CAPTURE_SAMPLE_RATE
+        self.include_text = config.CAPTURE_INCLUDE_TEXT
+        self.path = Path(config.CAPTURE_PATH)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=config.CAPTURE_QUEUE_SIZE)
+        self._listener: Optional[QueueListener] = None
+        self._start_lock = threading.Lock()
+
+    def is_enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def use_worker_file(self, slot: int):
+        """Usa un archivo por puesto de worker: varios workers no deben rotar el mismo archivo
+
+        El puesto (0..workers-1) se mantiene cuando un worker se recicla, de modo que el
+        reemplazo sigue rotando el mismo archivo y el total en disco queda acotado.
+        """
+        self.path = self.path.with_name(f"{self.path.stem}.{slot}{self.path.suffix}")
+
+    def _ensure_started(self):
+        """Arranca el escritor en segundo plano con el primer registro (después del fork)"""
+        if self._listener is not None:
+            return
+        with self._start_lock:
+            if self._listener is not None:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(
+                self.path,
+                maxBytes=config.CAPTURE_MAX_BYTES,
+                backupCount=config.CAPTURE_BACKUP_COUNT,
+                encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            listener = QueueListener(self._queue, handler)
+            listener.start()
+            self._listener = listener
+            logger.info(f"Captura de tráfico habilitada ({self.sample_rate:.1%}) en: {self.path}")
+
+    def capture_prediction(
+        self,
+        text: str,
+        threshold: float,
+        latency_seconds: float,
+        status_code: int,
+        model_version: Optional[str]
+    ):
+        """Encola una predicción muestreada; no hace I/O"""
+        if not self.is_enabled() or random.random() >= self.sample_rate:
+            return
+
+        record = {
+            "timestamp": datetime.now().isoformat(),
+            "route": "/ml/predict",
+            "text_sha256": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            "text_length": len(text),
+            "threshold": threshold,
+            "latency_ms": round(latency_seconds * 1000, 2),
+            "status": status_code,
+            "model_version": model_version
+        }
+        if self.include_text:
+            record["text"] = text
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(logging.makeLogRecord({"msg": json.dumps(record, ensure_ascii=False)}))
+            CAPTURE_RECORDS.labels("queued").inc()
+        except queue.Full:
+            CAPTURE_RECORDS.labels("dropped").inc()
+
+    def stop(self):
+        """Vacía la cola y cierra el archivo"""
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
+# Instancia global del servicio
+capture_service = TrafficCaptureService()
@@ -0,0 +1,148 @@
+"""
+Agregado persistente de matrices de confusión de las evaluaciones batch
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..core.config import config
+from ..core.filelock import file_lock
+
+logger = logging.getLogger(__name__)
+
+# Resolución de los buckets del agregado (segundos)
+BUCKET_SECONDS = 3600
+
+class ConfusionAggregateService:
+    """Suma TP/FP/FN/TN por categoría de cada trabajo batch etiquetado
+
+    El agregado vive en memoria, indexado por versión del modelo y hora, y se
+    actualiza de forma incremental con los conteos de cada trabajo (nunca se
+    recalcula desde los CSV guardados). Cada actualización relee, suma y reescribe
+    el archivo bajo un bloqueo entre procesos, para no perder los conteos de otro
+    worker; las consultas recargan el archivo si su mtime cambió. Los buckets más
+    viejos que CONFUSION_RETENTION_DAYS se descartan al registrar, de modo que el
+    archivo (y el costo de cada actualización) queda acotado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (model_version, inicio del bucket) → {"jobs", "samples", "categories": {cat: {TP, FP, FN, TN}}}
+        self._buckets: Optional[Dict[tuple, Dict[str, Any]]] = None
+        self._loaded_mtime: Optional[int] = None
+
+    def _ensure_loaded(self, force: bool = False):
+        """Carga el agregado de disco la primera vez o si otro worker lo actualizó"""
+        path = config.get_confusion_aggregate_path()
+        mtime = path.stat().st_mtime_ns if path.exists() else None
+        if not force and self._buckets is not None and mtime == self._loaded_mtime:
+            return
+        buckets = {}
+        if mtime is not None:
+            try:
+                with open(path, "r") as f:
+                    for entry in json.load(f):
+                        buckets[(entry["model_version"], entry["bucket_start"])] = entry["counts"]
+            except Exception as e:
+                logger.warning(f"Error cargando agregado de confusión: {str(e)}")
+        self._buckets = buckets
+        self._loaded_mtime = mtime
+
+    def _save(self):
+        path = config.get_confusion_aggregate_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entries = [
+            {"model_version": model_version, "bucket_start": start, "counts": counts}
+            for (model_version, start), counts in sorted(self._buckets.items(), key=lambda item: item[0][1])
+        ]
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+        self._loaded_mtime = path.stat().st_mtime_ns
+
+    def record(self, model_version: Optional[str], labels: List[str], y_true: np.ndarray, y_pred: np.ndarray,
+               now: Optional[float] = None):
+        """Suma los conteos de un trabajo batch (matrices binarias muestras × categorías)"""
+        y_true = y_true.astype(bool)
+        y_pred = y_pred.astype(bool)
+        tp = (y_true & y_pred).sum(axis=0)
+        fp = (~y_true & y_pred).sum(axis=0)
+        fn = (y_true & ~y_pred).sum(axis=0)
+        tn = (~y_true & ~y_pred).sum(axis=0)
+
+        start = int((now if now is not None else time.time()) // BUCKET_SECONDS * BUCKET_SECONDS)
+        key = (model_version or "unknown", start)
+        with self._lock, file_lock(config.get_confusion_aggregate_path()):
+            # Releer siempre: el mtime puede no cambiar entre dos escrituras muy próximas
+            self._ensure_loaded(force=True)
+            self._prune(start)
+            bucket = self._buckets.setdefault(key, {"jobs": 0, "samples": 0, "categories": {}})
+            bucket["jobs"] += 1
+            bucket["samples"] += int(y_true.shape[0])
+            for i, label in enumerate(labels):
+                counts = bucket["categories"].setdefault(label, {"TP": 0, "TN": 0, "FP": 0, "FN": 0})
+                counts["TP"] += int(tp[i])
+                counts["FP"] += int(fp[i])
+                counts["FN"] += int(fn[i])
+                counts["TN"] += int(tn[i])
+            try:
+                self._save()
+            except Exception as e:
+                logger.warning(f"Error guardando agregado de confusión: {str(e)}")
+
+    def _prune(self, current_start: int):
+        """Descarta los buckets fuera de la ventana de retención (con el lock tomado)"""
+        if config.CONFUSION_RETENTION_DAYS <= 0:
+            return
+        oldest = current_start - config.CONFUSION_RETENTION_DAYS * 86400
+        expired = [key for key in self._buckets if key[1] < oldest]
+        for key in expired:
+            del self._buckets[key]
+        if expired:
+            logger.info(f"Agregado de confusión: {len(expired)} buckets fuera de la retención descartados")
+
+    def query(self, model_version: Optional[str] = None, since: Optional[datetime] = None,
+              until: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """Agregado filtrado por versión del modelo y ventana temporal; None si no hay datos"""
+        since_ts = since.timestamp() if since is not None else None
+        until_ts = until.timestamp() if until is not None else None
+
+        with self._lock:
+            self._ensure_loaded()
+            selected = [
+                counts for (version, start), counts in self._buckets.items()
+                if (model_version is None or version == model_version)
+                and (since_ts is None or start + BUCKET_SECONDS > since_ts)
+                and (until_ts is None or start <= until_ts)
+            ]
+            if not selected:
+                return None
+
+            totals: Dict[str, Dict[str, int]] = {}
+            for counts in selected:
+                for label, values in counts["categories"].items():
+                    total = totals.setdefault(label, {"TP": 0, "TN": 0, "FP": 0, "FN": 0})
+                    for name, value in values.items():
+                        total[name] += value
+            return {
+                "category_metrics": totals,
+                "categories": list(totals),
+                "jobs": sum(counts["jobs"] for counts in selected),
+                "total_samples": sum(counts["samples"] for counts in selected)
+            }
+
+    def get_model_versions(self) -> List[str]:
+        """Versiones del modelo con evaluaciones registradas"""
+        with self._lock:
+            self._ensure_loaded()
+            return sorted({version for version, _ in self._buckets})
+
+# Instancia global del servicio
+confusion_service = ConfusionAggregateService()
@@ -0,0 +1,217 @@
+"""
+Planificador de inferencia con carriles de prioridad y control de admisión
+"""
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, ContextManager, Deque, Dict, Optional
+
+from ..core.config import config
+from ..core.metrics import INFERENCE_CANCELLED, INFERENCE_QUEUE_DEPTH, INFERENCE_QUEUE_WAIT, INFERENCE_REJECTED
+from ..core.timing import record_timing
+
+class OverloadedError(Exception):
+    """La cola de inferencia superó el límite de admisión"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class _Ticket:
+    """Unidad de trabajo esperando un hilo de inferencia"""
+
+    __slots__ = ("loop", "future")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def grant(self):
+        self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+class InferenceScheduler:
+    """Reparte los hilos de inferencia entre carriles de prioridad (interactive, batch)
+
+    Cada unidad de trabajo (una predicción o un tramo de un trabajo batch) espera
+    en la cola de su carril hasta que hay un hilo libre. Al liberarse un hilo se
+    atiende el carril con menor tiempo virtual (tiempo de servicio consumido
+    dividido por su cuota), de modo que con ambos carriles ocupados cada uno
+    recibe la fracción de capacidad configurada, y un carril solo usa el 100%
+    cuando el otro está vacío. Los trabajos batch se ejecutan tramo a tramo, así
+    que una predicción interactiva espera como mucho a que termine el tramo en curso.
+
+    Antes de encolar se aplica el control de admisión: si la profundidad total o
+    la espera estimada (trabajo pendiente según la media móvil del tiempo de
+    servicio de cada carril) superan los límites, se rechaza de inmediato.
+    """
+
+    # Peso de la última observación en la media móvil del tiempo de servicio
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, workers: int, shares: Dict[str, float], max_queue_depth: int, max_wait_seconds: float):
+        self.workers = max(1, workers)
+        self.shares = shares
+        self.max_queue_depth = max_queue_depth
+        self.max_wait_seconds = max_wait_seconds
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._waiting: Dict[str, Deque[_Ticket]] = {lane: deque() for lane in shares}
+        self._running: Dict[str, int] = {lane: 0 for lane in shares}
+        self._pending: Dict[str, int] = {lane: 0 for lane in shares}
+        self._virtual_time: Dict[str, float] = {lane: 0.0 for lane in shares}
+        self._service_time: Dict[str, float] = {}
+        self._unit_hook: Optional[Callable[[], ContextManager]] = None
+
+    def set_unit_hook(self, hook: Optional[Callable[[], ContextManager]]):
+        """Contexto con el que se ejecuta cada unidad de trabajo en su hilo (None lo quita)
+
+        Lo usa el profiling con torch.profiler, que solo registra los operadores del hilo que lo inicia.
+        """
+        self._unit_hook = hook
+
+    def _execute(self, func: Callable[..., Any], *args: Any) -> Any:
+        hook = self._unit_hook
+        if hook is None:
+            return func(*args)
+        with hook():
+            return func(*args)
+
+    def queue_depth(self) -> int:
+        return sum(self._pending.values())
+
+    def _estimated_wait(self) -> float:
+        backlog = sum(count * self._service_time.get(lane, 0.0) for lane, count in self._pending.items())
+        return backlog / self.workers
+
+    def _admit(self, lane: str, admit: bool):
+        with self._lock:
+            depth = self.queue_depth()
+            wait = self._estimated_wait()
+            if admit and self.max_queue_depth and depth >= self.max_queue_depth:
+                reason = f"cola de inferencia llena ({depth} trabajos pendientes)"
+            elif admit and self.max_wait_seconds and wait > self.max_wait_seconds:
+                reason = f"espera estimada de {wait:.1f}s supera el límite de {self.max_wait_seconds:.1f}s"
+            else:
+                self._pending[lane] += 1
+                INFERENCE_QUEUE_DEPTH.inc()
+                return
+        INFERENCE_REJECTED.labels(lane).inc()
+        raise OverloadedError(f"Servicio sobrecargado: {reason}", retry_after=max(1, math.ceil(wait)))
+
+    def _is_active(self, lane: str) -> bool:
+        return bool(self._waiting[lane]) or self._running[lane] > 0
+
+    def _dispatch(self):
+        """Asigna los hilos libres a los carriles con menor tiempo virtual (con el lock tomado)"""
+        while sum(self._running.values()) < self.workers:
+            ready = [lane for lane, tickets in self._waiting.items() if tickets]
+            if not ready:
+                return
+            lane = min(ready, key=lambda name: self._virtual_time[name])
+            self._running[lane] += 1
+            self._waiting[lane].popleft().grant()
+
+    async def _acquire(self, lane: str):
+        ticket = _Ticket(asyncio.get_running_loop())
+        with self._lock:
+            if not self._is_active(lane):
+                # Un carril que vuelve a tener trabajo no acumula crédito del tiempo que estuvo vacío
+                active = [self._virtual_time[name] for name in self.shares if self._is_active(name)]
+                if active:
+                    self._virtual_time[lane] = max(self._virtual_time[lane], min(active))
+            self._waiting[lane].append(ticket)
+            self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if ticket in self._waiting[lane]:
+                    self._waiting[lane].remove(ticket)
+                else:
+                    # Ya tenía hilo asignado: devolverlo
+                    self._running[lane] -= 1
+                    self._dispatch()
+            raise
+
+    def _release(self, lane: str, service_seconds: Optional[float], started: bool):
+        with self._lock:
+            self._pending[lane] -= 1
+            if started:
+                self._running[lane] -= 1
+                self._virtual_time[lane] += service_seconds / self.shares[lane]
+                previous = self._service_time.get(lane)
+                self._service_time[lane] = service_seconds if previous is None else (
+                    self.EWMA_ALPHA * service_seconds + (1 - self.EWMA_ALPHA) * previous
+                )
+                self._dispatch()
+        INFERENCE_QUEUE_DEPTH.dec()
+
+    async def run(self, lane: str, func: Callable[..., Any], *args: Any, admit: bool = True) -> Any:
+        """Ejecuta una unidad de trabajo en el carril indicado
+
+        Lanza OverloadedError si `admit` es True y no hay capacidad.
+        """
+        if lane not in self.shares:
+            raise ValueError(f"Carril inválido: {lane}. Opciones: {list(self.shares)}")
+
+        self._admit(lane, admit)
+        submitted = time.perf_counter()
+        try:
+            await self._acquire(lane)
+        except asyncio.CancelledError:
+            # Cancelado en cola (cliente desconectado): se retira sin llegar a ejecutarse
+            self._release(lane, None, started=False)
+            INFERENCE_CANCELLED.labels(lane, "queued").inc()
+            raise
+
+        start_time = time.perf_counter()
+        INFERENCE_QUEUE_WAIT.labels(lane).observe(start_time - submitted)
+        record_timing("queue", start_time - submitted)
+
+        # Copiar el contexto para que las etapas se sumen a los tiempos del request
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, self._execute, func, *args)
+        # Se libera al terminar el hilo, aunque el request ya no lo espere
+        future.add_done_callback(lambda _: self._release(lane, time.perf_counter() - start_time, started=True))
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # La unidad en ejecución termina en su hilo, pero no se encolan más tramos
+            INFERENCE_CANCELLED.labels(lane, "running").inc()
+            raise
+
+    def get_status(self) -> Dict[str, Any]:
+        """Profundidad, espera estimada, cuotas y límites actuales"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth(),
+                "lanes": {
+                    lane: {
+                        "share": share,
+                        "pending": self._pending[lane],
+                        "running": self._running[lane],
+                        "service_time_seconds": round(self._service_time[lane], 4) if lane in self._service_time else None
+                    }
+                    for lane, share in self.shares.items()
+                },
+                "estimated_wait_seconds": round(self._estimated_wait(), 3),
+                "max_queue_depth": self.max_queue_depth,
+                "max_wait_seconds": self.max_wait_seconds
+            }
+
+# Instancia global del planificador
+inference_scheduler = InferenceScheduler(
+    config.INFERENCE_WORKERS,
+    config.get_inference_lane_shares(),
+    config.ADMISSION_MAX_QUEUE_DEPTH,
+    config.ADMISSION_MAX_WAIT_SECONDS
+)
@@ -1,39 +1,167 @@
 """
 Servicio para el modelo de Machine Learning
 """
-import torch
+import asyncio
+import gc
+import hashlib
 import json
 import numpy as np
-import pandas as pd
 import logging
 import os
-import tempfile
-from typing import Dict, List, Tuple, Any
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from sklearn.preprocessing import MultiLabelBinarizer
-from sklearn.metrics import accuracy_score, precision_recall_fscore_support, hamming_loss
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple, Any, TYPE_CHECKING
 from pathlib import Path
 
 from ..core.config import config
+from ..core.cache import artifact_cache
+from ..core.filelock import file_lock
 from ..core.utils import MLUtils, MetricsCalculator
-from ..models.schemas import PredictionResponse, MetricsResponse, BatchPredictionMetrics
+from ..core.metrics import (
+    INFERENCE_STAGE_DURATION,
+    INFERENCE_BATCH_SIZE,
+    INFERENCE_COALESCED,
+    BATCH_JOBS,
+    BATCH_ROWS,
+    BATCH_ROWS_PER_SECOND,
+    BATCH_BACKOFFS,
+    BATCH_TOKEN_BUDGET,
+    BATCH_ROW_ERRORS,
+    BATCH_DEDUPLICATED_ROWS,
+    get_process_rss_bytes
+)
+from ..core.timing import record_timing
+from ..core.token_ids import TokenIdsError
+from ..core.timeseries import timeseries_store
+from ..models.schemas import PredictionResponse, MetricsResponse, BatchPredictionMetrics, BatchRowError
+from .confusion_service import confusion_service
+from .threshold_service import threshold_service
+from .inference_scheduler import inference_scheduler
+from .batch_pipeline import StageStats, run_pipeline
+
+# torch, transformers, pandas y sklearn se importan en las rutas que los usan:
+# importar el servicio no debe costar segundos a endpoints y herramientas que no predicen
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+class MemoryPressureError(MemoryError):
+    """El RSS del proceso supera el techo configurado para los batches"""
+
+def _is_out_of_memory(error: Exception) -> bool:
+    """Falta de memoria al asignar (MemoryError o errores de asignación de torch en CPU/CUDA)"""
+    if isinstance(error, MemoryError):
+        return True
+    message = str(error).lower()
+    return isinstance(error, RuntimeError) and (
+        "out of memory" in message or "can't allocate memory" in message or "not enough memory" in message
+    )
+
+@dataclass
+class BatchSlice:
+    """Resultado de un tramo de un trabajo batch"""
+    probabilities: np.ndarray
+    predictions: List[PredictionResponse]
+    # Índice en el tramo → error de las filas que fallaron
+    errors: Dict[int, str]
+
+@dataclass
+class _BatchChunk:
+    """Tramo de filas que recorre las etapas del pipeline batch"""
+    offset: int
+    texts: List[str]
+    # Ids de tokens sin padding (None en filas que el tokenizador no pudo procesar)
+    token_ids: List[Optional[Sequence[int]]] = field(default_factory=list)
+    probabilities: Optional[np.ndarray] = None
+    errors: Dict[int, str] = field(default_factory=dict)
+
+@dataclass
+class BatchRun:
+    """Tramos predichos de un trabajo batch y su CSV de salida, antes de calcular métricas"""
+    slices: List[BatchSlice]
+    job_id: str
+    output_file: Path
+    partial_file: Path
+    stages: Dict[str, StageStats]
+    unique_rows: int
+
+@dataclass
+class _TokenBudget:
+    """Factor adaptativo del presupuesto de tokens de un trabajo batch (se reduce ante falta de memoria)
+
+    Es propio de cada trabajo: dos trabajos concurrentes no se pisan el factor.
+    """
+    scale: float = 1.0
+
+@dataclass
+class _BatchOutput:
+    """Estado de la etapa write: difunde la predicción de cada texto único a todas sus filas"""
+    file: Any
+    columns: List[str]
+    # Fila → texto único
+    codes: np.ndarray
+    # Texto único → primera fila en la que aparece
+    first_rows: np.ndarray
+    # Texto único → probabilidades
+    probabilities: np.ndarray
+    predictions: List[PredictionResponse] = field(default_factory=list)
+    # Texto único → error
+    errors: Dict[int, str] = field(default_factory=dict)
+    # Filas ya escritas en el CSV
+    written: int = 0
+
+class _InflightPrediction:
+    """Cálculo en curso compartido por los requests con el mismo texto"""
+    
+    __slots__ = ("computation", "waiters")
+    
+    def __init__(self, computation: "asyncio.Future"):
+        self.computation = computation
+        self.waiters = 0
+
 class MLModelService:
     """Servicio para el modelo de Machine Learning"""
     
     def __init__(self):
         self.model = None
         self.tokenizer = None
+        self.tokenizer_lock = threading.Lock()
         self.labels = None
-        self.mlb = None
         self.device = None
-        self._load_model()
+        self.model_version = None
+        self.vocab_hash = None
+        self._load_lock = threading.Lock()
+        self._batch_counts_lock = threading.Lock()
+        # Predicciones en curso por texto normalizado (solo se usa desde el event loop)
+        self._inflight: Dict[str, "_InflightPrediction"] = {}
+        self.coalesced_predictions = 0
+        BATCH_TOKEN_BUDGET.set(config.BATCH_TOKEN_BUDGET)
+    
+    def load_model(self):
+        """Carga el modelo si aún no está cargado (idempotente y seguro entre hilos)"""
+        with self._load_lock:
+            if not self.is_model_loaded():
+                self._load_model()
+    
+    def ensure_model_loaded(self) -> bool:
+        """Carga el modelo bajo demanda; retorna False si no se pudo cargar"""
+        if self.is_model_loaded():
+            return True
+        try:
+            self.load_model()
+        except Exception:
+            return False
+        return self.is_model_loaded()
     
     def _load_model(self):
         """Carga el modelo y tokenizer"""
         try:
+            import torch
+            from transformers import AutoTokenizer, AutoModelForSequenceClassification
+            
             model_path = config.get_model_path()
             
             # Cargar tokenizer y modelo
@@ -48,12 +176,10 @@ class MLModelService:
             with open(Path(model_path) / "label_encoder.json", "r") as f:
                 classes = json.load(f)
             
-            # Configurar MultiLabelBinarizer
-            self.mlb = MultiLabelBinarizer(classes=classes)
-            self.mlb.fit([[]])  # Inicializar el MLBinarizer
-            
-            # Mantener las clases para compatibilidad
+            # Clases en el orden de salida del modelo (equivalente a MultiLabelBinarizer.classes_)
             self.labels = np.array(classes)
+            self.model_version = self._compute_model_version(Path(model_path))
+            self.vocab_hash = self._compute_vocab_hash(self.tokenizer)
             
             logger.info(f"Modelo cargado exitosamente en {self.device}")
             logger.info(f"Clases disponibles: {classes}")
@@ -62,75 +188,218 @@ class MLModelService:
             logger.error(f"Error cargando modelo: {str(e)}")
             raise
     
+    @staticmethod
+    def _compute_model_version(model_path: Path) -> str:
+        """Identificador corto del modelo: hash de la configuración y de los archivos de pesos"""
+        digest = hashlib.sha256()
+        for name in ("config.json", "label_encoder.json"):
+            file_path = model_path / name
+            if file_path.exists():
+                digest.update(file_path.read_bytes())
+        # Los pesos pesan cientos de MB: basta con su nombre, tamaño y fecha de modificación
+        for file_path in sorted(model_path.glob("*.safetensors")) + sorted(model_path.glob("*.bin")):
+            stat = file_path.stat()
+            digest.update(f"{file_path.name}:{stat.st_size}:{int(stat.st_mtime)}".encode())
+        return f"{model_path.name}-{digest.hexdigest()[:12]}"
+    
+    @staticmethod
+    def _compute_vocab_hash(tokenizer) -> str:
+        """Hash del vocabulario (tokens en orden de id) para validar entradas pre-tokenizadas"""
+        vocab = tokenizer.get_vocab()
+        tokens = sorted(vocab, key=vocab.get)
+        return hashlib.sha256("\n".join(tokens).encode()).hexdigest()[:16]
+    
     def predict(self, text: str, threshold: float = 0.5) -> PredictionResponse:
         """Realiza predicción multilabel sobre un texto"""
         try:
-            # Tokenizar texto
-            inputs = self.tokenizer(
-                text,
-                return_tensors="pt",
-                truncation=True,
-                padding=True,
-                max_length=config.MAX_TEXT_LENGTH
-            ).to(self.device)
-            
-            # Realizar predicción
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                logits = outputs.logits
-                # Usar sigmoid para clasificación multilabel
-                probabilities = torch.sigmoid(logits).cpu().numpy()[0]
-            
-            # Obtener etiquetas predichas usando umbral
-            predicted_labels = []
-            probs_dict = {}
+            probabilities = self._predict_probabilities([text])[0]
             
-            for i, (cls, prob) in enumerate(zip(self.mlb.classes_, probabilities)):
-                probs_dict[cls] = round(float(prob), 4)
-                if prob > threshold:
-                    predicted_labels.append(cls)
-            
-            # Si no se predice ninguna etiqueta, usar la de mayor probabilidad
-            if not predicted_labels:
-                max_idx = np.argmax(probabilities)
-                predicted_labels = [self.mlb.classes_[max_idx]]
-                confidence = float(probabilities[max_idx])
-            else:
-                # Confianza como promedio de las probabilidades de las etiquetas predichas
-                confidence = float(np.mean([probabilities[self.mlb.classes_.tolist().index(label)] for label in predicted_labels]))
-            
-            # Crear string de clase predicha (compatible con formato anterior)
-            if len(predicted_labels) == 1:
-                predicted_class = predicted_labels[0]
-            else:
-                predicted_class = "|".join(sorted(predicted_labels))
-            
-            return PredictionResponse(
-                predicted_class=predicted_class,
-                confidence=round(confidence, 4),
-                probabilities=probs_dict,
-                categories=predicted_labels
-            )
+            stage_start = time.perf_counter()
+            response = self._build_prediction(probabilities, threshold)
+            self._observe_stage("postprocess", stage_start)
+            return response
             
         except Exception as e:
             logger.error(f"Error en predicción: {str(e)}")
             raise
     
+    async def predict_async(self, text: str, threshold: float = 0.5) -> PredictionResponse:
+        """Predicción vía el planificador de inferencia, compartiendo el forward entre requests idénticos
+        
+        Los requests concurrentes con el mismo texto normalizado esperan el mismo cálculo
+        en curso; cada uno aplica su propio umbral a las probabilidades compartidas.
+        """
+        key = self._normalize_text(text)
+        entry = self._inflight.get(key)
+        if entry is None or entry.computation.cancelled():
+            entry = _InflightPrediction(asyncio.ensure_future(
+                inference_scheduler.run("interactive", self._predict_probabilities, [key])
+            ))
+            self._inflight[key] = entry
+            entry.computation.add_done_callback(lambda _: self._discard_inflight(key, entry))
+        else:
+            self.coalesced_predictions += 1
+            INFERENCE_COALESCED.inc()
+        
+        # shield: si este request se cancela, los demás siguen esperando el mismo cálculo
+        entry.waiters += 1
+        try:
+            probabilities = (await asyncio.shield(entry.computation))[0]
+        except asyncio.CancelledError:
+            # El último request que abandona cancela el cálculo (si sigue en cola no se ejecuta)
+            if entry.waiters == 1:
+                entry.computation.cancel()
+            raise
+        finally:
+            entry.waiters -= 1
+        
+        stage_start = time.perf_counter()
+        response = self._build_prediction(probabilities, threshold)
+        self._observe_stage("postprocess", stage_start)
+        return response
+    
+    async def predict_tokens_async(self, token_ids: np.ndarray, threshold: float = 0.5) -> PredictionResponse:
+        """Predicción de ids de tokens ya validados, sin tokenizar, vía el planificador de inferencia"""
+        probabilities = (await inference_scheduler.run("interactive", self._predict_token_rows, [token_ids]))[0]
+        
+        stage_start = time.perf_counter()
+        response = self._build_prediction(probabilities, threshold)
+        self._observe_stage("postprocess", stage_start)
+        return response
+    
+    def _predict_token_rows(self, token_rows: List[np.ndarray]) -> np.ndarray:
+        return self._forward(self._pad(token_rows))
+    
+    def validate_token_rows(self, token_rows: List[np.ndarray], vocab_hash: str):
+        """Verifica que los ids vengan del mismo vocabulario y quepan en el modelo
+        
+        Lanza TokenIdsError si el hash de vocabulario no coincide, si hay filas vacías o
+        más largas que MAX_TEXT_LENGTH, o ids fuera del vocabulario.
+        """
+        if vocab_hash != self.vocab_hash:
+            raise TokenIdsError(
+                f"El vocabulario de los tokens ({vocab_hash}) no coincide con el del modelo ({self.vocab_hash})"
+            )
+        vocab_size = len(self.tokenizer)
+        for row, ids in enumerate(token_rows):
+            if not 0 < len(ids) <= config.MAX_TEXT_LENGTH:
+                raise TokenIdsError(f"Fila {row}: {len(ids)} tokens (se admiten entre 1 y {config.MAX_TEXT_LENGTH})")
+            if ids.min() < 0 or ids.max() >= vocab_size:
+                raise TokenIdsError(f"Fila {row}: ids fuera del vocabulario (0 a {vocab_size - 1})")
+    
+    def _discard_inflight(self, key: str, entry: "_InflightPrediction"):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+    
+    @staticmethod
+    def _normalize_text(text: str) -> str:
+        """Colapsa espacios en blanco (el tokenizador produce los mismos tokens)"""
+        return " ".join(text.split())
+    
+    def _predict_probabilities(self, texts: List[str]) -> np.ndarray:
+        """Tokeniza y ejecuta el modelo; retorna la matriz de probabilidades (textos × clases)"""
+        stage_start = time.perf_counter()
+        inputs = self._pad(self._tokenize(texts))
+        self._observe_stage("tokenize", stage_start)
+        return self._forward(inputs)
+    
+    def _tokenize(self, texts: List[str]) -> List[List[int]]:
+        """Ids de tokens de cada texto tras truncar (sin padding)"""
+        # El tokenizador rápido no admite llamadas concurrentes que cambien su configuración
+        with self.tokenizer_lock:
+            encoding = self.tokenizer(
+                texts,
+                truncation=True,
+                max_length=config.MAX_TEXT_LENGTH,
+                return_token_type_ids=False,
+                return_attention_mask=False
+            )
+        return encoding["input_ids"]
+    
+    def _pad(self, token_ids: List[Sequence[int]]) -> Dict[str, np.ndarray]:
+        """Entradas del modelo con padding al texto más largo del batch"""
+        longest = max(len(ids) for ids in token_ids)
+        input_ids = np.full((len(token_ids), longest), self.tokenizer.pad_token_id or 0, dtype=np.int64)
+        attention_mask = np.zeros((len(token_ids), longest), dtype=np.int64)
+        for row, ids in enumerate(token_ids):
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.tokenizer.model_input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+        return inputs
+    
+    def _forward(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        """Ejecuta el modelo sobre entradas ya tokenizadas"""
+        import torch
+        
+        stage_start = time.perf_counter()
+        with torch.no_grad():
+            # from_numpy comparte memoria con el array: sin copias en CPU
+            tensors = {name: torch.from_numpy(array).to(self.device) for name, array in inputs.items()}
+            logits = self.model(**tensors).logits
+            # Usar sigmoid para clasificación multilabel
+            probabilities = torch.sigmoid(logits).cpu().numpy()
+        INFERENCE_BATCH_SIZE.observe(len(inputs["input_ids"]))
+        self._observe_stage("forward", stage_start)
+        return probabilities
+    
+    def _build_prediction(self, probabilities: np.ndarray, threshold: float) -> PredictionResponse:
+        """Aplica el umbral a las probabilidades de un texto y construye la respuesta"""
+        # Obtener etiquetas predichas usando umbral
+        predicted_labels = []
+        probs_dict = {}
+        
+        for i, (cls, prob) in enumerate(zip(self.labels, probabilities)):
+            probs_dict[cls] = round(float(prob), 4)
+            if prob > threshold:
+                predicted_labels.append(cls)
+        
+        # Si no se predice ninguna etiqueta, usar la de mayor probabilidad
+        if not predicted_labels:
+            max_idx = np.argmax(probabilities)
+            predicted_labels = [self.labels[max_idx]]
+            confidence = float(probabilities[max_idx])
+        else:
+            # Confianza como promedio de las probabilidades de las etiquetas predichas
+            confidence = float(np.mean([probabilities[self.labels.tolist().index(label)] for label in predicted_labels]))
+        
+        # Crear string de clase predicha (compatible con formato anterior)
+        if len(predicted_labels) == 1:
+            predicted_class = predicted_labels[0]
+        else:
+            predicted_class = "|".join(sorted(predicted_labels))
+        
+        return PredictionResponse(
+            predicted_class=predicted_class,
+            confidence=round(confidence, 4),
+            probabilities=probs_dict,
+            categories=predicted_labels
+        )
+    
+    def _observe_stage(self, stage: str, stage_start: float) -> float:
+        """Registra la duración de una etapa de inferencia y retorna el inicio de la siguiente"""
+        now = time.perf_counter()
+        INFERENCE_STAGE_DURATION.labels(stage).observe(now - stage_start)
+        record_timing(stage, now - stage_start)
+        return now
+    
     def get_model_metrics(self) -> MetricsResponse:
         """Obtiene métricas reales del modelo desde evaluation_results.json"""
         try:
-            # Cargar métricas reales desde el archivo JSON
-            metrics_path = Path(config.get_project_root()) / "training-results" / "evaluation_results.json"
+            # Cargar métricas reales desde el archivo JSON (cacheado hasta que cambie en disco)
+            metrics_path = config.get_training_results_path(config.EVALUATION_RESULTS_FILE)
+            eval_data = artifact_cache.load_json(metrics_path)
             
-            with open(metrics_path, "r") as f:
-                eval_data = json.load(f)
+            # Las etiquetas se leen del label_encoder si el modelo aún no se ha cargado
+            labels = self.labels if self.labels is not None else MLUtils.load_labels(config.get_model_path())
             
             return MetricsResponse(
                 f1_score=round(eval_data.get("eval_f1", 0.0), 4),
                 accuracy=1.0 - eval_data.get("eval_hamming_loss", 0.0),  # Accuracy basada en hamming loss
                 precision=round(eval_data.get("eval_precision", 0.0), 4),
                 recall=round(eval_data.get("eval_recall", 0.0), 4),
-                total_classes=len([label for label in self.labels.tolist() if label is not None and str(label) != 'nan'])
+                total_classes=len([label for label in labels.tolist() if label is not None and str(label) != 'nan'])
             )
             
         except Exception as e:
@@ -147,13 +416,9 @@ class MLModelService:
     def get_class_distribution(self) -> Dict[str, int]:
         """Obtiene distribución real de clases desde group_counts.json"""
         try:
-            # Cargar distribución real desde el archivo JSON
-            counts_path = Path(config.get_project_root()) / "training-results" / "group_counts.json"
-            
-            with open(counts_path, "r") as f:
-                distribution_data = json.load(f)
-            
-            return distribution_data
+            # Cargar distribución real desde el archivo JSON (copia: el contenido cacheado es compartido)
+            counts_path = config.get_training_results_path(config.GROUP_COUNTS_FILE)
+            return dict(artifact_cache.load_json(counts_path))
             
         except Exception as e:
             logger.error(f"Error cargando distribución real: {str(e)}")
@@ -173,50 +438,317 @@ class MLModelService:
     
     def is_model_loaded(self) -> bool:
         """Verifica si el modelo está cargado"""
-        return self.model is not None and self.tokenizer is not None and self.mlb is not None
+        return self.model is not None and self.tokenizer is not None and self.labels is not None
     
     def get_available_classes(self) -> List[str]:
         """Obtiene las clases disponibles"""
-        if self.mlb is None:
+        if self.labels is None:
             return []
-        return self.mlb.classes_.tolist()
+        return self.labels.tolist()
+    
+    def predict_batch(self, df: "pd.DataFrame", threshold: float = 0.5) -> Dict[str, Any]:
+        """Realiza predicciones batch sobre un DataFrame y calcula métricas
+        
+        Versión sincrónica (fuera del planificador de inferencia); la API usa
+        run_batch_pipeline en el carril batch.
+        """
+        job_start = time.perf_counter()
+        texts = self.prepare_batch(df, threshold)
+        run = asyncio.run(self.run_batch_pipeline(df, texts, threshold, scheduled=False))
+        return self.finish_batch(df, threshold, run, job_start)
     
-    def predict_batch(self, df: pd.DataFrame, threshold: float = 0.5) -> Dict[str, Any]:
-        """Realiza predicciones batch sobre un DataFrame y calcula métricas"""
+    def prepare_batch(self, df: "pd.DataFrame", threshold: float) -> List[str]:
+        """Crea la columna de texto combinado y retorna los textos a predecir"""
+        df['combined_text'] = df['title'].astype(str) + ' ' + df['abstract'].astype(str)
+        logger.info(f"Procesando {len(df)} registros con threshold {threshold}")
+        return df['combined_text'].tolist()
+    
+    async def run_batch_pipeline(
+        self,
+        df: "pd.DataFrame",
+        texts: List[str],
+        threshold: float,
+        scheduled: bool = True,
+        token_rows: Optional[List[np.ndarray]] = None
+    ) -> BatchRun:
+        """Predice un trabajo batch en un pipeline de tres etapas
+        
+        - tokenize: tokeniza tramos de BATCH_PIPELINE_CHUNK_ROWS filas (el tokenizador
+          rápido paraleliza internamente) mientras el modelo procesa el tramo anterior
+        - forward: parte cada tramo por presupuesto de tokens; con `scheduled` cada parte
+          es una unidad de trabajo del carril batch del planificador (solo la primera pasa
+          por el control de admisión)
+        - write: aplica el umbral y agrega las filas al CSV de salida
+        
+        Las filas con el mismo texto (o los mismos ids) se predicen una sola vez: las
+        etapas tokenize y forward recorren solo los textos únicos y la etapa write copia
+        la predicción a todas las filas en que aparece cada uno.
+        
+        Con `token_rows` (ids pre-tokenizados y validados, uno por fila) la etapa tokenize
+        no hace nada. Las colas entre etapas tienen BATCH_PIPELINE_QUEUE_SIZE tramos. Si el
+        pipeline falla o se cancela, se descarta el CSV parcial.
+        """
+        # El nombre incluye el job_id: dos trabajos nunca comparten archivo
+        job_id = threshold_service.new_job_id()
+        output_file = self._processed_csv_path(job_id)
+        partial_file = output_file.with_suffix(".csv.part")
+        columns = self._output_columns(df)
+        budget = _TokenBudget()
+        first_unit = True
+        
+        async def run_unit(func, *args):
+            nonlocal first_unit
+            admit, first_unit = first_unit, False
+            if scheduled:
+                return await inference_scheduler.run("batch", func, *args, admit=admit)
+            return await asyncio.to_thread(func, *args)
+        
+        codes, first_rows = self._deduplicate(texts, token_rows)
+        BATCH_DEDUPLICATED_ROWS.inc(len(texts) - len(first_rows))
+        
+        # Los tramos recorren los textos únicos en el orden de su primera aparición
+        chunk_rows = max(1, config.BATCH_PIPELINE_CHUNK_ROWS)
+        chunks = (
+            _BatchChunk(
+                offset,
+                [texts[row] for row in first_rows[offset:offset + chunk_rows]],
+                token_ids=[token_rows[row] for row in first_rows[offset:offset + chunk_rows]] if token_rows is not None else []
+            )
+            for offset in range(0, len(first_rows), chunk_rows)
+        )
+        # "x": falla en vez de pisar un archivo existente
+        writer = open(partial_file, "x", newline="")
         try:
-            # Crear columna de texto combinado
-            df['combined_text'] = df['title'].astype(str) + ' ' + df['abstract'].astype(str)
-            
-            # Realizar predicciones para todos los textos
-            predictions = []
-            predicted_categories = []
+            with writer:
+                df.iloc[:0].reindex(columns=columns).to_csv(writer, index=False)
+                output = _BatchOutput(
+                    writer, columns, codes, first_rows,
+                    probabilities=np.full((len(first_rows), len(self.labels)), np.nan, dtype=np.float32)
+                )
+                slices, stages = await run_pipeline(chunks, [
+                    ("tokenize", lambda chunk: asyncio.to_thread(self._tokenize_chunk, chunk)),
+                    ("forward", lambda chunk: self._forward_chunk(chunk, run_unit, budget)),
+                    ("write", lambda chunk: asyncio.to_thread(self._write_chunk, chunk, df, threshold, output)),
+                ], config.BATCH_PIPELINE_QUEUE_SIZE)
+        except BaseException:
+            partial_file.unlink(missing_ok=True)
+            raise
+        return BatchRun(slices, job_id, output_file, partial_file, stages, unique_rows=len(first_rows))
+    
+    @staticmethod
+    def _deduplicate(texts: List[str], token_rows: Optional[List[np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Índice del texto único de cada fila y primera fila de cada texto único
+        
+        Con entrada pre-tokenizada se comparan los ids en lugar del texto.
+        """
+        import pandas as pd
+        
+        keys = texts if token_rows is None else [np.asarray(ids, dtype=np.int32).tobytes() for ids in token_rows]
+        # factorize numera los valores en orden de primera aparición
+        codes, _ = pd.factorize(pd.Series(keys, dtype=object))
+        # return_index da la primera aparición de cada código (0..únicos-1, ya ordenados)
+        _, first_rows = np.unique(codes, return_index=True)
+        return codes, first_rows.astype(np.int64)
+    
+    def _tokenize_chunk(self, chunk: _BatchChunk) -> _BatchChunk:
+        """Etapa tokenize: ids de tokens de las filas del tramo (salvo que ya vengan pre-tokenizadas)"""
+        if chunk.token_ids:
+            return chunk
+        stage_start = time.perf_counter()
+        chunk.token_ids, chunk.errors = self._tokenize_rows(chunk.texts)
+        self._observe_stage("tokenize", stage_start)
+        return chunk
+    
+    def _tokenize_rows(self, texts: List[str]) -> Tuple[List[Optional[List[int]]], Dict[int, str]]:
+        """Tokeniza filas; si el tokenizador falla, aísla por bisección las que lo rompen"""
+        try:
+            return self._tokenize(texts), {}
+        except Exception as e:
+            if len(texts) == 1:
+                BATCH_ROW_ERRORS.inc()
+                logger.warning(f"Error tokenizando: {str(e)}")
+                return [None], {0: f"{type(e).__name__}: {str(e)}"}
+            middle = len(texts) // 2
+            left_ids, left_errors = self._tokenize_rows(texts[:middle])
+            right_ids, right_errors = self._tokenize_rows(texts[middle:])
+            return left_ids + right_ids, {**left_errors, **{middle + idx: error for idx, error in right_errors.items()}}
+    
+    async def _forward_chunk(self, chunk: _BatchChunk, run_unit, budget: _TokenBudget) -> _BatchChunk:
+        """Etapa forward: predice el tramo en partes que caben en el presupuesto de tokens"""
+        chunk.probabilities = np.full((len(chunk.texts), len(self.labels)), np.nan, dtype=np.float32)
+        rows = [idx for idx, ids in enumerate(chunk.token_ids) if ids is not None]
+        lengths = [len(chunk.token_ids[idx]) for idx in rows]
+        start = 0
+        while start < len(rows):
+            end = start + self._rows_within_budget(lengths[start:], config.BATCH_TOKEN_BUDGET)
+            part = rows[start:end]
+            probabilities, errors = await run_unit(self._forward_with_backoff, [chunk.token_ids[idx] for idx in part], budget)
+            chunk.probabilities[part] = probabilities
+            chunk.errors.update({part[idx]: error for idx, error in errors.items()})
+            start = end
+        return chunk
+    
+    def _write_chunk(
+        self,
+        chunk: _BatchChunk,
+        df: "pd.DataFrame",
+        threshold: float,
+        output: _BatchOutput
+    ) -> BatchSlice:
+        """Etapa write: aplica el umbral y agrega al CSV las filas cuyos textos ya se predijeron
+        
+        Como los textos únicos se predicen en orden de primera aparición, las filas listas
+        siempre forman un prefijo: todas las anteriores a la primera aparición del siguiente
+        texto único pendiente.
+        """
+        output.predictions.extend(
+            self._failed_prediction() if idx in chunk.errors else self._build_prediction(row, threshold)
+            for idx, row in enumerate(chunk.probabilities)
+        )
+        output.probabilities[chunk.offset:chunk.offset + len(chunk.texts)] = chunk.probabilities
+        output.errors.update({chunk.offset + idx: error for idx, error in chunk.errors.items()})
+        
+        pending = chunk.offset + len(chunk.texts)
+        end = int(output.first_rows[pending]) if pending < len(output.first_rows) else len(output.codes)
+        codes = output.codes[output.written:end]
+        predictions = [output.predictions[code] for code in codes]
+        errors = {idx: output.errors[code] for idx, code in enumerate(codes.tolist()) if code in output.errors}
+        
+        rows = df.iloc[output.written:end].copy()
+        rows['group_predicted'] = ["|".join(pred.categories) if pred.categories else "unknown" for pred in predictions]
+        rows['confidence'] = [pred.confidence for pred in predictions]
+        rows['error'] = [errors.get(idx, "") for idx in range(len(predictions))]
+        rows[output.columns].to_csv(output.file, header=False, index=False)
+        output.written = end
+        return BatchSlice(output.probabilities[codes], predictions, errors)
+    
+    @staticmethod
+    def _failed_prediction() -> PredictionResponse:
+        """Predicción por defecto de una fila con error"""
+        return PredictionResponse(
+            predicted_class="unknown",
+            confidence=0.0,
+            probabilities={"unknown": 0.0},
+            categories=["unknown"]
+        )
+    
+    @staticmethod
+    def _rows_within_budget(lengths: List[int], budget: float) -> int:
+        """Filas iniciales cuyo forward (filas × largo máximo) cabe en el presupuesto; al menos una"""
+        longest = 0
+        for rows, length in enumerate(lengths):
+            longest = max(longest, length)
+            if rows > 0 and (rows + 1) * longest > budget:
+                return rows
+        return len(lengths)
+    
+    def _forward_with_backoff(
+        self,
+        token_ids: List[Sequence[int]],
+        budget: Optional[_TokenBudget] = None
+    ) -> Tuple[np.ndarray, Dict[int, str]]:
+        """Forward de una parte en sub-batches que se achican ante falta de memoria o errores
+        
+        El presupuesto efectivo es BATCH_TOKEN_BUDGET × el factor adaptativo del trabajo. Si el RSS
+        supera el techo o una asignación falla, el factor se reduce a la mitad y el
+        sub-batch se divide y se reintenta; tras cada forward exitoso con memoria holgada
+        el factor se recupera de a poco. Cualquier otro error divide el sub-batch en
+        mitades hasta aislar las filas que fallan solas, que quedan con probabilidades
+        NaN. Retorna las probabilidades y {índice en la parte: error}.
+        """
+        budget = budget if budget is not None else _TokenBudget()
+        probabilities = np.full((len(token_ids), len(self.labels)), np.nan, dtype=np.float32)
+        errors: Dict[int, str] = {}
+        lengths = [len(ids) for ids in token_ids]
+        pending = deque([(0, len(token_ids))])
+        while pending:
+            start, end = pending.popleft()
+            rows = self._rows_within_budget(lengths[start:end], config.BATCH_TOKEN_BUDGET * budget.scale)
+            if rows < end - start:
+                pending.extendleft([(start + rows, end), (start, start + rows)])
+                continue
+            try:
+                self._check_memory(end - start)
+                probabilities[start:end] = self._forward(self._pad(token_ids[start:end]))
+            except Exception as e:
+                if end - start == 1:
+                    errors[start] = f"{type(e).__name__}: {str(e)}"
+                    BATCH_ROW_ERRORS.inc()
+                    logger.warning(f"Error en predicción: {str(e)}")
+                    continue
+                if _is_out_of_memory(e):
+                    self._shrink_budget(budget, "rss" if isinstance(e, MemoryPressureError) else "oom", e)
+                middle = (start + end) // 2
+                pending.extendleft([(middle, end), (start, middle)])
+                continue
+            self._recover_budget(budget)
+        return probabilities, errors
+    
+    def _check_memory(self, rows: int):
+        """Lanza MemoryPressureError si el RSS supera el techo y el sub-batch aún se puede dividir"""
+        ceiling = config.BATCH_RSS_CEILING_MB * 2**20
+        if not ceiling or get_process_rss_bytes() <= ceiling:
+            return
+        gc.collect()
+        rss = get_process_rss_bytes()
+        if rss > ceiling:
+            if rows > 1:
+                raise MemoryPressureError(f"RSS de {rss / 2**20:.0f} MB supera el techo de {config.BATCH_RSS_CEILING_MB} MB")
+            logger.warning(f"RSS de {rss / 2**20:.0f} MB sobre el techo con una sola fila; se continúa")
+    
+    def _shrink_budget(self, budget: _TokenBudget, reason: str, error: Exception):
+        budget.scale = max(budget.scale / 2, 1 / 64)
+        BATCH_BACKOFFS.labels(reason).inc()
+        BATCH_TOKEN_BUDGET.set(config.BATCH_TOKEN_BUDGET * budget.scale)
+        logger.warning(
+            f"Falta de memoria en batch ({reason}): presupuesto reducido a "
+            f"{config.BATCH_TOKEN_BUDGET * budget.scale:.0f} tokens: {str(error)}"
+        )
+        # Liberar lo que dejó el intento fallido antes de reintentar
+        gc.collect()
+        if self.device is not None and self.device.type == "cuda":
+            import torch
+            torch.cuda.empty_cache()
+    
+    def _recover_budget(self, budget: _TokenBudget):
+        if budget.scale >= 1.0:
+            return
+        ceiling = config.BATCH_RSS_CEILING_MB * 2**20
+        if not ceiling or get_process_rss_bytes() < 0.8 * ceiling:
+            budget.scale = min(1.0, budget.scale * 1.1)
+            BATCH_TOKEN_BUDGET.set(config.BATCH_TOKEN_BUDGET * budget.scale)
+    
+    def finish_batch(
+        self,
+        df: "pd.DataFrame",
+        threshold: float,
+        run: BatchRun,
+        job_start: float
+    ) -> Dict[str, Any]:
+        """Une los tramos predichos, calcula métricas y publica el CSV de salida del trabajo"""
+        slices = run.slices
+        try:
+            from sklearn.preprocessing import MultiLabelBinarizer
+            from sklearn.metrics import precision_recall_fscore_support, hamming_loss
             
-            logger.info(f"Procesando {len(df)} registros con threshold {threshold}")
+            # Probabilidades por fila (NaN en filas con error) para barridos de umbral posteriores
+            probability_rows = (
+                np.concatenate([batch_slice.probabilities for batch_slice in slices])
+                if slices else np.empty((0, len(self.labels)), dtype=np.float32)
+            )
+            predictions = [prediction for batch_slice in slices for prediction in batch_slice.predictions]
+            predicted_categories = [prediction.categories for prediction in predictions]
             
-            for idx, text in enumerate(df['combined_text']):
-                try:
-                    # Realizar predicción individual
-                    prediction = self.predict(text, threshold)
-                    predictions.append(prediction)
-                    predicted_categories.append(prediction.categories)
-                    
-                    if (idx + 1) % 100 == 0:  # Log cada 100 registros
-                        logger.info(f"Procesados {idx + 1}/{len(df)} registros")
-                        
-                except Exception as e:
-                    logger.warning(f"Error en predicción {idx}: {str(e)}")
-                    # Usar predicción por defecto en caso de error
-                    predictions.append(PredictionResponse(
-                        predicted_class="unknown",
-                        confidence=0.0,
-                        probabilities={"unknown": 0.0},
-                        categories=["unknown"]
-                    ))
-                    predicted_categories.append(["unknown"])
+            # Índices de las filas con error en el DataFrame completo
+            row_errors: Dict[int, str] = {}
+            offset = 0
+            for batch_slice in slices:
+                row_errors.update({offset + idx: error for idx, error in batch_slice.errors.items()})
+                offset += len(batch_slice.predictions)
+            logger.info(f"Procesados {len(predictions)}/{len(df)} registros ({len(row_errors)} con error)")
             
             # Añadir columna de predicciones al DataFrame
             df['group_predicted'] = ["|".join(cats) if cats else "unknown" for cats in predicted_categories]
-            df['confidence'] = [pred.confidence for pred in predictions]
             
             # Preparar etiquetas verdaderas y predichas para métricas
             true_labels = []
@@ -231,6 +763,17 @@ class MLModelService:
                 pred_cats = [cat.strip() for cat in str(row['group_predicted']).split('|') if cat.strip()]
                 pred_labels.append(pred_cats)
             
+            # Acumular las combinaciones reales para las correlaciones entre categorías
+            self._update_batch_group_counts(true_labels)
+            
+            # Sumar TP/FP/FN/TN por categoría al agregado de evaluaciones batch
+            y_true = self._binarize(true_labels)
+            self._record_confusion(y_true, self._binarize(pred_labels))
+            
+            # Guardar la matriz de probabilidades del trabajo para barridos de umbral
+            job_id = threshold_service.save_job(probability_rows, y_true, self.get_available_classes(),
+                                                threshold, self.model_version, job_id=run.job_id)
+            
             # Calcular métricas usando MultiLabelBinarizer
             all_categories = list(set(
                 [cat for cats in true_labels + pred_labels for cat in cats if cat != "unknown"]
@@ -294,46 +837,109 @@ class MLModelService:
                 except Exception as e:
                     logger.warning(f"Error calculando métricas: {str(e)}")
             
-            # Guardar archivo procesado
-            output_file = self._save_processed_csv(df)
+            # Publicar el archivo procesado (escrito tramo a tramo por el pipeline)
+            os.replace(run.partial_file, run.output_file)
+            output_file = str(run.output_file)
+            logger.info(f"Archivo procesado guardado en: {output_file}")
+            
+            elapsed = time.perf_counter() - job_start
+            BATCH_JOBS.labels("completed").inc()
+            BATCH_ROWS.inc(len(df))
+            BATCH_ROWS_PER_SECOND.set(len(df) / elapsed if elapsed > 0 else 0.0)
+            timeseries_store.record_batch(
+                len(df),
+                elapsed,
+                f1_score=metrics.f1_score if metrics else None,
+                hamming_loss=metrics.hamming_loss if metrics else None,
+                exact_match_ratio=metrics.exact_match_ratio if metrics else None
+            )
             
             return {
+                "job_id": job_id,
                 "total_processed": len(df),
                 "metrics": metrics,
+                "failed_rows": [
+                    BatchRowError(index=idx, error=error) for idx, error in sorted(row_errors.items())
+                ],
+                "unique_rows": run.unique_rows,
+                "dedup_ratio": round(1 - run.unique_rows / len(df), 4) if len(df) else 0.0,
+                "pipeline": {name: stage.as_dict() for name, stage in run.stages.items()},
                 "download_url": f"/api/v1/ml/download/{os.path.basename(output_file)}",
                 "output_file": output_file
             }
             
         except Exception as e:
+            run.partial_file.unlink(missing_ok=True)
+            BATCH_JOBS.labels("failed").inc()
             logger.error(f"Error en predicción batch: {str(e)}")
             raise
     
-    def _save_processed_csv(self, df: pd.DataFrame) -> str:
-        """Guarda el DataFrame procesado como CSV temporal"""
+    def _binarize(self, label_lists: List[List[str]]) -> np.ndarray:
+        """Matriz binaria (filas × clases del modelo); ignora etiquetas desconocidas"""
+        index = {label: i for i, label in enumerate(self.get_available_classes())}
+        binary = np.zeros((len(label_lists), len(index)), dtype=bool)
+        for row, labels in enumerate(label_lists):
+            binary[row, [index[label] for label in labels if label in index]] = True
+        return binary
+    
+    def _record_confusion(self, y_true: np.ndarray, y_pred: np.ndarray):
+        """Suma los conteos por categoría del trabajo al agregado de evaluaciones"""
+        # Solo las filas etiquetadas aportan a la matriz de confusión
+        labeled = y_true.any(axis=1)
+        if labeled.any():
+            confusion_service.record(self.model_version, self.get_available_classes(), y_true[labeled], y_pred[labeled])
+    
+    def _update_batch_group_counts(self, true_labels: List[List[str]]):
+        """Suma las combinaciones de etiquetas reales del batch a los conteos acumulados en disco"""
+        known = set(self.get_available_classes())
+        batch_counts: Dict[str, int] = {}
+        for labels in true_labels:
+            valid = sorted(set(label for label in labels if label in known))
+            if valid:
+                group = "|".join(valid)
+                batch_counts[group] = batch_counts.get(group, 0) + 1
+        if not batch_counts:
+            return
+        
         try:
-            # Crear directorio temporal si no existe
-            temp_dir = Path(config.get_project_root()) / "temp"
-            temp_dir.mkdir(exist_ok=True)
-            
-            # Generar nombre de archivo único
-            import datetime
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_file = temp_dir / f"predictions_{timestamp}.csv"
-            
-            # Reordenar columnas para mejor legibilidad
-            columns_order = ['title', 'abstract', 'group', 'group_predicted', 'confidence']
-            existing_columns = [col for col in columns_order if col in df.columns]
-            other_columns = [col for col in df.columns if col not in columns_order]
-            final_columns = existing_columns + other_columns
-            
-            df[final_columns].to_csv(output_file, index=False)
-            
-            logger.info(f"Archivo procesado guardado en: {output_file}")
-            return str(output_file)
-            
+            counts_path = config.get_batch_group_counts_path()
+            # Bloqueo entre hilos y entre workers: leer, sumar y reescribir sin perder conteos
+            with self._batch_counts_lock, file_lock(counts_path):
+                counts: Dict[str, int] = {}
+                if counts_path.exists():
+                    with open(counts_path, "r") as f:
+                        counts = json.load(f)
+                for group, count in batch_counts.items():
+                    counts[group] = counts.get(group, 0) + count
+                
+                # Escritura atómica: los lectores nunca ven un archivo a medio escribir
+                counts_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = counts_path.with_suffix(f".{os.getpid()}.tmp")
+                with open(tmp_path, "w") as f:
+                    json.dump(counts, f, indent=4)
+                os.replace(tmp_path, counts_path)
         except Exception as e:
-            logger.error(f"Error guardando archivo procesado: {str(e)}")
-            raise
+            logger.warning(f"Error actualizando conteos de etiquetas batch: {str(e)}")
+    
+    def _processed_csv_path(self, job_id: str) -> Path:
+        """Ruta única para el CSV procesado de un trabajo"""
+        # Crear directorio temporal si no existe
+        temp_dir = config.get_temp_dir()
+        
+        # Generar nombre de archivo único
+        import datetime
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        return temp_dir / f"predictions_{timestamp}_{job_id}.csv"
+    
+    @staticmethod
+    def _output_columns(df: "pd.DataFrame") -> List[str]:
+        """Columnas del CSV procesado"""
+        # Reordenar columnas para mejor legibilidad
+        predicted_columns = ['group_predicted', 'confidence', 'error']
+        columns_order = ['title', 'abstract', 'group'] + predicted_columns
+        existing_columns = [col for col in columns_order if col in df.columns or col in predicted_columns]
+        other_columns = [col for col in df.columns if col not in columns_order]
+        return existing_columns + other_columns
 
-# Instancia global del servicio
+# Instancia global del servicio (el modelo se carga en el arranque de la API o bajo demanda)
 ml_service = MLModelService()
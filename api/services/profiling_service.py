@@ -0,0 +1,216 @@
+"""
+Servicio de profiling bajo demanda para diagnóstico en producción
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from ..core.config import config
+from .inference_scheduler import inference_scheduler
+
+logger = logging.getLogger(__name__)
+
+class ProfilerBusyError(Exception):
+    """Ya hay una captura de profiling en curso"""
+
+class SamplingProfiler:
+    """Profiler de muestreo de pila para todos los hilos del proceso
+
+    Un hilo en segundo plano toma `sys._current_frames()` a intervalos fijos y
+    cuenta las pilas colapsadas (formato de flamegraph). El costo por muestra es
+    proporcional a la profundidad de las pilas, no al tráfico, por lo que el
+    overhead queda acotado por el intervalo de muestreo.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = max(interval, 0.001)
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        thread_names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if any(ident not in thread_names for ident in frames):
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write_collapsed(self, path: Path):
+        """Escribe las pilas en formato colapsado (flamegraph.pl / speedscope)"""
+        with open(path, "w") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class ProfilingService:
+    """Captura perfiles acotados en tiempo del tráfico en vivo, de a uno por vez"""
+
+    MODES = ("python", "torch")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def is_busy(self) -> bool:
+        return self._lock.locked()
+
+    async def capture(self, mode: str, duration: float) -> Tuple[Path, Dict[str, Any]]:
+        """Captura un perfil durante `duration` segundos
+
+        Retorna la ruta del artefacto y los datos del muestreo (qué parte del tráfico cubre).
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Modo de profiling inválido: {mode}")
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("Ya hay una captura de profiling en curso")
+
+        try:
+            duration = min(duration, config.PROFILE_MAX_SECONDS)
+            output_dir = config.get_temp_dir("profiles")
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            logger.info(f"Iniciando captura de profiling '{mode}' durante {duration}s")
+
+            if mode == "torch":
+                path, sampling = await self._capture_torch(duration, output_dir / f"profile_torch_{timestamp}.json")
+            else:
+                path, sampling = await self._capture_python(duration, output_dir / f"profile_python_{timestamp}.folded")
+
+            logger.info(f"Captura de profiling guardada en: {path} ({sampling})")
+            return path, sampling
+        finally:
+            self._lock.release()
+
+    async def _capture_python(self, duration: float, path: Path) -> Tuple[Path, Dict[str, Any]]:
+        """Muestreo de pilas Python de todos los hilos"""
+        profiler = SamplingProfiler(config.PROFILE_SAMPLE_INTERVAL)
+        profiler.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            profiler.stop()
+        await asyncio.to_thread(profiler.write_collapsed, path)
+        return path, {"samples": profiler.samples, "interval_seconds": profiler.interval}
+
+    async def _capture_torch(self, duration: float, path: Path) -> Tuple[Path, Dict[str, Any]]:
+        """Perfil de operadores con torch.profiler exportado como traza de Chrome
+
+        torch.profiler solo registra los operadores del hilo que lo inicia, y la inferencia
+        corre en los hilos del planificador: mientras dura la captura, cada unidad de trabajo
+        se perfila en su propio hilo y al final se unen las trazas.
+
+        Iniciar y detener el profiler cuesta más que el forward de una unidad, así que solo
+        se perfila una de cada PROFILE_TORCH_EVERY unidades, hasta PROFILE_TORCH_MAX_UNITS;
+        el resto del tráfico no paga ese costo. Kineto admite un perfil activo a la vez: una
+        unidad elegida que se superpone con otra ya perfilada se omite.
+        """
+        import torch
+        from torch.profiler import profile, ProfilerActivity
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+
+        every = max(1, config.PROFILE_TORCH_EVERY)
+        max_units = max(1, config.PROFILE_TORCH_MAX_UNITS)
+        profilers = []
+        unit_lock = threading.Lock()
+        counter_lock = threading.Lock()
+        units_seen = 0
+
+        @contextlib.contextmanager
+        def profile_unit():
+            nonlocal units_seen
+            with counter_lock:
+                chosen = units_seen % every == 0 and len(profilers) < max_units
+                units_seen += 1
+            if not chosen or not unit_lock.acquire(blocking=False):
+                yield
+                return
+            try:
+                # Sin shapes ni stacks para mantener bajo el overhead sobre el tráfico en vivo
+                profiler = profile(activities=activities, record_shapes=False, with_stack=False)
+                profiler.start()
+                try:
+                    yield
+                finally:
+                    profiler.stop()
+                    profilers.append(profiler)
+            finally:
+                unit_lock.release()
+
+        inference_scheduler.set_unit_hook(profile_unit)
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            inference_scheduler.set_unit_hook(None)
+        # Esperar a la unidad que se estaba perfilando al terminar la captura
+        await asyncio.to_thread(unit_lock.acquire)
+        unit_lock.release()
+        sampling = {
+            "units_seen": units_seen,
+            "units_profiled": len(profilers),
+            "sample_every": every,
+            "max_units": max_units
+        }
+        await asyncio.to_thread(self._write_torch_trace, list(profilers), sampling, path)
+        return path, sampling
+
+    @staticmethod
+    def _write_torch_trace(profilers: List[Any], sampling: Dict[str, Any], path: Path):
+        """Une las trazas de Chrome de cada unidad perfilada en un solo archivo"""
+
+        traces = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for index, profiler in enumerate(profilers):
+                trace_path = Path(tmp_dir) / f"{index}.json"
+                profiler.export_chrome_trace(str(trace_path))
+                with open(trace_path) as f:
+                    traces.append(json.load(f))
+
+        # Los ts de cada traza son relativos a su baseTimeNanoseconds: llevarlos a una base común
+        base = min((trace.get("baseTimeNanoseconds", 0) for trace in traces), default=0)
+        events = []
+        for trace in traces:
+            shift = (trace.get("baseTimeNanoseconds", 0) - base) / 1000
+            for event in trace.get("traceEvents", []):
+                if "ts" in event and event.get("ph") != "M":
+                    event["ts"] += shift
+                events.append(event)
+        with open(path, "w") as f:
+            # otherData: metadatos libres del formato de trazas de Chrome (qué unidades se perfilaron)
+            json.dump({
+                "traceEvents": events,
+                "displayTimeUnit": "ms",
+                "baseTimeNanoseconds": base,
+                "otherData": {"sampling": sampling}
+            }, f)
+
+# Instancia global del servicio
+profiling_service = ProfilingService()
@@ -0,0 +1,222 @@
+"""
+Barrido de umbrales sobre las probabilidades guardadas de trabajos batch
+"""
+import logging
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..core.config import config
+
+logger = logging.getLogger(__name__)
+
+_JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{12}$")
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """División con 0 donde el denominador es 0 (zero_division=0 de sklearn)"""
+    numerator = np.asarray(numerator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+def apply_thresholds(probabilities: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """Predicciones para una grilla de umbrales: (umbrales × muestras × clases)
+
+    `thresholds` es (umbrales,) para umbrales globales o (umbrales, clases) por categoría.
+    Igual que en la predicción, si ninguna clase supera el umbral se usa la de mayor probabilidad.
+    """
+    grid = thresholds[:, None, None] if thresholds.ndim == 1 else thresholds[:, None, :]
+    predicted = probabilities[None, :, :] > grid
+    top_class = np.zeros_like(probabilities, dtype=bool)
+    top_class[np.arange(len(probabilities)), probabilities.argmax(axis=1)] = True
+    empty = ~predicted.any(axis=2, keepdims=True)
+    return predicted | (empty & top_class[None, :, :])
+
+def evaluate_predictions(predicted: np.ndarray, y_true: np.ndarray) -> Dict[str, np.ndarray]:
+    """Métricas multilabel para cada umbral de la grilla en una sola pasada vectorizada"""
+    truth = y_true[None, :, :]
+    tp = (predicted & truth).sum(axis=1)
+    fp = (predicted & ~truth).sum(axis=1)
+    fn = (~predicted & truth).sum(axis=1)
+
+    precision = _safe_divide(tp, tp + fp)
+    recall = _safe_divide(tp, tp + fn)
+    f1 = _safe_divide(2 * precision * recall, precision + recall)
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "macro_f1": f1.mean(axis=1),
+        "micro_f1": _safe_divide(2 * tp.sum(axis=1), 2 * tp.sum(axis=1) + fp.sum(axis=1) + fn.sum(axis=1)),
+        "hamming_loss": (predicted != truth).mean(axis=(1, 2)),
+        "exact_match_ratio": (predicted == truth).all(axis=2).mean(axis=1),
+    }
+
+def sweep_global_thresholds(probabilities: np.ndarray, y_true: np.ndarray, thresholds: np.ndarray) -> Dict[str, np.ndarray]:
+    """Las métricas de evaluate_predictions(apply_thresholds(...)) para umbrales globales, sin materializar la grilla
+
+    Con un umbral global t, la clase de mayor probabilidad de cada fila siempre se predice
+    (o supera t, o ninguna lo supera y entra por el respaldo) y cualquier otra se predice
+    si y solo si supera t. Así los conteos de cada clase para toda la grilla salen de una
+    búsqueda binaria sobre sus probabilidades ordenadas, y una fila coincide exactamente
+    en los umbrales de un intervalo [inferior, superior). Memoria O((umbrales + filas) × clases).
+    """
+    n_rows, n_classes = probabilities.shape
+    top_class = np.zeros_like(probabilities, dtype=bool)
+    top_class[np.arange(n_rows), probabilities.argmax(axis=1)] = True
+
+    def count_above(mask: np.ndarray) -> np.ndarray:
+        """(umbrales × clases): filas de `mask`, sin la clase de mayor probabilidad, que superan cada umbral"""
+        counts = np.empty((len(thresholds), n_classes), dtype=np.int64)
+        for c in range(n_classes):
+            values = np.sort(probabilities[mask[:, c] & ~top_class[:, c], c].astype(float))
+            counts[:, c] = len(values) - np.searchsorted(values, thresholds, side="right")
+        return counts
+
+    tp = (y_true & top_class).sum(axis=0) + count_above(y_true)
+    fp = (~y_true & top_class).sum(axis=0) + count_above(~y_true)
+    fn = y_true.sum(axis=0) - tp
+
+    # La fila coincide si t ≥ toda probabilidad de clase ausente y t < toda probabilidad de clase
+    # presente (sin contar la de mayor probabilidad, que siempre se predice)
+    lower = np.where(~y_true & ~top_class, probabilities, -np.inf).max(axis=1)
+    upper = np.where(y_true & ~top_class, probabilities, np.inf).min(axis=1)
+    possible = ~(top_class & ~y_true).any(axis=1) & (lower < upper)
+    exact = (np.searchsorted(np.sort(lower[possible]), thresholds, side="right")
+             - np.searchsorted(np.sort(upper[possible]), thresholds, side="right"))
+
+    precision = _safe_divide(tp, tp + fp)
+    recall = _safe_divide(tp, tp + fn)
+    f1 = _safe_divide(2 * precision * recall, precision + recall)
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "macro_f1": f1.mean(axis=1),
+        "micro_f1": _safe_divide(2 * tp.sum(axis=1), 2 * tp.sum(axis=1) + fp.sum(axis=1) + fn.sum(axis=1)),
+        "hamming_loss": (fp + fn).sum(axis=1) / (n_rows * n_classes),
+        "exact_match_ratio": exact / n_rows,
+    }
+
+class ThresholdSweepService:
+    """Guarda las probabilidades de cada trabajo batch y barre umbrales sin volver a ejecutar el modelo"""
+
+    @staticmethod
+    def new_job_id() -> str:
+        return uuid.uuid4().hex[:12]
+
+    def save_job(self, probabilities: np.ndarray, y_true: np.ndarray, labels: List[str],
+                 threshold: float, model_version: Optional[str], job_id: Optional[str] = None) -> Optional[str]:
+        """Guarda la matriz de probabilidades y las etiquetas reales; retorna el job_id"""
+        job_id = job_id or self.new_job_id()
+        try:
+            np.savez_compressed(
+                self._job_path(job_id),
+                probabilities=probabilities.astype(np.float32),
+                y_true=y_true.astype(bool),
+                labels=np.array(labels),
+                threshold=np.float32(threshold),
+                model_version=np.array(model_version or "unknown")
+            )
+        except Exception as e:
+            logger.warning(f"Error guardando probabilidades del trabajo {job_id}: {str(e)}")
+            return None
+        self._prune_jobs()
+        return job_id
+
+    def _prune_jobs(self):
+        """Borra los trabajos más viejos que THRESHOLD_JOBS_TTL_HOURS y los que excedan THRESHOLD_JOBS_MAX"""
+        try:
+            jobs = sorted(config.get_temp_dir("jobs").glob("*.npz"), key=lambda path: path.stat().st_mtime, reverse=True)
+            expires = time.time() - config.THRESHOLD_JOBS_TTL_HOURS * 3600
+            for index, path in enumerate(jobs):
+                if index >= config.THRESHOLD_JOBS_MAX or path.stat().st_mtime < expires:
+                    path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Error limpiando trabajos guardados: {str(e)}")
+
+    def _job_path(self, job_id: str):
+        if not _JOB_ID_PATTERN.match(job_id):
+            raise LookupError(f"Trabajo no encontrado: {job_id}")
+        return config.get_temp_dir("jobs") / f"{job_id}.npz"
+
+    def sweep(self, job_id: str, thresholds: np.ndarray, top_k: int = 5) -> Dict[str, Any]:
+        """Métricas para una grilla de umbrales globales y el mejor umbral por categoría"""
+        path = self._job_path(job_id)
+        if not path.exists():
+            raise LookupError(f"Trabajo no encontrado: {job_id}")
+
+        with np.load(path) as job:
+            probabilities = job["probabilities"]
+            y_true = job["y_true"]
+            labels = job["labels"].tolist()
+            job_threshold = float(job["threshold"])
+            model_version = str(job["model_version"])
+
+        # Solo filas etiquetadas y predichas sin error
+        valid = y_true.any(axis=1) & ~np.isnan(probabilities).any(axis=1)
+        if not valid.any():
+            raise ValueError("El trabajo no tiene filas etiquetadas para evaluar")
+        probabilities, y_true = probabilities[valid], y_true[valid]
+
+        if len(thresholds) * len(probabilities) > config.THRESHOLD_SWEEP_MAX_CELLS:
+            raise ValueError(
+                f"La grilla de {len(thresholds)} umbrales sobre {len(probabilities)} filas supera el límite "
+                f"de {config.THRESHOLD_SWEEP_MAX_CELLS} combinaciones; use un paso mayor"
+            )
+
+        # Umbrales globales: toda la grilla desde las probabilidades ordenadas de cada clase
+        metrics = sweep_global_thresholds(probabilities, y_true, thresholds)
+        grid = [
+            {
+                "threshold": round(float(t), 4),
+                "macro_f1": round(float(metrics["macro_f1"][i]), 4),
+                "micro_f1": round(float(metrics["micro_f1"][i]), 4),
+                "hamming_loss": round(float(metrics["hamming_loss"][i]), 4),
+                "exact_match_ratio": round(float(metrics["exact_match_ratio"][i]), 4),
+                "category_metrics": {
+                    label: {
+                        "precision": round(float(metrics["precision"][i, c]), 4),
+                        "recall": round(float(metrics["recall"][i, c]), 4),
+                        "f1_score": round(float(metrics["f1"][i, c]), 4)
+                    }
+                    for c, label in enumerate(labels)
+                }
+            }
+            for i, t in enumerate(thresholds)
+        ]
+
+        # Umbral por categoría: el F1 de cada categoría en la grilla global es independiente
+        # de las demás (salvo el respaldo argmax), así que se elige el mejor por columna
+        best_per_category = thresholds[metrics["f1"].argmax(axis=0)]
+        combined = evaluate_predictions(apply_thresholds(probabilities, best_per_category[None, :]), y_true)
+
+        ranking = np.lexsort((metrics["hamming_loss"], -metrics["macro_f1"]))
+        return {
+            "job_id": job_id,
+            "model_version": model_version,
+            "job_threshold": round(job_threshold, 4),
+            "evaluated_samples": int(valid.sum()),
+            "labels": labels,
+            "grid": grid,
+            "best_global": [grid[i] for i in ranking[:top_k]],
+            "best_per_category": {
+                "thresholds": {label: round(float(t), 4) for label, t in zip(labels, best_per_category)},
+                "macro_f1": round(float(combined["macro_f1"][0]), 4),
+                "micro_f1": round(float(combined["micro_f1"][0]), 4),
+                "hamming_loss": round(float(combined["hamming_loss"][0]), 4),
+                "exact_match_ratio": round(float(combined["exact_match_ratio"][0]), 4),
+                "category_metrics": {
+                    label: {
+                        "precision": round(float(combined["precision"][0, c]), 4),
+                        "recall": round(float(combined["recall"][0, c]), 4),
+                        "f1_score": round(float(combined["f1"][0, c]), 4)
+                    }
+                    for c, label in enumerate(labels)
+                }
+            }
+        }
+
+# Instancia global del servicio
+threshold_service = ThresholdSweepService()
@@ -0,0 +1,3 @@
+"""
+Benchmarks de rendimiento de TechSphere ML API
+"""
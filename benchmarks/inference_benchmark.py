@@ -0,0 +1,286 @@
+"""
+Benchmark de inferencia y batch con un modelo BERT mínimo construido localmente
+
+Uso:
+    python -m benchmarks.inference_benchmark
+    python -m benchmarks.inference_benchmark --sizes 1000,10000 --output results.json
+    python -m benchmarks.inference_benchmark --baseline results.json --tolerance 0.2
+
+Mide:
+- Latencia de MLModelService.predict (p50/p95/p99)
+- Throughput de MLModelService.predict_batch sobre CSVs sintéticos
+- Pico de memoria residente por fase
+- Latencia HTTP de extremo a extremo contra la app FastAPI servida con uvicorn
+
+No descarga nada: el modelo tiene pesos aleatorios y se guarda en un directorio
+temporal que se expone a la API mediante TECHSPHERE_MODEL_PATH; los artefactos de
+los trabajos batch (CSVs, agregados, probabilidades) van a TECHSPHERE_TEMP_DIR dentro
+del mismo directorio, sin tocar los datos reales de temp/. Con --baseline
+el proceso termina con código 1 si alguna métrica empeora más que la tolerancia.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from .tiny_model import build_tiny_model, write_synthetic_csv, sample_texts
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano"""
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[min(len(ordered), max(rank, 1)) - 1]
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """Resumen de latencias en milisegundos"""
+    ms = [value * 1000 for value in seconds]
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.mean(ms), 3),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3),
+    }
+
+class PeakMemorySampler:
+    """Muestrea la memoria residente en segundo plano para obtener el pico de una fase"""
+
+    def __init__(self, interval: float = 0.01):
+        from api.core.metrics import get_process_rss_bytes
+        self._read_rss = get_process_rss_bytes
+        self.interval = interval
+        self.start_rss = 0.0
+        self.peak_rss = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self._read_rss())
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = self._read_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self._read_rss())
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "peak_rss_mb": round(self.peak_rss / 2**20, 1),
+            "peak_delta_mb": round((self.peak_rss - self.start_rss) / 2**20, 1),
+        }
+
+def bench_predict(ml_service, iterations: int, warmup: int) -> Dict[str, Any]:
+    """Latencia de predicciones individuales"""
+    texts = sample_texts(iterations + warmup, seed=1)
+    for text in texts[:warmup]:
+        ml_service.predict(text)
+
+    latencies = []
+    with PeakMemorySampler() as memory:
+        for text in texts[warmup:]:
+            start = time.perf_counter()
+            ml_service.predict(text)
+            latencies.append(time.perf_counter() - start)
+
+    return {**latency_summary(latencies), **memory.summary()}
+
+def bench_predict_batch(ml_service, sizes: List[int], workdir: Path) -> List[Dict[str, Any]]:
+    """Throughput de predict_batch sobre CSVs sintéticos"""
+    import pandas as pd
+
+    results = []
+    for rows in sizes:
+        csv_path = write_synthetic_csv(workdir / f"synthetic_{rows}.csv", rows, seed=rows)
+
+        with PeakMemorySampler() as memory:
+            start = time.perf_counter()
+            df = pd.read_csv(csv_path)
+            parse_seconds = time.perf_counter() - start
+            result = ml_service.predict_batch(df, threshold=0.5)
+            total_seconds = time.perf_counter() - start
+
+        Path(result["output_file"]).unlink(missing_ok=True)
+        results.append({
+            "rows": rows,
+            "parse_seconds": round(parse_seconds, 3),
+            "total_seconds": round(total_seconds, 3),
+            "rows_per_second": round(rows / total_seconds, 1),
+            **memory.summary(),
+        })
+        print(f"   {rows:>7} filas: {results[-1]['rows_per_second']:>9.1f} filas/s "
+              f"(pico RSS {results[-1]['peak_rss_mb']} MB)")
+    return results
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@contextmanager
+def running_server() -> Iterator[str]:
+    """Sirve la app con uvicorn en un hilo y retorna la URL base"""
+    import uvicorn
+    from api.main import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+def bench_http(iterations: int, warmup: int) -> Dict[str, Any]:
+    """Latencia HTTP de extremo a extremo para /ml/predict"""
+    import httpx
+    from api.core.config import config
+
+    texts = sample_texts(iterations + warmup, seed=2, max_words=120)
+    latencies = []
+    with running_server() as base_url, httpx.Client(base_url=base_url, timeout=30) as client:
+        url = f"{config.API_PREFIX}/ml/predict"
+        for text in texts[:warmup]:
+            client.post(url, json={"text": text}).raise_for_status()
+        for text in texts[warmup:]:
+            start = time.perf_counter()
+            client.post(url, json={"text": text}).raise_for_status()
+            latencies.append(time.perf_counter() - start)
+    return latency_summary(latencies)
+
+def comparable_metrics(results: Dict[str, Any]) -> Dict[str, tuple]:
+    """Métricas comparables contra la línea base: nombre → (valor, True si mayor es mejor)"""
+    metrics = {
+        "predict.p50_ms": (results["predict"]["p50_ms"], False),
+        "predict.p95_ms": (results["predict"]["p95_ms"], False),
+        "http.p50_ms": (results["http"]["p50_ms"], False),
+        "http.p95_ms": (results["http"]["p95_ms"], False),
+    }
+    for batch in results["predict_batch"]:
+        metrics[f"predict_batch.{batch['rows']}.rows_per_second"] = (batch["rows_per_second"], True)
+        metrics[f"predict_batch.{batch['rows']}.peak_delta_mb"] = (batch["peak_delta_mb"], False)
+    return metrics
+
+def compare_with_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Retorna las métricas que empeoran más que la tolerancia relativa"""
+    regressions = []
+    current = comparable_metrics(results)
+    previous = comparable_metrics(baseline)
+    for name, (value, higher_is_better) in current.items():
+        if name not in previous or not previous[name][0]:
+            continue
+        base = previous[name][0]
+        change = (value - base) / abs(base)
+        worse = -change if higher_is_better else change
+        if worse > tolerance:
+            regressions.append(f"{name}: {base} → {value} ({change:+.1%})")
+    return regressions
+
+def parse_arguments():
+    """Parsea los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Benchmark de inferencia de TechSphere ML API")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Filas de los CSVs sintéticos")
+    parser.add_argument("--iterations", type=int, default=200, help="Predicciones medidas por fase")
+    parser.add_argument("--warmup", type=int, default=20, help="Predicciones de calentamiento")
+    parser.add_argument("--hidden-size", type=int, default=64, help="Tamaño oculto del modelo mínimo")
+    parser.add_argument("--layers", type=int, default=2, help="Capas del modelo mínimo")
+    parser.add_argument("--output", type=str, help="Archivo JSON de resultados")
+    parser.add_argument("--baseline", type=str, help="JSON de una ejecución anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento relativo tolerado (default: 0.2)")
+    return parser.parse_args()
+
+def main() -> int:
+    args = parse_arguments()
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    with tempfile.TemporaryDirectory(prefix="techsphere-bench-") as tmp:
+        workdir = Path(tmp)
+        print("🧱 Construyendo modelo BERT mínimo (sin descargas)...")
+        model_dir = build_tiny_model(workdir / "model", hidden_size=args.hidden_size, num_layers=args.layers)
+
+        # La configuración se lee al importar la API: fijar el modelo y el directorio de
+        # artefactos antes de importarla (las etiquetas sintéticas no deben llegar a analytics)
+        os.environ["TECHSPHERE_MODEL_PATH"] = str(model_dir)
+        os.environ["TECHSPHERE_TEMP_DIR"] = str(workdir / "temp")
+        logging.basicConfig(level=logging.WARNING)
+        logging.getLogger("api").setLevel(logging.WARNING)
+
+        import torch
+        from api.core.config import config
+        from api.services.ml_service import ml_service
+
+        ml_service.load_model()
+
+        print("⏱️  Latencia de predict...")
+        predict = bench_predict(ml_service, args.iterations, args.warmup)
+        print(f"   p50 {predict['p50_ms']} ms · p95 {predict['p95_ms']} ms · p99 {predict['p99_ms']} ms")
+
+        print("📦 Throughput de predict_batch...")
+        batch = bench_predict_batch(ml_service, sizes, workdir)
+
+        print("🌐 Latencia HTTP de extremo a extremo...")
+        http = bench_http(args.iterations, args.warmup)
+        print(f"   p50 {http['p50_ms']} ms · p95 {http['p95_ms']} ms · p99 {http['p99_ms']} ms")
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "app_version": config.APP_VERSION,
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu_count": config.get_cpu_count(),
+            "torch_threads": torch.get_num_threads(),
+            "model": {"hidden_size": args.hidden_size, "layers": args.layers},
+        },
+        "predict": predict,
+        "predict_batch": batch,
+        "http": http,
+    }
+
+    # Los resultados sí van al temp/ del proyecto: TECHSPHERE_TEMP_DIR se borra al terminar
+    results_dir = config.BASE_DIR / "temp" / "benchmarks"
+    results_dir.mkdir(parents=True, exist_ok=True)
+    output = Path(args.output) if args.output else (
+        results_dir / f"inference_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Resultados guardados en {output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ Regresiones respecto a {args.baseline} (tolerancia {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"   {regression}")
+            return 1
+        print(f"\n✅ Sin regresiones respecto a {args.baseline}")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""
+Generador de carga asíncrono y reproducción de tráfico capturado
+
+Uso:
+    # Lazo cerrado: 16 clientes concurrentes durante 60 s con carga mixta
+    python -m benchmarks.load_generator --concurrency 16 --duration 60 \\
+        --mix predict=0.8,predict-bulk=0.05,analytics=0.15
+
+    # Lazo abierto: 50 requests por segundo independientemente de la latencia
+    python -m benchmarks.load_generator --rps 50 --duration 60
+
+    # Reproducir tráfico capturado (JSONL) al doble de velocidad
+    python -m benchmarks.load_generator --replay temp/capture/requests.jsonl --speed 2
+
+Reporta por tipo de carga y en total: throughput, tasa de error, códigos de estado
+y latencias p50/p95/p99. Con --output guarda el reporte en JSON.
+
+Formato de replay (una línea JSON por request):
+- Registros de captura de /ml/predict: {"timestamp", "text" o "text_length", "threshold", ...}
+- Requests genéricos: {"method": "GET", "path": "/analytics/class-distribution", "json": {...}}
+Si los registros tienen "timestamp" se respeta el espaciado original (dividido por --speed).
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .inference_benchmark import latency_summary
+from .tiny_model import synthetic_text, synthetic_group
+
+ANALYTICS_ENDPOINTS = [
+    "/analytics/confusion-matrix",
+    "/analytics/class-distribution",
+    "/analytics/feature-importance",
+    "/analytics/performance-over-time",
+    "/analytics/category-correlations",
+    "/ml/metrics",
+]
+
+class RequestSpec:
+    """Request a enviar: tipo de carga, método, ruta y cuerpo"""
+
+    def __init__(self, workload: str, method: str, path: str, json_body: Optional[Dict[str, Any]] = None,
+                 files: Optional[Dict[str, Any]] = None, data: Optional[Dict[str, Any]] = None):
+        self.workload = workload
+        self.method = method
+        self.path = path
+        self.json_body = json_body
+        self.files = files
+        self.data = data
+
+class LoadStats:
+    """Acumula resultados por tipo de carga"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.errors: Counter = Counter()
+
+    def record(self, workload: str, status: str, seconds: float, ok: bool):
+        self.latencies[workload].append(seconds)
+        self.statuses[workload][status] += 1
+        if not ok:
+            self.errors[workload] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        workloads = {}
+        all_latencies: List[float] = []
+        all_statuses: Counter = Counter()
+        for workload, latencies in self.latencies.items():
+            all_latencies.extend(latencies)
+            all_statuses.update(self.statuses[workload])
+            workloads[workload] = self._summary(latencies, self.errors[workload], self.statuses[workload], elapsed)
+        return {
+            "elapsed_seconds": round(elapsed, 2),
+            "total": self._summary(all_latencies, sum(self.errors.values()), all_statuses, elapsed),
+            "workloads": workloads,
+        }
+
+    @staticmethod
+    def _summary(latencies: List[float], errors: int, statuses: Counter, elapsed: float) -> Dict[str, Any]:
+        if not latencies:
+            return {"count": 0}
+        return {
+            **latency_summary(latencies),
+            "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+            "errors": errors,
+            "error_rate": round(errors / len(latencies), 4),
+            "statuses": dict(statuses),
+        }
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parsea 'predict=0.8,analytics=0.2' en pesos normalizados"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("predict", "predict-bulk", "analytics"):
+            raise ValueError(f"Tipo de carga desconocido: {name}")
+        weights[name] = float(weight or 1.0)
+    total = sum(weights.values())
+    return {name: weight / total for name, weight in weights.items()}
+
+def build_bulk_csv(rng: random.Random, rows: int) -> bytes:
+    """CSV en memoria para predict-batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["title", "abstract", "group"])
+    for _ in range(rows):
+        writer.writerow([synthetic_text(rng, 5, 15), synthetic_text(rng), synthetic_group(rng)])
+    return buffer.getvalue().encode("utf-8")
+
+class SyntheticWorkload:
+    """Genera requests sintéticos según la mezcla configurada"""
+
+    def __init__(self, mix: Dict[str, float], bulk_rows: int, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.names = list(mix.keys())
+        self.weights = list(mix.values())
+        # El CSV de carga bulk se genera una vez: el costo de construirlo no debe medirse
+        self.bulk_csv = build_bulk_csv(self.rng, bulk_rows) if "predict-bulk" in mix else b""
+
+    def next(self) -> RequestSpec:
+        workload = self.rng.choices(self.names, self.weights)[0]
+        if workload == "predict":
+            return RequestSpec(workload, "POST", "/ml/predict", json_body={
+                "text": synthetic_text(self.rng, max_words=200)[:5000],
+                "threshold": 0.5,
+            })
+        if workload == "predict-bulk":
+            return RequestSpec(
+                workload, "POST", "/ml/predict-batch",
+                files={"file": ("load.csv", self.bulk_csv, "text/csv")},
+                data={"threshold": "0.5"},
+            )
+        return RequestSpec(workload, "GET", self.rng.choice(ANALYTICS_ENDPOINTS))
+
+def _parse_timestamp(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+def load_replay(path: str, seed: int = 0) -> List[tuple]:
+    """Carga un JSONL de tráfico y retorna [(offset_segundos, RequestSpec)]"""
+    rng = random.Random(seed)
+    entries = []
+    first_ts = None
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"⚠️  Línea {line_number} inválida en {path}, se omite")
+                continue
+
+            if "path" in record:
+                spec = RequestSpec("replay", record.get("method", "GET").upper(), record["path"],
+                                   json_body=record.get("json"))
+            else:
+                # Registro de captura de /ml/predict: sin texto se usa uno sintético de igual longitud
+                text = record.get("text")
+                if not text:
+                    length = int(record.get("text_length", 1000))
+                    text = synthetic_text(rng, max_words=400)
+                    while len(text) < length:
+                        text += " " + synthetic_text(rng)
+                    text = text[:max(length, 10)]
+                spec = RequestSpec("predict", "POST", "/ml/predict", json_body={
+                    "text": text,
+                    "threshold": record.get("threshold", 0.5),
+                })
+
+            ts = _parse_timestamp(record.get("timestamp"))
+            if ts is not None and first_ts is None:
+                first_ts = ts
+            offset = ts - first_ts if ts is not None and first_ts is not None else None
+            entries.append((offset, spec))
+    return entries
+
+class LoadGenerator:
+    """Envía requests con httpx.AsyncClient y registra los resultados"""
+
+    def __init__(self, base_url: str, timeout: float, max_inflight: int):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.stats = LoadStats()
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self._tasks: set = set()
+
+    async def send(self, client, spec: RequestSpec):
+        start = time.perf_counter()
+        try:
+            response = await client.request(
+                spec.method, spec.path, json=spec.json_body, files=spec.files, data=spec.data
+            )
+            status = str(response.status_code)
+            ok = response.status_code < 400
+        except Exception as e:
+            status = type(e).__name__
+            ok = False
+        self.stats.record(spec.workload, status, time.perf_counter() - start, ok)
+
+    async def _fire(self, client, spec: RequestSpec):
+        # Lazo abierto con tope de requests en vuelo para no agotar la memoria del cliente
+        await self._inflight.acquire()
+
+        async def run():
+            try:
+                await self.send(client, spec)
+            finally:
+                self._inflight.release()
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run_closed_loop(self, client, workload: SyntheticWorkload, concurrency: int, duration: float):
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                await self.send(client, workload.next())
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def run_open_loop(self, client, workload: SyntheticWorkload, rps: float, duration: float):
+        start = next_at = time.perf_counter()
+        while next_at - start < duration:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            await self._fire(client, workload.next())
+            # Llegadas de Poisson con tasa rps
+            next_at += workload.rng.expovariate(rps)
+        await asyncio.gather(*self._tasks)
+
+    async def run_replay(self, client, entries: List[tuple], speed: float, rps: Optional[float]):
+        start = time.perf_counter()
+        for index, (offset, spec) in enumerate(entries):
+            if offset is not None:
+                target = start + offset / speed
+            elif rps:
+                target = start + index / rps
+            else:
+                target = time.perf_counter()
+            await asyncio.sleep(max(0.0, target - time.perf_counter()))
+            await self._fire(client, spec)
+        await asyncio.gather(*self._tasks)
+
+    async def run(self, args) -> Dict[str, Any]:
+        import httpx
+
+        limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+            start = time.perf_counter()
+            if args.replay:
+                entries = load_replay(args.replay, args.seed)
+                print(f"🔁 Reproduciendo {len(entries)} requests de {args.replay}")
+                await self.run_replay(client, entries, args.speed, args.rps)
+            else:
+                workload = SyntheticWorkload(parse_mix(args.mix), args.bulk_rows, args.seed)
+                if args.rps:
+                    print(f"📈 Lazo abierto: {args.rps} req/s durante {args.duration}s")
+                    await self.run_open_loop(client, workload, args.rps, args.duration)
+                else:
+                    print(f"🔄 Lazo cerrado: {args.concurrency} clientes durante {args.duration}s")
+                    await self.run_closed_loop(client, workload, args.concurrency, args.duration)
+            elapsed = time.perf_counter() - start
+        return self.stats.report(elapsed)
+
+def print_report(report: Dict[str, Any]):
+    """Imprime el reporte en formato tabla"""
+    print(f"\n📊 Resultados ({report['elapsed_seconds']}s)")
+    rows = [("total", report["total"])] + sorted(report["workloads"].items())
+    print(f"   {'carga':<14}{'reqs':>8}{'req/s':>9}{'error':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, summary in rows:
+        if not summary.get("count"):
+            continue
+        print(f"   {name:<14}{summary['count']:>8}{summary['throughput_rps']:>9}"
+              f"{summary['error_rate']:>8.1%}{summary['p50_ms']:>10}{summary['p95_ms']:>10}{summary['p99_ms']:>10}")
+    print(f"   códigos: {report['total'].get('statuses', {})}")
+
+def parse_arguments():
+    """Parsea los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Generador de carga de TechSphere ML API")
+    parser.add_argument("--url", default="http://localhost:8000/api/v1", help="URL base de la API")
+    parser.add_argument("--duration", type=float, default=30.0, help="Duración en segundos (carga sintética)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clientes concurrentes (lazo cerrado)")
+    parser.add_argument("--rps", type=float, help="Tasa objetivo en req/s (lazo abierto)")
+    parser.add_argument("--mix", default="predict=0.8,predict-bulk=0.05,analytics=0.15",
+                        help="Mezcla de cargas: predict, predict-bulk y analytics con sus pesos")
+    parser.add_argument("--bulk-rows", type=int, default=50, help="Filas del CSV de predict-bulk")
+    parser.add_argument("--replay", type=str, help="Archivo JSONL con tráfico a reproducir")
+    parser.add_argument("--speed", type=float, default=1.0, help="Factor de velocidad del replay")
+    parser.add_argument("--max-inflight", type=int, default=256, help="Máximo de requests en vuelo")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout por request en segundos")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de la carga sintética")
+    parser.add_argument("--output", type=str, help="Guardar el reporte en JSON")
+    return parser.parse_args()
+
+def main() -> int:
+    args = parse_arguments()
+    generator = LoadGenerator(args.url, args.timeout, args.max_inflight)
+    report = asyncio.run(generator.run(args))
+    report["config"] = {key: value for key, value in vars(args).items() if key != "output"}
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Reporte guardado en {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
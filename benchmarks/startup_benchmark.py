@@ -0,0 +1,156 @@
+"""
+Benchmark de arranque: desglose del tiempo de importación y presupuesto de arranque
+
+Uso:
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --module api.services.analytics_service --budget 1.0
+    python -m benchmarks.startup_benchmark --with-model --output startup.json
+
+Cada medición se ejecuta en un intérprete nuevo (`python -X importtime`) para no
+reutilizar módulos ya importados. El proceso termina con código 1 si la mediana
+del tiempo de arranque supera el presupuesto.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Any
+
+from api.core.config import config
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Código ejecutado en el subproceso: importa el módulo (y opcionalmente carga el modelo)
+# e imprime los tiempos medidos como JSON en la última línea de stdout
+MEASURE_SNIPPET = """
+import importlib, json, time
+t0 = time.perf_counter()
+importlib.import_module({module!r})
+t1 = time.perf_counter()
+model_seconds = None
+if {with_model!r}:
+    from api.services.ml_service import ml_service
+    ml_service.load_model()
+    model_seconds = time.perf_counter() - t1
+print(json.dumps({{"import_seconds": t1 - t0, "model_seconds": model_seconds}}))
+"""
+
+def parse_importtime(stderr: str) -> Dict[str, Dict[str, float]]:
+    """Agrega la salida de -X importtime por paquete de primer nivel
+
+    Se suma el tiempo "self" (exclusivo de cada módulo), por lo que el desglose es
+    aditivo y no cuenta dos veces las dependencias anidadas.
+    """
+    packages: Dict[str, Dict[str, float]] = defaultdict(lambda: {"self_seconds": 0.0, "modules": 0})
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].strip())
+        except ValueError:
+            continue
+        package = parts[2].strip().split(".")[0]
+        packages[package]["self_seconds"] += self_us / 1e6
+        packages[package]["modules"] += 1
+    return dict(packages)
+
+def measure_once(module: str, with_model: bool) -> Dict[str, Any]:
+    """Mide un arranque en un intérprete nuevo"""
+    snippet = MEASURE_SNIPPET.format(module=module, with_model=with_model)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", snippet],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Error importando {module}:\n{result.stderr[-2000:]}")
+
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["packages"] = parse_importtime(result.stderr)
+    return timings
+
+def run_benchmark(module: str, repeats: int, with_model: bool, top: int) -> Dict[str, Any]:
+    """Ejecuta varias mediciones y resume la mediana y el desglose por paquete"""
+    runs = [measure_once(module, with_model) for _ in range(repeats)]
+
+    import_times = [run["import_seconds"] for run in runs]
+    model_times = [run["model_seconds"] for run in runs if run["model_seconds"] is not None]
+    startup_times = [
+        run["import_seconds"] + (run["model_seconds"] or 0.0) for run in runs
+    ]
+
+    # Desglose: mediana por paquete entre ejecuciones
+    package_names = set().union(*(run["packages"].keys() for run in runs))
+    breakdown: List[Dict[str, Any]] = []
+    for name in package_names:
+        seconds = [run["packages"].get(name, {}).get("self_seconds", 0.0) for run in runs]
+        modules = max(run["packages"].get(name, {}).get("modules", 0) for run in runs)
+        breakdown.append({
+            "package": name,
+            "self_seconds": round(statistics.median(seconds), 4),
+            "modules": modules
+        })
+    breakdown.sort(key=lambda item: item["self_seconds"], reverse=True)
+
+    return {
+        "module": module,
+        "repeats": repeats,
+        "with_model": with_model,
+        "import_seconds": round(statistics.median(import_times), 4),
+        "model_seconds": round(statistics.median(model_times), 4) if model_times else None,
+        "startup_seconds": round(statistics.median(startup_times), 4),
+        "breakdown": breakdown[:top]
+    }
+
+def parse_arguments():
+    """Parsea los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Benchmark de arranque de TechSphere ML API")
+    parser.add_argument("--module", default="api.main", help="Módulo a importar (default: api.main)")
+    parser.add_argument("--repeats", type=int, default=3, help="Número de mediciones (default: 3)")
+    parser.add_argument("--with-model", action="store_true", help="Incluir la carga del modelo")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=config.STARTUP_BUDGET_SECONDS,
+        help=f"Presupuesto de arranque en segundos (default: {config.STARTUP_BUDGET_SECONDS})"
+    )
+    parser.add_argument("--top", type=int, default=15, help="Paquetes a mostrar en el desglose")
+    parser.add_argument("--output", type=str, help="Guardar resultados en JSON")
+    return parser.parse_args()
+
+def main() -> int:
+    args = parse_arguments()
+
+    result = run_benchmark(args.module, args.repeats, args.with_model, args.top)
+    result["budget_seconds"] = args.budget
+    result["within_budget"] = result["startup_seconds"] <= args.budget
+
+    print(f"⏱️  Arranque de {args.module} (mediana de {args.repeats}): {result['startup_seconds']:.3f}s")
+    print(f"   Importación: {result['import_seconds']:.3f}s")
+    if result["model_seconds"] is not None:
+        print(f"   Carga del modelo: {result['model_seconds']:.3f}s")
+    print("\n📦 Desglose por paquete (tiempo propio):")
+    for item in result["breakdown"]:
+        print(f"   {item['package']:<28} {item['self_seconds']:>8.3f}s  ({item['modules']} módulos)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n💾 Resultados guardados en {args.output}")
+
+    if not result["within_budget"]:
+        print(f"\n❌ Presupuesto excedido: {result['startup_seconds']:.3f}s > {args.budget:.3f}s")
+        return 1
+
+    print(f"\n✅ Dentro del presupuesto ({args.budget:.3f}s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Modelo BERT mínimo y datos sintéticos para benchmarks sin descargas
+
+El modelo tiene la misma interfaz que scibert_classifier (tokenizer rápido,
+AutoModelForSequenceClassification multilabel y label_encoder.json con las
+cuatro categorías) pero pesos aleatorios y un vocabulario pequeño, de modo que
+los benchmarks miden el código de la API y no la calidad del modelo.
+"""
+import json
+import random
+from pathlib import Path
+from typing import List, Optional
+
+# Mismas clases y orden que el label_encoder.json del modelo entrenado
+LABELS = ["cardiovascular", "hepatorenal", "neurological", "oncological"]
+
+WORDS = [
+    "patients", "study", "clinical", "trial", "randomized", "disease", "treatment", "outcome",
+    "heart", "cardiac", "coronary", "artery", "myocardial", "ischemia", "hypertension", "stroke",
+    "brain", "neural", "cognitive", "seizure", "epilepsy", "dementia", "neuron", "cortex",
+    "tumor", "cancer", "carcinoma", "metastasis", "chemotherapy", "oncology", "lymphoma", "biopsy",
+    "liver", "kidney", "renal", "hepatic", "cirrhosis", "dialysis", "nephropathy", "fibrosis",
+    "the", "of", "and", "in", "with", "was", "were", "for", "by", "on", "to", "a", "results",
+    "methods", "significant", "increased", "reduced", "risk", "analysis", "cohort", "effect",
+]
+
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+
+def build_tiny_model(output_dir: Path, hidden_size: int = 64, num_layers: int = 2, seed: int = 0) -> Path:
+    """Construye y guarda un clasificador BERT multilabel con pesos aleatorios"""
+    import torch
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Vocabulario WordPiece: palabras completas + caracteres como subpalabras de respaldo
+    letters = "abcdefghijklmnopqrstuvwxyz0123456789"
+    vocab = SPECIAL_TOKENS + WORDS + list(letters) + [f"##{c}" for c in letters] + list(".,;:-()")
+    vocab_file = output_dir / "vocab.txt"
+    vocab_file.write_text("\n".join(vocab))
+
+    tokenizer = BertTokenizerFast(vocab_file=str(vocab_file), do_lower_case=True)
+
+    torch.manual_seed(seed)
+    model_config = BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=hidden_size,
+        num_hidden_layers=num_layers,
+        num_attention_heads=max(1, hidden_size // 32),
+        intermediate_size=hidden_size * 2,
+        max_position_embeddings=512,
+        num_labels=len(LABELS),
+        problem_type="multi_label_classification",
+        id2label=dict(enumerate(LABELS)),
+        label2id={label: i for i, label in enumerate(LABELS)},
+    )
+    model = BertForSequenceClassification(model_config)
+    model.eval()
+
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    with open(output_dir / "label_encoder.json", "w") as f:
+        json.dump(LABELS, f)
+
+    return output_dir
+
+def synthetic_text(rng: random.Random, min_words: int = 40, max_words: int = 250) -> str:
+    """Genera un texto tipo título + abstract"""
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+def synthetic_group(rng: random.Random) -> str:
+    """Genera una combinación multilabel (1 a 3 categorías)"""
+    return "|".join(sorted(rng.sample(LABELS, rng.choice([1, 1, 1, 2, 2, 3]))))
+
+def write_synthetic_csv(path: Path, rows: int, seed: int = 0) -> Path:
+    """Escribe un CSV con columnas title, abstract y group"""
+    import csv
+
+    rng = random.Random(seed)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["title", "abstract", "group"])
+        for _ in range(rows):
+            writer.writerow([synthetic_text(rng, 5, 15), synthetic_text(rng), synthetic_group(rng)])
+    return Path(path)
+
+def sample_texts(count: int, seed: int = 0, max_words: Optional[int] = None) -> List[str]:
+    """Genera textos para predicciones individuales"""
+    rng = random.Random(seed)
+    return [synthetic_text(rng, max_words=max_words or 250) for _ in range(count)]
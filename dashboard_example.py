@@ -14,21 +14,34 @@ class TechSphereDashboard:
     def __init__(self, base_url: str = "http://localhost:8000/api/v1"):
         self.base_url = base_url
         self.session = requests.Session()
+        self._panels: Dict[str, Any] = {}
         
         # Configurar estilo de las gráficas
         plt.style.use('seaborn-v0_8')
         sns.set_palette("husl")
     
-    def _get_data(self, endpoint: str) -> Dict[str, Any]:
+    def _get_data(self, endpoint: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
         """Obtener datos de un endpoint"""
-        response = self.session.get(f"{self.base_url}{endpoint}")
+        response = self.session.get(f"{self.base_url}{endpoint}", params=params)
         response.raise_for_status()
         return response.json()
     
+    def load_panels(self, *fields: str) -> Dict[str, Any]:
+        """Obtener varios paneles (o todos) en un solo request a /analytics/dashboard"""
+        params = {"fields": ",".join(fields)} if fields else None
+        self._panels.update(self._get_data("/analytics/dashboard", params))
+        return self._panels
+    
+    def _get_panel(self, name: str) -> Dict[str, Any]:
+        """Obtener un panel del dashboard (usa los ya cargados con load_panels)"""
+        if name not in self._panels:
+            self.load_panels(name)
+        return self._panels[name]
+    
     def create_metrics_dashboard(self) -> None:
         """Crear dashboard principal con métricas"""
         # Obtener datos
-        metrics = self._get_data("/ml/metrics")
+        metrics = self._get_panel("metrics")
         
         # Crear figura con subplots
         fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 10))
@@ -56,7 +69,7 @@ class TechSphereDashboard:
                     f'{value:.3f}', ha='center', va='bottom', fontweight='bold')
         
         # 2. Distribución de clases
-        distribution = self._get_data("/analytics/class-distribution")
+        distribution = self._get_panel("class_distribution")
         
         # Top 8 clases para evitar saturación
         sorted_dist = sorted(distribution['distribution'].items(), 
@@ -71,7 +84,7 @@ class TechSphereDashboard:
         ax2.set_title('Distribución de Clases (Top 8)', fontweight='bold')
         
         # 3. Importancia de características
-        importance = self._get_data("/analytics/feature-importance")
+        importance = self._get_panel("feature_importance")
         top_features = importance['features'][:10]  # Top 10
         
         feature_names = [f['feature'][:20] + '...' if len(f['feature']) > 20 else f['feature'] 
@@ -92,11 +105,14 @@ class TechSphereDashboard:
                     f'{score:.3f}', ha='left', va='center', fontsize=8)
         
         # 4. Rendimiento temporal
-        performance = self._get_data("/analytics/performance-over-time")
+        performance = self._get_panel("performance_over_time")
         
-        dates = performance['dates'][-10:]  # Últimos 10 días
-        f1_scores = performance['f1_scores'][-10:]
-        accuracies = performance['accuracies'][-10:]
+        # Solo los días con evaluaciones batch (los demás vienen en null)
+        evaluated = [(d, f1, acc) for d, f1, acc in zip(performance['dates'], performance['f1_scores'], performance['accuracies'])
+                     if f1 is not None][-10:]  # Últimos 10 días
+        dates = [d for d, _, _ in evaluated]
+        f1_scores = [f1 for _, f1, _ in evaluated]
+        accuracies = [acc for _, _, acc in evaluated]
         
         x = range(len(dates))
         ax4.plot(x, f1_scores, marker='o', label='F1-Score', linewidth=2)
@@ -114,7 +130,7 @@ class TechSphereDashboard:
     
     def create_confusion_matrix_plot(self) -> None:
         """Crear visualización de matriz de confusión"""
-        confusion_data = self._get_data("/analytics/confusion-matrix")
+        confusion_data = self._get_panel("confusion_matrix")
         
         matrix = np.array(confusion_data['matrix'])
         labels = [label[:10] + '...' if len(label) > 10 else label 
@@ -143,7 +159,7 @@ class TechSphereDashboard:
     
     def create_correlation_matrix(self) -> None:
         """Crear matriz de correlación entre categorías"""
-        correlation_data = self._get_data("/analytics/category-correlations")
+        correlation_data = self._get_panel("category_correlations")
         
         matrix = np.array(correlation_data['matrix'])
         labels = correlation_data['labels']
@@ -241,6 +257,9 @@ def main():
     try:
         dashboard = TechSphereDashboard()
         
+        # Un solo round trip para todos los paneles
+        dashboard.load_panels()
+        
         print("\n1. Creando dashboard de métricas principales...")
         dashboard.create_metrics_dashboard()
         
@@ -0,0 +1,76 @@
+"""
+Configuración de Gunicorn para ejecutar TechSphere API en producción
+
+Uso directo:
+    gunicorn -c gunicorn_conf.py api.main:app
+
+o a través del script:
+    python run_api.py --production --workers 4
+"""
+import gc
+import os
+
+from api.core.config import config as app_config
+
+# Servidor
+bind = os.getenv("TECHSPHERE_BIND", "0.0.0.0:8000")
+workers = app_config.get_worker_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Cargar la aplicación una sola vez en el proceso padre antes del fork; el modelo se
+# carga en `on_starting`, de modo que los workers compartan sus páginas de memoria (copy-on-write)
+preload_app = True
+
+# Reciclado controlado de workers para acotar el crecimiento de memoria
+max_requests = app_config.MAX_REQUESTS
+max_requests_jitter = app_config.MAX_REQUESTS_JITTER
+graceful_timeout = app_config.GRACEFUL_TIMEOUT
+timeout = app_config.WORKER_TIMEOUT
+
+# Logging
+loglevel = "info"
+accesslog = "-"
+errorlog = "-"
+
+def on_starting(server):
+    """Carga el modelo en el proceso padre antes de crear los workers"""
+    # Importar la app no carga el modelo (el hook de startup corre en cada worker):
+    # sin esta carga cada worker tendría su propia copia. Es idempotente, así que el
+    # hook de startup de los workers no lo vuelve a cargar
+    from api.services.ml_service import ml_service
+    ml_service.load_model()
+    server.log.info("Modelo precargado en el proceso padre")
+
+def pre_fork(server, worker):
+    """Asigna un puesto estable al worker y congela el heap del padre"""
+    # El puesto libre más bajo: un worker reciclado (max_requests) hereda el de su antecesor,
+    # así los archivos por worker (captura de tráfico) no crecen con cada reciclado
+    taken = {getattr(other, "slot", None) for other in server.WORKERS.values()}
+    worker.slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+    # gc.freeze mueve todos los objetos actuales a la generación permanente:
+    # el recolector de los hijos no los recorre y no rompe el copy-on-write
+    gc.collect()
+    gc.freeze()
+
+def post_fork(server, worker):
+    """Configura los hilos de torch del worker según los núcleos disponibles"""
+    threads = app_config.get_torch_threads(server.cfg.workers)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Solo puede fijarse una vez por proceso antes de usar paralelismo inter-op
+            pass
+    except ImportError:
+        pass
+    # Cada worker captura tráfico en su propio archivo (la rotación no es segura entre procesos)
+    from api.services.capture_service import capture_service
+    if capture_service.is_enabled():
+        capture_service.use_worker_file(worker.slot)
+    server.log.info(f"Worker {worker.pid} (puesto {worker.slot}) iniciado con {threads} hilos de torch")
+
+def worker_exit(server, worker):
+    """Registra el reciclado de workers"""
+    server.log.info(f"Worker {worker.pid} finalizado (reciclado o apagado)")
@@ -4,19 +4,31 @@ Script para ejecutar la API de TechSphere con soporte para Ngrok
 """
 import uvicorn
 import argparse
+import os
 import sys
 import signal
 import atexit
-from api.main import app
-from ngrok_config import setup_ngrok, cleanup_ngrok, get_ngrok_auth_token
+from api.core.config import config
+
+# La app y ngrok_config (pyngrok) se importan solo cuando se necesitan: el servidor
+# de desarrollo carga la app en su propio proceso y Ngrok es opcional
 
 # Variable global para almacenar la URL de Ngrok
 ngrok_url = None
 
+# PID del proceso principal: los workers forkeados heredan atexit y no deben cerrar Ngrok
+main_pid = os.getpid()
+
+def cleanup_ngrok_main():
+    """Cierra Ngrok solo desde el proceso principal"""
+    if ngrok_url and os.getpid() == main_pid:
+        from ngrok_config import cleanup_ngrok
+        cleanup_ngrok()
+
 def signal_handler(sig, frame):
     """Maneja las señales de interrupción para cerrar Ngrok correctamente"""
     print("\n🛑 Cerrando servidor...")
-    cleanup_ngrok()
+    cleanup_ngrok_main()
     sys.exit(0)
 
 def parse_arguments():
@@ -44,8 +56,79 @@ def parse_arguments():
         default="0.0.0.0",
         help="Host para el servidor (default: 0.0.0.0)"
     )
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        help="Modo producción: varios workers con el modelo precargado y sin recarga automática"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Número de workers en modo producción (default: núcleos / 2)"
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=None,
+        help="Requests atendidos por worker antes de reciclarlo (0 = nunca)"
+    )
     return parser.parse_args()
 
+def run_production(args):
+    """Ejecuta la API con Gunicorn + workers de Uvicorn precargando el modelo"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        # Gunicorn no está disponible (p.ej. Windows): workers de uvicorn sin precarga
+        print("⚠️  Gunicorn no está instalado: se usan workers de uvicorn sin precarga ni reciclado")
+        uvicorn.run(
+            "api.main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers or config.get_worker_count(),
+            log_level="info",
+            access_log=True
+        )
+        return
+
+    import gunicorn_conf
+
+    class TechSphereApplication(BaseApplication):
+        """Aplicación Gunicorn configurada desde gunicorn_conf.py y la línea de comandos"""
+
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if key in self.cfg.settings and value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            # El modelo se precarga en el hook on_starting de gunicorn_conf.py
+            from api.main import app
+            return app
+
+    options = {
+        key: getattr(gunicorn_conf, key)
+        for key in dir(gunicorn_conf)
+        if not key.startswith("_")
+    }
+    options["bind"] = f"{args.host}:{args.port}"
+    if args.workers:
+        options["workers"] = args.workers
+    if args.max_requests is not None:
+        options["max_requests"] = args.max_requests
+
+    workers = options["workers"]
+    print(f"🏭 Modo producción: {workers} workers, "
+          f"{config.get_torch_threads(workers)} hilos de torch por worker, "
+          f"reciclado cada {options['max_requests']} requests")
+
+    TechSphereApplication(options).run()
+
 if __name__ == "__main__":
     # Parsear argumentos
     args = parse_arguments()
@@ -53,13 +136,14 @@ if __name__ == "__main__":
     # Configurar manejo de señales
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
-    atexit.register(cleanup_ngrok)
+    atexit.register(cleanup_ngrok_main)
     
     print("🚀 Iniciando TechSphere ML API...")
     
     # Configurar Ngrok si se solicita
     if args.ngrok:
         print("🌐 Configurando Ngrok...")
+        from ngrok_config import setup_ngrok, get_ngrok_auth_token
         auth_token = args.ngrok_token or get_ngrok_auth_token()
         ngrok_url = setup_ngrok(port=args.port, auth_token=auth_token)
         
@@ -74,6 +158,10 @@ if __name__ == "__main__":
         print(f"💡 Health check en: http://localhost:{args.port}/api/v1/health")
     
     # Ejecutar el servidor
+    if args.production:
+        run_production(args)
+        sys.exit(0)
+
     uvicorn.run(
         "api.main:app",
         host=args.host,
@@ -0,0 +1,104 @@
+"""
+Helpers del scoring batch: partición por presupuesto de tokens, reducción ante falta de
+memoria, aislamiento de filas que fallan y deduplicación
+"""
+import numpy as np
+import pytest
+
+from api.core.config import config
+from api.services.ml_service import MLModelService, _TokenBudget
+
+@pytest.fixture
+def service(monkeypatch):
+    """Servicio sin modelo: el forward retorna el largo de cada fila como probabilidad"""
+    monkeypatch.setattr(config, "BATCH_RSS_CEILING_MB", 0)
+    service = MLModelService()
+    service.labels = np.array(["a", "b"])
+    service.forward_sizes = []
+
+    def forward(token_ids):
+        service.forward_sizes.append(len(token_ids))
+        return np.array([[len(ids), 0] for ids in token_ids], dtype=np.float32)
+
+    monkeypatch.setattr(service, "_pad", lambda token_ids: token_ids)
+    monkeypatch.setattr(service, "_forward", forward)
+    return service
+
+@pytest.mark.parametrize("lengths, budget, expected", [
+    ([], 100, 0),
+    ([10, 10, 10], 100, 3),
+    ([10, 10, 10], 25, 2),
+    # El largo máximo crece: 3 filas × 40 ya no caben
+    ([10, 10, 40], 100, 2),
+    # Siempre al menos una fila, aunque no quepa sola
+    ([500, 10], 100, 1),
+    ([10, 10, 10, 10], 40, 4),
+])
+def test_rows_within_budget(lengths, budget, expected):
+    assert MLModelService._rows_within_budget(lengths, budget) == expected
+
+def test_forward_respects_the_token_budget(service, monkeypatch):
+    monkeypatch.setattr(config, "BATCH_TOKEN_BUDGET", 30)
+    probabilities, errors = service._forward_with_backoff([[1] * 10] * 7)
+
+    assert errors == {}
+    assert service.forward_sizes == [3, 3, 1]
+    assert probabilities[:, 0].tolist() == [10] * 7
+
+def test_out_of_memory_shrinks_the_job_budget(service, monkeypatch):
+    monkeypatch.setattr(config, "BATCH_TOKEN_BUDGET", 80)
+    forward = service._forward
+
+    def forward_with_limit(token_ids):
+        if sum(len(ids) for ids in token_ids) > 20:
+            raise MemoryError("sin memoria")
+        return forward(token_ids)
+
+    monkeypatch.setattr(service, "_forward", forward_with_limit)
+    budget = _TokenBudget()
+    probabilities, errors = service._forward_with_backoff([[1] * 10] * 8, budget)
+
+    assert errors == {}
+    assert probabilities[:, 0].tolist() == [10] * 8
+    assert budget.scale < 1.0
+    assert max(service.forward_sizes) <= 2
+
+def test_bisection_isolates_failing_rows(service, monkeypatch):
+    monkeypatch.setattr(config, "BATCH_TOKEN_BUDGET", 10_000)
+    forward = service._forward
+
+    def forward_failing_on_poison(token_ids):
+        if any(99 in ids for ids in token_ids):
+            raise ValueError("fila inválida")
+        return forward(token_ids)
+
+    monkeypatch.setattr(service, "_forward", forward_failing_on_poison)
+    token_ids = [[1] * (row + 1) for row in range(10)]
+    token_ids[3] = [99]
+    token_ids[8] = [1, 99]
+    probabilities, errors = service._forward_with_backoff(token_ids)
+
+    assert sorted(errors) == [3, 8]
+    assert errors[3] == "ValueError: fila inválida"
+    assert np.isnan(probabilities[[3, 8]]).all()
+    healthy = [row for row in range(10) if row not in errors]
+    assert probabilities[healthy, 0].tolist() == [row + 1 for row in healthy]
+
+def test_deduplicate_texts():
+    codes, first_rows = MLModelService._deduplicate(["b", "a", "b", "c", "a", "b"], None)
+
+    assert codes.tolist() == [0, 1, 0, 2, 1, 0]
+    assert first_rows.tolist() == [0, 1, 3]
+
+def test_deduplicate_token_rows_ignores_dtype():
+    token_rows = [np.array([1, 2], dtype=np.int16), np.array([3]), np.array([1, 2], dtype=np.int32), np.array([1, 2, 0])]
+    codes, first_rows = MLModelService._deduplicate(["x", "x", "y", "z"], token_rows)
+
+    # Se comparan los ids, no el texto
+    assert codes.tolist() == [0, 1, 0, 2]
+    assert first_rows.tolist() == [0, 1, 3]
+
+def test_deduplicate_empty_batch():
+    codes, first_rows = MLModelService._deduplicate([], None)
+    assert len(codes) == 0
+    assert len(first_rows) == 0
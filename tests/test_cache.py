@@ -0,0 +1,72 @@
+"""
+Cache de artefactos: invalidación por archivo y respuestas 304 con ETag / Last-Modified
+"""
+import json
+import os
+from email.utils import formatdate
+
+from fastapi import Response
+from starlette.requests import Request
+
+from api.core.cache import ArtifactCache, is_not_modified
+
+def _request(headers=None) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+def _write(path, data, mtime):
+    path.write_text(json.dumps(data))
+    os.utime(path, (mtime, mtime))
+
+def test_reloads_only_when_the_file_changes(tmp_path):
+    path = tmp_path / "metrics.json"
+    _write(path, {"f1": 0.5}, 1_700_000_000)
+    cache = ArtifactCache("test")
+
+    first = cache.get(path)
+    assert first.data == {"f1": 0.5}
+    assert cache.get(path) is first
+
+    _write(path, {"f1": 0.75}, 1_700_000_100)
+    second = cache.get(path)
+    assert second.data == {"f1": 0.75}
+    assert second.etag != first.etag
+
+def test_validators_are_none_for_missing_files(tmp_path):
+    path = tmp_path / "metrics.json"
+    _write(path, {}, 1_700_000_000)
+
+    assert ArtifactCache("test").validators(path, tmp_path / "missing.json") is None
+    assert is_not_modified(_request({"If-None-Match": "*"}), Response(), None) is False
+
+def test_if_none_match(tmp_path):
+    path = tmp_path / "metrics.json"
+    _write(path, {"f1": 0.5}, 1_700_000_000)
+    validators = ArtifactCache("test").validators(path)
+    etag, _ = validators
+
+    response = Response()
+    assert is_not_modified(_request({"If-None-Match": etag}), response, validators)
+    assert response.headers["ETag"] == etag
+    assert response.headers["Last-Modified"] == formatdate(1_700_000_000, usegmt=True)
+
+    assert is_not_modified(_request({"If-None-Match": f'"other", W/{etag}'}), Response(), validators)
+    assert not is_not_modified(_request({"If-None-Match": '"other"'}), Response(), validators)
+    # If-None-Match tiene precedencia sobre If-Modified-Since
+    assert not is_not_modified(
+        _request({"If-None-Match": '"other"', "If-Modified-Since": formatdate(1_800_000_000, usegmt=True)}),
+        Response(), validators
+    )
+
+def test_if_modified_since(tmp_path):
+    path = tmp_path / "metrics.json"
+    _write(path, {"f1": 0.5}, 1_700_000_000.5)
+    validators = ArtifactCache("test").validators(path)
+
+    assert is_not_modified(_request({"If-Modified-Since": formatdate(1_700_000_000, usegmt=True)}), Response(), validators)
+    assert not is_not_modified(_request({"If-Modified-Since": formatdate(1_699_999_999, usegmt=True)}), Response(), validators)
+    assert not is_not_modified(_request({"If-Modified-Since": "no es una fecha"}), Response(), validators)
@@ -0,0 +1,37 @@
+"""
+Agregado de matrices de confusión: conteos por bucket y retención
+"""
+import numpy as np
+import pytest
+
+from api.core.config import config
+from api.services.confusion_service import ConfusionAggregateService
+
+DAY = 86400
+
+@pytest.fixture
+def service(monkeypatch, tmp_path):
+    # Los getters de rutas son classmethods: parchear la clase, no la instancia
+    monkeypatch.setattr(type(config), "TEMP_DIR", tmp_path)
+    monkeypatch.setattr(type(config), "CONFUSION_RETENTION_DAYS", 30)
+    return ConfusionAggregateService()
+
+def test_record_sums_counts(service):
+    y_true = np.array([[1, 0], [1, 1], [0, 0]], dtype=bool)
+    y_pred = np.array([[1, 1], [0, 1], [0, 0]], dtype=bool)
+    service.record("v1", ["a", "b"], y_true, y_pred, now=0)
+    service.record("v1", ["a", "b"], y_true, y_pred, now=10)
+
+    aggregate = ConfusionAggregateService().query("v1")
+    assert aggregate["jobs"] == 2
+    assert aggregate["total_samples"] == 6
+    assert aggregate["category_metrics"]["a"] == {"TP": 2, "TN": 2, "FP": 0, "FN": 2}
+    assert aggregate["category_metrics"]["b"] == {"TP": 2, "TN": 2, "FP": 2, "FN": 0}
+
+def test_buckets_outside_retention_are_dropped(service):
+    ones = np.ones((1, 1), dtype=bool)
+    for day in range(0, 100, 10):
+        service.record("v1", ["a"], ones, ones, now=day * DAY)
+
+    # Solo quedan los días 60..90: 30 días antes del último registro
+    assert ConfusionAggregateService().query("v1")["jobs"] == 4
@@ -0,0 +1,91 @@
+"""
+Token buckets del límite de uso: relleno, cobro y claves de cliente
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from api.core.config import config
+from api.core.ratelimit import MemoryBucketStore, RateLimiter, SQLiteBucketStore
+
+def _request(headers=None, host: str = "10.0.0.1") -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        "client": (host, 1234),
+    })
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return MemoryBucketStore() if request.param == "memory" else SQLiteBucketStore(tmp_path / "buckets.db")
+
+def test_bucket_refills_over_time(store):
+    # Capacidad 10, 2 unidades por segundo
+    assert store.consume("c", 10, 10, 2, now=0.0) == (True, 0.0, 0.0)
+
+    allowed, tokens, retry_after = store.consume("c", 4, 10, 2, now=1.0)
+    assert not allowed
+    assert tokens == pytest.approx(2.0)
+    assert retry_after == pytest.approx(1.0)
+
+    allowed, tokens, _ = store.consume("c", 4, 10, 2, now=2.0)
+    assert allowed
+    assert tokens == pytest.approx(0.0)
+
+def test_bucket_never_exceeds_capacity(store):
+    store.consume("c", 1, 10, 2, now=0.0)
+    allowed, tokens, _ = store.consume("c", 1, 10, 2, now=1000.0)
+    assert allowed
+    assert tokens == pytest.approx(9.0)
+
+def test_cost_above_capacity_needs_full_bucket(store):
+    allowed, tokens, _ = store.consume("c", 25, 10, 1, now=0.0)
+    assert allowed
+    assert tokens == pytest.approx(-15.0)
+
+    allowed, _, retry_after = store.consume("c", 1, 10, 1, now=10.0)
+    assert not allowed
+    assert retry_after == pytest.approx(6.0)
+
+def test_unknown_api_keys_share_the_ip_bucket():
+    limiter = RateLimiter(3, 0.001, MemoryBucketStore(), api_keys={"secret"})
+
+    assert limiter.client_key(_request({"X-API-Key": "secret"})).startswith("key:")
+    assert limiter.client_key(_request({"X-API-Key": "random"})) == "ip:10.0.0.1"
+
+    for attempt in range(3):
+        asyncio.run(limiter.charge(_request({"X-API-Key": f"random-{attempt}"}), 1))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(limiter.charge(_request({"X-API-Key": "random-3"}), 1))
+    assert error.value.status_code == 429
+    assert "Retry-After" in error.value.headers
+
+    # La key configurada tiene su propio bucket
+    asyncio.run(limiter.charge(_request({"X-API-Key": "secret"}), 1))
+
+def test_spoofed_forwarded_for_shares_the_proxy_hop_bucket(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_TRUST_FORWARDED", True)
+    monkeypatch.setattr(config, "RATE_LIMIT_TRUSTED_PROXIES", 1)
+    limiter = RateLimiter(2, 0.001, MemoryBucketStore(), api_keys=set())
+
+    first = _request({"X-Forwarded-For": "1.1.1.1, 203.0.113.7"}, host="127.0.0.1")
+    second = _request({"X-Forwarded-For": "2.2.2.2, 203.0.113.7"}, host="127.0.0.1")
+    assert limiter.client_key(first) == limiter.client_key(second) == "ip:203.0.113.7"
+
+    asyncio.run(limiter.charge(first, 1))
+    asyncio.run(limiter.charge(second, 1))
+    with pytest.raises(HTTPException):
+        asyncio.run(limiter.charge(_request({"X-Forwarded-For": "3.3.3.3, 203.0.113.7"}, host="127.0.0.1"), 1))
+
+def test_forwarded_for_with_two_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_TRUST_FORWARDED", True)
+    monkeypatch.setattr(config, "RATE_LIMIT_TRUSTED_PROXIES", 2)
+    limiter = RateLimiter(2, 0.001, MemoryBucketStore(), api_keys=set())
+
+    assert limiter.client_key(_request({"X-Forwarded-For": "9.9.9.9, 203.0.113.7, 10.0.0.2"})) == "ip:203.0.113.7"
+    # Menos saltos que proxies de confianza: el header no pasó por la cadena esperada
+    assert limiter.client_key(_request({"X-Forwarded-For": "9.9.9.9"})) == "ip:10.0.0.1"
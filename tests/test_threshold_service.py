@@ -0,0 +1,57 @@
+"""
+Barrido de umbrales: métricas vectorizadas contra sklearn y contra la grilla completa
+"""
+import numpy as np
+import pytest
+from sklearn.metrics import f1_score, hamming_loss, precision_recall_fscore_support
+
+from api.services.threshold_service import apply_thresholds, evaluate_predictions, sweep_global_thresholds
+
+def _random_job(seed: int, rows: int = 200, classes: int = 4):
+    rng = np.random.default_rng(seed)
+    probabilities = rng.random((rows, classes)).astype(np.float32)
+    y_true = rng.random((rows, classes)) < 0.3
+    return probabilities, y_true
+
+def test_apply_thresholds_falls_back_to_top_class():
+    probabilities = np.array([[0.2, 0.4, 0.1], [0.9, 0.6, 0.7]])
+    predicted = apply_thresholds(probabilities, np.array([0.5, 0.65]))
+
+    assert predicted.tolist() == [
+        [[False, True, False], [True, True, True]],
+        [[False, True, False], [True, False, True]],
+    ]
+
+def test_apply_thresholds_per_category():
+    probabilities = np.array([[0.3, 0.6], [0.8, 0.2]])
+    predicted = apply_thresholds(probabilities, np.array([[0.25, 0.7]]))
+
+    assert predicted[0].tolist() == [[True, False], [True, False]]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_evaluate_predictions_matches_sklearn(seed):
+    probabilities, y_true = _random_job(seed)
+    thresholds = np.linspace(0.05, 0.95, 7)
+    metrics = evaluate_predictions(apply_thresholds(probabilities, thresholds), y_true)
+
+    for i, threshold in enumerate(thresholds):
+        predicted = apply_thresholds(probabilities, np.array([threshold]))[0]
+        precision, recall, f1, _ = precision_recall_fscore_support(y_true, predicted, average=None, zero_division=0)
+        np.testing.assert_allclose(metrics["precision"][i], precision)
+        np.testing.assert_allclose(metrics["recall"][i], recall)
+        np.testing.assert_allclose(metrics["f1"][i], f1)
+        assert metrics["macro_f1"][i] == pytest.approx(f1_score(y_true, predicted, average="macro", zero_division=0))
+        assert metrics["micro_f1"][i] == pytest.approx(f1_score(y_true, predicted, average="micro", zero_division=0))
+        assert metrics["hamming_loss"][i] == pytest.approx(hamming_loss(y_true, predicted))
+        assert metrics["exact_match_ratio"][i] == pytest.approx((predicted == y_true).all(axis=1).mean())
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sweep_global_thresholds_matches_full_grid(seed):
+    probabilities, y_true = _random_job(seed)
+    # Incluye umbrales iguales a probabilidades observadas: la comparación es estricta (>)
+    thresholds = np.concatenate([np.linspace(0.0, 1.0, 21), probabilities[:5, 0].astype(float)])
+    expected = evaluate_predictions(apply_thresholds(probabilities, thresholds), y_true)
+    swept = sweep_global_thresholds(probabilities, y_true, thresholds)
+
+    for name, values in expected.items():
+        np.testing.assert_allclose(swept[name], values, err_msg=name)
@@ -0,0 +1,59 @@
+"""
+Entrada pre-tokenizada: decodificación base64 y archivos NumPy
+"""
+import base64
+import io
+
+import numpy as np
+import pytest
+
+from api.core.token_ids import TokenIdsError, decode_base64_ids, load_token_rows
+
+def _encode(ids, dtype: str) -> str:
+    return base64.b64encode(np.asarray(ids, dtype=dtype).tobytes()).decode()
+
+def _npy(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+def _npz(**arrays) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+@pytest.mark.parametrize("dtype, numpy_dtype", [("int16", "<i2"), ("int32", "<i4")])
+def test_decode_base64_ids(dtype, numpy_dtype):
+    ids = decode_base64_ids(_encode([101, 2054, 30000, 102], numpy_dtype), dtype)
+    assert ids.tolist() == [101, 2054, 30000, 102]
+    assert ids.dtype == np.dtype(numpy_dtype)
+
+@pytest.mark.parametrize("data, dtype, message", [
+    (_encode([1, 2], "<i2"), "int64", "dtype inválido"),
+    ("no es base64!", "int16", "base64"),
+    (base64.b64encode(b"\x01\x02\x03").decode(), "int16", "múltiplo"),
+])
+def test_decode_base64_ids_rejects_invalid_input(data, dtype, message):
+    with pytest.raises(TokenIdsError, match=message):
+        decode_base64_ids(data, dtype)
+
+def test_load_padded_npy_strips_right_padding():
+    rows = load_token_rows(_npy(np.array([[101, 5, 102, 0], [101, 102, 0, 0], [0, 0, 0, 0]], dtype=np.int32)), 0)
+    assert [row.tolist() for row in rows] == [[101, 5, 102], [101, 102], []]
+
+def test_load_npz_with_offsets():
+    contents = _npz(input_ids=np.array([101, 5, 102, 101, 102], dtype=np.int16), offsets=np.array([0, 3, 3, 5]))
+    rows = load_token_rows(contents, 0)
+    assert [row.tolist() for row in rows] == [[101, 5, 102], [], [101, 102]]
+
+@pytest.mark.parametrize("contents, message", [
+    (b"no es numpy", "Archivo de tokens inválido"),
+    (_npy(np.zeros((2, 3), dtype=np.float32)), "entero"),
+    (_npy(np.zeros(3, dtype=np.int32)), "2-D"),
+    (_npz(input_ids=np.array([1, 2], dtype=np.int32)), "offsets"),
+    (_npz(input_ids=np.array([1, 2], dtype=np.int32), offsets=np.array([0, 3])), "terminar en len"),
+    (_npz(input_ids=np.array([1, 2], dtype=np.int32), offsets=np.array([0, 2, 1, 2])), "creciente"),
+])
+def test_load_token_rows_rejects_invalid_files(contents, message):
+    with pytest.raises(TokenIdsError, match=message):
+        load_token_rows(contents, 0)